@@ -0,0 +1,56 @@
+"""
+The hmtk registries of the algorithms available for each analysis
+"""
+import os
+import imp
+import collections
+
+from hmtk.seismicity import (
+    DECLUSTERER_METHODS, COMPLETENESS_METHODS, OCCURRENCE_METHODS,
+    MAX_MAGNITUDE_METHODS, SMOOTHED_SEISMICITY_METHODS)
+
+from histogram import CATALOGUE_ANALYSIS_METHODS
+
+
+# A plugin file is a python source coded loaded at init time meant to
+# register new hmtk algorithms to the hmtk registries.
+PLUGIN_FILE = os.environ.get('HMTK_PLUGIN_FILE',
+                             os.path.expanduser("~/hmtk-plugin.py"))
+
+# the algorithm registries keyed by analysis name
+REGISTRIES = collections.OrderedDict([
+    ('declustering', DECLUSTERER_METHODS),
+    ('completeness', COMPLETENESS_METHODS),
+    ('recurrence_model', OCCURRENCE_METHODS),
+    ('max_magnitude', MAX_MAGNITUDE_METHODS),
+    ('smoothed_seismicity', SMOOTHED_SEISMICITY_METHODS),
+    ('histogram', CATALOGUE_ANALYSIS_METHODS),
+])
+
+
+def load_plugins(plugin_file=PLUGIN_FILE):
+    """
+    Load the plugin file (if any), registering its algorithms
+    """
+    if os.path.exists(plugin_file):
+        imp.load_source('hmtk.plugin', plugin_file)
+
+
+def get_algorithm(name, key):
+    """
+    :param str name: an analysis name (e.g. declustering)
+    :param str key: the name of the algorithm in the analysis registry
+    :returns: the algorithm (a callable)
+    """
+    return REGISTRIES[name][key]
+
+
+def algorithm_key(name, algorithm):
+    """
+    :returns:
+        the name of `algorithm` in the registry of the analysis `name`,
+        or None if it is not registered
+    """
+    for key, value in REGISTRIES[name].items():
+        if value is algorithm:
+            return key
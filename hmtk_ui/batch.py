@@ -0,0 +1,247 @@
+"""
+Run the hmtk analyses on many catalogues, without the GUI (neither
+PyQt4 nor qgis are imported).
+
+Usage: python batch.py [-p PROCESSES] [-o OUTPUT_DIR] config.ini
+                       catalogue.csv [catalogue.csv ...]
+
+The config file has a section for each analysis to run (in the order
+declustering, completeness, recurrence_model, max_magnitude,
+smoothed_seismicity, histogram). Each section gives the name of the
+algorithm in the hmtk registry and its parameters, e.g.:
+
+    [general]
+    output_dir = results
+
+    [declustering]
+    algorithm = GardnerKnopoffType1
+    time_distance_window = GardnerKnopoffWindow
+    fs_time_prop = 0.9
+    purge = true
+
+    [completeness]
+    algorithm = Stepp1971
+    magnitude_bin = 0.5
+    time_bin = 5.
+    increment_lock = true
+    purge = true
+
+    [smoothed_seismicity]
+    algorithm = IsotropicGaussianMethod
+    grid = auto
+
+Lists are comma separated. A grid is either "auto" (the bounding box
+of the catalogue, with a 1 degree spacing) or the comma separated
+list: min lon, max lon, lon spacing, min lat, max lat, lat spacing,
+min depth, max depth, depth spacing.
+
+For each catalogue the outputs are written in OUTPUT_DIR as csv files
+(and the smoothed seismicity also as a GeoTIFF), named after the
+catalogue file.
+"""
+import os
+import sys
+import csv
+import argparse
+import traceback
+import ConfigParser
+import multiprocessing
+
+from hmtk.registry import Registry
+from hmtk.seismicity.smoothing.smoothed_seismicity import Grid
+
+from algorithms import REGISTRIES, get_algorithm, load_plugins
+from catalogue_model import CatalogueModel
+from raster import write_geotiff
+
+
+# the header of the csv file holding the output of each analysis
+HEADERS = {
+    'recurrence_model': {
+        3: ["Reference Magnitude", "b value", "sigma b"],
+        5: ["Reference Magnitude", "b value", "sigma b", "rate",
+            "sigma rate"]},
+    'max_magnitude': ["Maximum Magnitude", "Standard deviation"],
+    'smoothed_seismicity': [
+        "Longitude", "Latitude", "Depth", "Observed", "Smoothed"],
+    'completeness': ["Year", "Magnitude"],
+}
+
+TRUE_VALUES = ['1', 'yes', 'true', 'on']
+
+
+def read_config(fname):
+    """
+    :returns:
+        a dictionary of dictionaries with the options of the config
+        file `fname` keyed by section
+    """
+    parser = ConfigParser.RawConfigParser()
+    parser.optionxform = str  # parameter names are case sensitive
+    if not parser.read(fname):
+        raise IOError("Can not read %s" % fname)
+    return dict((section, dict(parser.items(section)))
+                for section in parser.sections())
+
+
+def parse_config(options, algorithm, catalogue):
+    """
+    Convert the string `options` to the algorithm configuration,
+    according to the field specs of `algorithm`
+
+    :raises ValueError: if a field is missing or invalid
+    """
+    config = {}
+    for field_name, field_spec in algorithm.fields.items():
+        default = None
+        if not isinstance(field_spec, type):
+            if isinstance(field_spec, type(lambda x: x)):
+                field_spec = field_spec(catalogue)
+            default = field_spec
+        text = options.get(field_name)
+
+        if text is None and default is not None and not isinstance(
+                default, (list, Registry)):
+            config[field_name] = default
+        elif text is None and field_spec is not Grid:
+            raise ValueError("Field %s is missing" % field_name)
+        else:
+            config[field_name] = parse_value(
+                field_name, text, field_spec, catalogue)
+    return config
+
+
+def parse_value(field_name, text, field_spec, catalogue):
+    """
+    :returns: the value of the field `field_name` given as `text`
+    """
+    try:
+        if field_spec is Grid:
+            if text is None or text.strip() == 'auto':
+                return Grid.make_from_catalogue(catalogue, 1, 0)
+            return Grid.make_from_list(
+                [float(v) for v in text.split(',')])
+        elif field_spec is bool or isinstance(field_spec, bool):
+            return text.strip().lower() in TRUE_VALUES
+        elif field_spec is list:
+            return [float(v) for v in text.split(',')]
+        elif isinstance(field_spec, Registry):
+            return field_spec[text.strip()]()
+        elif isinstance(field_spec, list):
+            choices = dict((str(choice), choice) for choice in field_spec)
+            return choices[text.strip()]
+        elif isinstance(field_spec, type):
+            return field_spec(text)
+        return type(field_spec)(text)
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid value %s for field %s" % (text, field_name))
+
+
+def write_csv(fname, header, rows):
+    with open(fname, 'wb') as fobj:
+        writer = csv.writer(fobj)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def process_catalogue(fname, config, output_dir):
+    """
+    Run the analyses given in `config` on the catalogue stored in
+    `fname` and write their outputs in `output_dir`
+
+    :returns: a list with the names of the files written
+    """
+    model = CatalogueModel.from_csv_file(fname)
+    prefix = os.path.join(
+        output_dir, os.path.splitext(os.path.basename(fname))[0])
+    written = []
+
+    for name in REGISTRIES:
+        if name not in config:
+            continue
+        options = config[name]
+        algorithm = get_algorithm(name, options['algorithm'])
+        output = getattr(model, name)(
+            algorithm, parse_config(options, algorithm, model.catalogue))
+        purge = options.get('purge', '').lower() in TRUE_VALUES
+
+        if name == 'declustering' and purge:
+            model.purge_decluster()
+        elif name == 'completeness':
+            written.append(prefix + '_completeness.csv')
+            write_csv(written[-1], HEADERS[name], model.completeness_table)
+            if purge:
+                model.purge_completeness()
+        elif name == 'recurrence_model':
+            written.append(prefix + '_recurrence_model.csv')
+            write_csv(written[-1], HEADERS[name][len(output)], [output])
+        elif name == 'max_magnitude':
+            written.append(prefix + '_max_magnitude.csv')
+            write_csv(written[-1], HEADERS[name], [output])
+        elif name == 'smoothed_seismicity':
+            written.append(prefix + '_smoothed_seismicity.csv')
+            write_csv(written[-1], HEADERS[name], output)
+            written.append(prefix + '_smoothed_seismicity.tif')
+            write_geotiff(output, written[-1])
+        elif name == 'histogram':
+            written.append(prefix + '_histogram.csv')
+            if len(output) == 2:
+                write_csv(written[-1], ["Bin", "Count"], zip(*output))
+            else:
+                x_bins, y_bins, hist = output
+                write_csv(written[-1], [""] + list(x_bins[:-1]), [
+                    [y] + list(row) for y, row in zip(y_bins[:-1], hist.T)])
+
+    written.append(prefix + '_catalogue.csv')
+    model.save(written[-1])
+    return written
+
+
+def _process(args):
+    fname, config, output_dir = args
+    try:
+        return fname, process_catalogue(fname, config, output_dir), None
+    except Exception:
+        return fname, [], traceback.format_exc()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the hmtk analyses on many catalogues")
+    parser.add_argument('config', help="the config file")
+    parser.add_argument('catalogues', nargs='+', help="csv catalogue files")
+    parser.add_argument('-o', '--output-dir', help="the output directory")
+    parser.add_argument('-p', '--processes', type=int,
+                        help="the number of worker processes "
+                        "(one per core by default)")
+    args = parser.parse_args(argv)
+
+    load_plugins()
+    config = read_config(args.config)
+    output_dir = (args.output_dir or
+                  config.get('general', {}).get('output_dir', '.'))
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    failed = 0
+    pool = multiprocessing.Pool(args.processes)
+    try:
+        for fname, written, error in pool.imap_unordered(
+                _process, [(fname, config, output_dir)
+                           for fname in args.catalogues]):
+            if error is None:
+                print "%s: written %s" % (fname, ", ".join(written))
+            else:
+                failed += 1
+                print >> sys.stderr, "%s: failed\n%s" % (fname, error)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
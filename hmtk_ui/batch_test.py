@@ -0,0 +1,93 @@
+import unittest
+
+import numpy
+
+try:
+    from hmtk.registry import Registry
+    from hmtk.seismicity.catalogue import Catalogue
+except ImportError:
+    raise unittest.SkipTest("hmtk is not available")
+
+try:
+    import osgeo
+except ImportError:
+    raise unittest.SkipTest("GDAL is not available")
+
+from batch import parse_config
+
+
+class Window(object):
+    pass
+
+
+WINDOWS = Registry()
+WINDOWS['GardnerKnopoffWindow'] = Window
+
+
+def algorithm(catalogue, config):
+    pass
+
+algorithm.fields = {
+    'time_distance_window': WINDOWS,
+    'fs_time_prop': float,
+    'magnitude_bins_nr': numpy.int,
+    'increment_lock': True,
+    'method': ['Weichert', 'MLE'],
+    'magnitude_bin': lambda catalogue: numpy.max(
+        catalogue.data['magnitude']) / 10.,
+    'reference_magnitude': 3.,
+}
+
+OPTIONS = {
+    'time_distance_window': ' GardnerKnopoffWindow',
+    'fs_time_prop': '0.9',
+    'magnitude_bins_nr': '10',
+    'method': 'MLE',
+}
+
+
+class ParseConfigTestCase(unittest.TestCase):
+    def setUp(self):
+        self.catalogue = Catalogue()
+        self.catalogue.data['magnitude'] = numpy.array([4., 6.])
+
+    def parse(self, **options):
+        return parse_config(dict(OPTIONS, **options), algorithm,
+                            self.catalogue)
+
+    def test_defaults(self):
+        config = self.parse()
+        self.assertIsInstance(config['time_distance_window'], Window)
+        self.assertEqual(0.9, config['fs_time_prop'])
+        self.assertEqual(10, config['magnitude_bins_nr'])
+        self.assertEqual('MLE', config['method'])
+        self.assertIs(True, config['increment_lock'])
+        self.assertEqual(3., config['reference_magnitude'])
+        # computed from the catalogue by the callable field
+        self.assertEqual(0.6, config['magnitude_bin'])
+
+    def test_values(self):
+        config = self.parse(increment_lock='No', magnitude_bin='0.2',
+                            reference_magnitude='4')
+        self.assertIs(False, config['increment_lock'])
+        self.assertEqual(0.2, config['magnitude_bin'])
+        self.assertEqual(4., config['reference_magnitude'])
+
+    def test_missing(self):
+        options = dict(OPTIONS)
+        del options['fs_time_prop']
+        self.assertRaises(ValueError, parse_config, options, algorithm,
+                          self.catalogue)
+        # registries and choices have no default
+        for key in ['time_distance_window', 'method']:
+            options = dict(OPTIONS)
+            del options[key]
+            self.assertRaises(ValueError, parse_config, options,
+                              algorithm, self.catalogue)
+
+    def test_invalid(self):
+        for key, text in [('time_distance_window', 'Unknown'),
+                          ('method', 'LSQ'), ('fs_time_prop', 'x'),
+                          ('magnitude_bins_nr', '1.5'),
+                          ('magnitude_bin', 'y')]:
+            self.assertRaises(ValueError, self.parse, **{key: text})
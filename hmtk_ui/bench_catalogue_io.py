@@ -0,0 +1,78 @@
+"""
+Compare the throughput (in events/second) of the hmtk csv catalogue
+parser/writer with the column-wise ones in catalogue_io (whose
+equivalence is checked by catalogue_io_test.py).
+
+Usage: python bench_catalogue_io.py [number of events]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy
+
+from hmtk.parsers.catalogue.csv_catalogue_parser import (
+    CsvCatalogueParser, CsvCatalogueWriter)
+
+from catalogue_io import read_catalogue, write_catalogue
+
+
+def make_csv(fname, events_nr):
+    """
+    Write a synthetic catalogue with `events_nr` events in `fname`
+    """
+    rnd = numpy.random.RandomState(42)
+    with open(fname, 'w') as fobj:
+        fobj.write('eventID,Agency,year,month,day,hour,minute,second,'
+                   'longitude,latitude,depth,magnitude,sigmaMagnitude\n')
+        for i in range(events_nr):
+            fobj.write(
+                '%d,%s,%d,%d,%d,%d,%d,%.2f,%r,%r,%.1f,%.1f,%.2f\n' % (
+                    i + 1, rnd.choice(['ISC', 'GCMT', 'NEIC']),
+                    rnd.randint(1900, 2014), rnd.randint(1, 13),
+                    rnd.randint(1, 29), rnd.randint(0, 24),
+                    rnd.randint(0, 60), rnd.uniform(0, 60),
+                    rnd.uniform(-180, 180), rnd.uniform(-90, 90),
+                    rnd.uniform(0, 100), rnd.uniform(3, 8),
+                    rnd.uniform(0, 0.3)))
+
+
+def timeit(func, *args):
+    start = time.time()
+    ret = func(*args)
+    return time.time() - start, ret
+
+
+def hmtk_write(catalogue, fname):
+    writer = CsvCatalogueWriter(fname)
+    writer.write_file(catalogue)
+
+
+def main(events_nr):
+    directory = tempfile.mkdtemp()
+    try:
+        fname = os.path.join(directory, 'catalogue.csv')
+        make_csv(fname, events_nr)
+
+        hmtk_time, expected = timeit(
+            lambda: CsvCatalogueParser(fname).read_file())
+        native_time, catalogue = timeit(read_catalogue, fname)
+
+        print "read  hmtk: %12.0f events/s  native: %12.0f events/s" % (
+            events_nr / hmtk_time, events_nr / native_time)
+
+        hmtk_time, _ = timeit(
+            hmtk_write, expected, os.path.join(directory, 'hmtk.csv'))
+        native_time, _ = timeit(
+            write_catalogue, catalogue, os.path.join(directory, 'native.csv'))
+
+        print "write hmtk: %12.0f events/s  native: %12.0f events/s" % (
+            events_nr / hmtk_time, events_nr / native_time)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
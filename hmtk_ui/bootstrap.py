@@ -0,0 +1,172 @@
+"""
+Bootstrap uncertainty of the recurrence model and maximum magnitude
+estimates.
+
+Each replicate resamples the events with replacement and perturbs
+their magnitudes with a normal error of standard deviation
+sigmaMagnitude, then runs the algorithm on the resampled catalogue.
+Replicates are computed in chunks by the pool of worker processes (see
+:mod:`process_pool`); the resampling of a chunk is done at once on
+(replicates, events) arrays.
+"""
+import copy
+
+import numpy
+
+import process_pool
+from algorithms import get_algorithm
+from catalogue_model import run_algorithm
+
+
+# the analyses supporting bootstrap
+BOOTSTRAP_ANALYSES = ['recurrence_model', 'max_magnitude']
+
+# maximum number of resampled values held by a worker for each column
+CHUNK_ELEMENTS = 5 * 10 ** 6
+
+# minimum number of chunks the replicates are split into, so that they
+# are spread over the workers. It does not depend on the number of
+# workers, so that the replicates depend only on the seed
+MIN_CHUNKS = 32
+
+
+def resample(catalogue, rng, replicates, sample_events=True,
+             perturb_magnitudes=True):
+    """
+    :returns:
+        a pair of (replicates, events) arrays with the (sorted) rows of
+        the events drawn for each replicate and their magnitudes
+    """
+    events_nr = catalogue.get_number_events()
+    if sample_events:
+        rows = rng.randint(0, events_nr, size=(replicates, events_nr))
+        # keep the events in their original (chronological) order
+        rows.sort(axis=1)
+    else:
+        rows = numpy.tile(numpy.arange(events_nr), (replicates, 1))
+
+    magnitudes = numpy.asarray(catalogue.data['magnitude'])[rows]
+    sigma = numpy.asarray(
+        catalogue.data.get('sigmaMagnitude', []), dtype=float)
+    if perturb_magnitudes and len(sigma):
+        magnitudes = magnitudes + (
+            numpy.nan_to_num(sigma)[rows] * rng.standard_normal(rows.shape))
+    return rows, magnitudes
+
+
+def replicate_catalogue(catalogue, rows, magnitudes):
+    """
+    :returns:
+        a copy of `catalogue` holding the events at `rows` (with the
+        given `magnitudes`). String columns are not resampled, as they
+        are not used by the algorithms
+    """
+    replicate = copy.copy(catalogue)
+    replicate.data = dict(
+        (key, column[rows] if isinstance(column, numpy.ndarray) and
+         len(column) else column)
+        for key, column in catalogue.data.items())
+    replicate.data['magnitude'] = magnitudes
+    return replicate
+
+
+def _run_chunk(args):
+    (name, key, config, catalogue_path, completeness_table, seed,
+     replicates, sample_events, perturb_magnitudes) = args
+    catalogue = process_pool.shared(catalogue_path)
+    rng = numpy.random.RandomState(seed)
+    rows, magnitudes = resample(
+        catalogue, rng, replicates, sample_events, perturb_magnitudes)
+    algorithm = get_algorithm(name, key)
+
+    results = []
+    for i in range(replicates):
+        result = run_algorithm(
+            name, algorithm, config,
+            replicate_catalogue(catalogue, rows[i], magnitudes[i]),
+            completeness_table)
+        results.append(
+            [numpy.nan if value is None else float(value)
+             for value in result])
+    return results
+
+
+def run_bootstrap(name, key, config, catalogue, completeness_table,
+                  replicates, confidence=0.95, sample_events=True,
+                  perturb_magnitudes=True, seed=None, cancelled=None):
+    """
+    Compute `replicates` bootstrap replicates of the estimate of the
+    algorithm `key` of the analysis `name`, in the worker processes of
+    :mod:`process_pool`.
+
+    :param cancelled:
+        a callable returning True if the bootstrap has to be stopped
+    :returns:
+        a dict with the replicates (a (replicates, parameters) array)
+        and their summary (see :func:`summarize`), or None if the
+        bootstrap has been cancelled
+    """
+    events_nr = max(catalogue.get_number_events(), 1)
+    chunk_size = max(1, min(CHUNK_ELEMENTS // events_nr,
+                            -(-replicates // MIN_CHUNKS)))
+    seeds = numpy.random.RandomState(seed).randint(
+        2 ** 31 - 1, size=-(-replicates // chunk_size))
+    sizes = [min(chunk_size, replicates - i * chunk_size)
+             for i in range(len(seeds))]
+
+    catalogue_path = process_pool.share(catalogue)
+    try:
+        chunks = list(process_pool.imap(_run_chunk, [
+            (name, key, config, catalogue_path, completeness_table,
+             chunk_seed, size, sample_events, perturb_magnitudes)
+            for chunk_seed, size in zip(seeds, sizes)], cancelled))
+    finally:
+        process_pool.unshare(catalogue_path)
+    if len(chunks) < len(seeds):
+        return None
+    results = [result for chunk in chunks for result in chunk]
+
+    replicates = numpy.array(results, dtype=float)
+    output = summarize(replicates, confidence)
+    output['replicates'] = replicates
+    return output
+
+
+def summarize(replicates, confidence):
+    """
+    :param replicates: a (replicates, parameters) array
+    :returns:
+        a dict with the mean, the standard deviation and the lower and
+        upper bounds of the `confidence` interval of each parameter
+        (NaN replicates are ignored)
+    """
+    tail = 100. * (1. - confidence) / 2.
+    summary = dict(confidence=confidence, mean=[], std=[], lower=[],
+                   upper=[])
+    for values in replicates.T:
+        values = values[numpy.isfinite(values)]
+        if not len(values):
+            values = numpy.array([numpy.nan])
+        summary['mean'].append(numpy.mean(values))
+        summary['std'].append(numpy.std(values))
+        summary['lower'].append(numpy.percentile(values, tail))
+        summary['upper'].append(numpy.percentile(values, 100. - tail))
+    return summary
+
+
+def rate_band(replicates, magnitudes, confidence):
+    """
+    :param replicates:
+        the (replicates, 4) array of b value, sigma b, a value and
+        sigma a of a recurrence model bootstrap
+    :returns:
+        the lower and upper bounds of the `confidence` interval of the
+        annual cumulative rates at `magnitudes`
+    """
+    b_values, a_values = replicates[:, 0], replicates[:, 2]
+    valid = numpy.isfinite(b_values) & numpy.isfinite(a_values)
+    rates = 10. ** (a_values[valid, None] -
+                    b_values[valid, None] * magnitudes[None, :])
+    tail = 100. * (1. - confidence) / 2.
+    return (numpy.percentile(rates, tail, axis=0),
+            numpy.percentile(rates, 100. - tail, axis=0))
@@ -0,0 +1,133 @@
+import unittest
+
+import numpy
+
+try:
+    from hmtk.seismicity import OCCURRENCE_METHODS
+    from hmtk.seismicity.catalogue import Catalogue
+except ImportError:
+    raise unittest.SkipTest("hmtk is not available")
+
+from bootstrap import (
+    resample, replicate_catalogue, summarize, rate_band, run_bootstrap)
+
+
+def mean_magnitude(catalogue, config, completeness_table):
+    """
+    A recurrence "model" quick to compute, looked up by the workers
+    """
+    magnitudes = catalogue.data['magnitude']
+    return numpy.mean(magnitudes), numpy.std(magnitudes), 0., None
+
+OCCURRENCE_METHODS['BootstrapTestMeanMagnitude'] = mean_magnitude
+
+
+def make_catalogue(events_nr=50):
+    rng = numpy.random.RandomState(1)
+    catalogue = Catalogue()
+    catalogue.data['eventID'] = numpy.arange(events_nr)
+    catalogue.data['year'] = numpy.arange(1950, 1950 + events_nr)
+    catalogue.data['magnitude'] = rng.uniform(4., 7., events_nr)
+    catalogue.data['sigmaMagnitude'] = numpy.full(events_nr, 0.1)
+    catalogue.data['sigmaMagnitude'][::7] = numpy.nan
+    return catalogue
+
+
+class ResampleTestCase(unittest.TestCase):
+    def setUp(self):
+        self.catalogue = make_catalogue()
+
+    def test_reproducible(self):
+        rows, magnitudes = resample(
+            self.catalogue, numpy.random.RandomState(42), 20)
+        other_rows, other_magnitudes = resample(
+            self.catalogue, numpy.random.RandomState(42), 20)
+        numpy.testing.assert_array_equal(rows, other_rows)
+        numpy.testing.assert_array_equal(magnitudes, other_magnitudes)
+
+        self.assertEqual((20, 50), rows.shape)
+        # the events are kept in chronological order
+        self.assertTrue((numpy.diff(rows, axis=1) >= 0).all())
+
+    def test_perturbation(self):
+        rows, magnitudes = resample(
+            self.catalogue, numpy.random.RandomState(42), 200)
+        errors = magnitudes - self.catalogue.data['magnitude'][rows]
+        # the events without sigma are not perturbed
+        unknown = numpy.isnan(self.catalogue.data['sigmaMagnitude'][rows])
+        self.assertTrue((errors[unknown] == 0).all())
+        self.assertAlmostEqual(0.1, numpy.std(errors[~unknown]), 2)
+
+    def test_no_resampling(self):
+        rows, magnitudes = resample(
+            self.catalogue, numpy.random.RandomState(42), 3,
+            sample_events=False, perturb_magnitudes=False)
+        numpy.testing.assert_array_equal(
+            numpy.tile(numpy.arange(50), (3, 1)), rows)
+        numpy.testing.assert_array_equal(
+            numpy.tile(self.catalogue.data['magnitude'], (3, 1)),
+            magnitudes)
+
+    def test_replicate_catalogue(self):
+        rows = numpy.array([0, 0, 3])
+        replicate = replicate_catalogue(
+            self.catalogue, rows, numpy.array([5., 5.1, 5.2]))
+        numpy.testing.assert_array_equal(
+            [1950, 1950, 1953], replicate.data['year'])
+        numpy.testing.assert_array_equal(
+            [5., 5.1, 5.2], replicate.data['magnitude'])
+        self.assertEqual(50, self.catalogue.get_number_events())
+
+
+class RunBootstrapTestCase(unittest.TestCase):
+    def run_bootstrap(self, seed=3, cancelled=None):
+        return run_bootstrap(
+            'recurrence_model', 'BootstrapTestMeanMagnitude', {},
+            make_catalogue(), None, 40, seed=seed, cancelled=cancelled)
+
+    def test_reproducible(self):
+        output = self.run_bootstrap()
+        self.assertEqual((40, 4), output['replicates'].shape)
+        other = self.run_bootstrap()
+        numpy.testing.assert_array_equal(
+            output['replicates'], other['replicates'])
+        for key in ['mean', 'lower', 'upper']:
+            numpy.testing.assert_array_equal(output[key], other[key])
+
+        other = self.run_bootstrap(seed=4)
+        self.assertNotEqual(output['lower'][0], other['lower'][0])
+
+    def test_cancelled(self):
+        self.assertIsNone(self.run_bootstrap(cancelled=lambda: True))
+
+
+class SummaryTestCase(unittest.TestCase):
+    def test_summarize(self):
+        replicates = numpy.array(
+            [[float(i), numpy.nan if i % 2 else 2. * i]
+             for i in range(101)])
+        summary = summarize(replicates, 0.9)
+        numpy.testing.assert_allclose([50., 100.], summary['mean'])
+        numpy.testing.assert_allclose([5., 10.], summary['lower'])
+        numpy.testing.assert_allclose([95., 190.], summary['upper'])
+        self.assertEqual(0.9, summary['confidence'])
+
+    def test_rate_band(self):
+        rng = numpy.random.RandomState(7)
+        replicates = numpy.column_stack([
+            rng.normal(1., 0.1, 500), rng.uniform(0., 0.1, 500),
+            rng.normal(4., 0.3, 500), rng.uniform(0., 0.1, 500)])
+        replicates[3, 0] = numpy.nan
+        magnitudes = numpy.arange(4., 7., 0.5)
+        lower, upper = rate_band(replicates, magnitudes, 0.95)
+
+        # the percentiles computed one magnitude at a time
+        valid = replicates[numpy.isfinite(replicates[:, 0])]
+        for i, magnitude in enumerate(magnitudes):
+            rates = [10. ** (a - b * magnitude)
+                     for b, _, a, _ in valid]
+            self.assertAlmostEqual(
+                numpy.percentile(rates, 2.5), lower[i])
+            self.assertAlmostEqual(
+                numpy.percentile(rates, 97.5), upper[i])
+        self.assertTrue((lower < upper).all())
@@ -0,0 +1,210 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import numpy
+
+from hmtk.seismicity.catalogue import Catalogue
+
+
+# Directory where parsed catalogues are stored. Set it to an empty
+# string to disable the cache.
+CACHE_DIR = os.environ.get(
+    'HMTK_CACHE_DIR', os.path.expanduser("~/.cache/hmtk_ui"))
+
+
+class CatalogueCache(object):
+    """
+    An on-disk cache of parsed catalogues.
+
+    Each catalogue is stored in a directory named after the SHA1 of the
+    source file content, holding one .npy file per catalogue column and
+    a manifest. Columns are loaded as (copy-on-write) memory maps, so
+    reopening a catalogue is almost instantaneous and concurrent
+    sessions share the same pages.
+
+    To avoid hashing a file every time it is opened, the digest is
+    stored in an index together with the file size and modification
+    time.
+
+    :attr str directory: the cache directory
+    """
+    VERSION = 1
+    MANIFEST = 'manifest.json'
+    INDEX = 'index.json'
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+
+    def load(self, fname, parse):
+        """
+        :param str fname: the path of a catalogue file
+        :param parse:
+            a callable taking `fname` and returning a
+            :class:`hmtk.seismicity.catalogue.Catalogue`, called when
+            the catalogue is not in the cache
+        :returns: a :class:`hmtk.seismicity.catalogue.Catalogue`
+        """
+        if not self.directory:
+            return parse(fname)
+
+        path = self.path(fname)
+        try:
+            return self.read(path)
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+        catalogue = parse(fname)
+        try:
+            self.write(path, catalogue)
+        except (IOError, OSError):
+            # the cache is an optimization, a failure is not fatal
+            pass
+        return catalogue
+
+    def contains(self, fname):
+        """
+        :returns: True if the catalogue in `fname` is in the cache
+        """
+        return bool(self.directory) and os.path.exists(os.path.join(
+            self.path(fname), self.MANIFEST))
+
+    def store(self, fname, catalogue):
+        """
+        Store `catalogue`, parsed from the file `fname`, in the cache
+        """
+        if self.directory:
+            self.write(self.path(fname), catalogue)
+
+    def path(self, fname):
+        """
+        :returns: the directory where the catalogue in `fname` is stored
+        """
+        return os.path.join(self.directory, 'catalogues', self.digest(fname))
+
+    def digest(self, fname):
+        """
+        :returns:
+            the SHA1 of the content of `fname`, got from the index if
+            the file has not been changed since it was hashed
+        """
+        fname = os.path.realpath(fname)
+        stat = os.stat(fname)
+        index = self._read_index()
+
+        entry = index.get(fname)
+        if (entry is not None and entry['size'] == stat.st_size and
+                entry['mtime'] == stat.st_mtime):
+            return entry['digest']
+
+        sha1 = hashlib.sha1()
+        with open(fname, 'rb') as fobj:
+            for chunk in iter(lambda: fobj.read(1024 * 1024), b''):
+                sha1.update(chunk)
+        digest = sha1.hexdigest()
+
+        index[fname] = dict(
+            size=stat.st_size, mtime=stat.st_mtime, digest=digest)
+        try:
+            self._write_json(os.path.join(self.directory, self.INDEX), index)
+        except (IOError, OSError):
+            pass
+        return digest
+
+    def read(self, path):
+        """
+        :returns: the catalogue stored in the directory `path`
+        """
+        with open(os.path.join(path, self.MANIFEST)) as fobj:
+            manifest = json.load(fobj)
+        if manifest['version'] != self.VERSION:
+            raise ValueError("Unsupported cache version")
+
+        catalogue = Catalogue()
+        for key, column in manifest['columns'].items():
+            key = str(key)
+            if column['file'] is None:
+                catalogue.data[key] = [] if column['list'] else numpy.array(
+                    [], dtype=column['dtype'])
+            elif column['list']:
+                catalogue.data[key] = numpy.load(
+                    os.path.join(path, column['file'])).tolist()
+            else:
+                catalogue.data[key] = numpy.load(
+                    os.path.join(path, column['file']), mmap_mode='c')
+        for name, value in manifest['attributes'].items():
+            setattr(catalogue, str(name), value)
+        return catalogue
+
+    def write(self, path, catalogue):
+        """
+        Store `catalogue` in the directory `path`
+        """
+        parent = os.path.dirname(path)
+        if not os.path.exists(parent):
+            os.makedirs(parent)
+
+        # write in a temporary directory and then rename it, so that
+        # concurrent sessions never see a partially written catalogue
+        tmp_path = tempfile.mkdtemp(dir=parent)
+        try:
+            columns = {}
+            for i, (key, column) in enumerate(catalogue.data.items()):
+                entry = dict(list=isinstance(column, list), file=None,
+                             dtype=None)
+                if len(column):
+                    entry['file'] = 'column-%d.npy' % i
+                    numpy.save(os.path.join(tmp_path, entry['file']),
+                               numpy.asarray(column))
+                else:
+                    entry['dtype'] = numpy.asarray(column).dtype.str
+                columns[key] = entry
+
+            attributes = dict(
+                (name, to_json(value))
+                for name, value in vars(catalogue).items()
+                if name != 'data' and to_json(value) is not NotImplemented)
+
+            self._write_json(
+                os.path.join(tmp_path, self.MANIFEST),
+                dict(version=self.VERSION, columns=columns,
+                     attributes=attributes))
+            os.rename(tmp_path, path)
+        except OSError:
+            # another session has stored the same catalogue
+            if not os.path.exists(os.path.join(path, self.MANIFEST)):
+                raise
+        finally:
+            shutil.rmtree(tmp_path, True)
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.directory, self.INDEX)) as fobj:
+                return json.load(fobj)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write_json(self, fname, obj):
+        directory = os.path.dirname(fname)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        fd, tmp_name = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as fobj:
+            json.dump(obj, fobj)
+        os.rename(tmp_name, fname)
+
+
+def to_json(value):
+    """
+    :returns:
+        `value` converted to a JSON serializable scalar, or
+        NotImplemented if it can not be converted
+    """
+    if isinstance(value, numpy.generic):
+        value = value.item()
+    if value is None or isinstance(value, (bool, int, long, float, str,
+                                           unicode)):
+        return value
+    return NotImplemented
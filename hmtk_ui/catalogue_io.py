@@ -0,0 +1,233 @@
+"""
+Column-wise reader and writer of catalogues in the hmtk csv format.
+
+They produce (and consume) the same catalogues as
+:class:`hmtk.parsers.catalogue.csv_catalogue_parser.CsvCatalogueParser`
+and :class:`CsvCatalogueWriter`, but convert whole columns at once
+instead of growing the catalogue arrays one event at a time.
+"""
+import csv
+import itertools
+
+import numpy
+
+from hmtk.seismicity.catalogue import Catalogue
+
+
+class CatalogueReader(object):
+    """
+    Read a catalogue from a csv file.
+
+    The type of each column is inferred from the hmtk attribute lists:
+    integer attributes (e.g. year, month, day) become integer arrays
+    (float arrays, with NaN, if some values are missing, as in hmtk),
+    float attributes become float arrays and the other ones become
+    lists of strings. Fields missing at the end of a row are read as
+    empty fields; a file without events gives an empty catalogue.
+
+    :attr str fname: the path of the csv file
+    :attr bool compact_floats:
+        if True, float columns whose values are exactly representable
+        in single precision are stored as float32. It is off by default
+        as hmtk algorithms would then compute in single precision
+    """
+    def __init__(self, fname, compact_floats=False):
+        self.fname = fname
+        self.compact_floats = compact_floats
+        self.bytes_read = 0
+
+    def read(self):
+        """
+        :returns: a :class:`hmtk.seismicity.catalogue.Catalogue`
+        """
+        catalogue = Catalogue()
+        for chunk in self.chunks():
+            append_columns(catalogue, chunk)
+        if catalogue.get_number_events():
+            catalogue.update_end_year()
+        return catalogue
+
+    def chunks(self, size=None, first_size=None):
+        """
+        Read the file `size` events at a time (`first_size` events for
+        the first chunk, if given). `bytes_read` is updated as the
+        file is read.
+
+        :returns:
+            an iterator over dictionaries of columns (arrays or lists)
+            keyed by catalogue attribute
+        """
+        with open(self.fname, 'rU') as fobj:
+            reader = csv.reader(self._count_bytes(fobj))
+            header = [key.strip() for key in reader.next()]
+            keys = [(i, key) for i, key in enumerate(header)
+                    if key in Catalogue.TOTAL_ATTRIBUTE_LIST]
+
+            count = first_size or size
+            while True:
+                rows = list(itertools.islice(reader, count))
+                if not rows:
+                    break
+                columns = list(itertools.izip_longest(*rows, fillvalue=''))
+                chunk = {}
+                for i, key in keys:
+                    if i < len(columns):
+                        values = columns[i]
+                    else:
+                        values = ('',) * len(rows)
+                    chunk[key] = self.parse_column(key, values)
+                yield chunk
+
+                if count is None:
+                    break
+                count = size
+
+    def _count_bytes(self, lines):
+        for line in lines:
+            self.bytes_read += len(line)
+            yield line
+
+    def parse_column(self, key, values):
+        """
+        :param str key: a catalogue attribute
+        :param values: a sequence of strings
+        :returns: the column converted to the type of `key`
+        """
+        if key in Catalogue.INT_ATTRIBUTE_LIST:
+            return to_array(key, values, int)
+        elif key in Catalogue.FLOAT_ATTRIBUTE_LIST:
+            column = to_array(key, values, float)
+            if self.compact_floats:
+                compact = column.astype(numpy.float32)
+                if ((compact == column) | numpy.isnan(column)).all():
+                    column = compact
+            return column
+        else:
+            return list(values)
+
+
+def to_array(key, values, dtype):
+    """
+    Convert the strings `values` to an array of type `dtype`. Missing
+    values are converted to NaN.
+    """
+    try:
+        return numpy.array(values, dtype=dtype)
+    except ValueError:
+        pass
+
+    values = [value.strip() or 'nan' for value in values]
+    try:
+        if dtype is int and 'nan' not in values:
+            return numpy.array(values, dtype=int)
+        return numpy.array(values, dtype=float)
+    except ValueError:
+        raise ValueError('Input file format error in column %s' % key)
+
+
+def append_columns(catalogue, columns):
+    """
+    Append the dictionary of `columns` to the `catalogue` columns. The
+    columns are replaced, never modified in place
+    """
+    for key, values in columns.items():
+        current = catalogue.data.get(key)
+        if isinstance(values, list):
+            if current:
+                catalogue.data[key] = current + values
+            else:
+                catalogue.data[key] = values
+        elif current is None or not len(current):
+            catalogue.data[key] = values
+        else:
+            catalogue.data[key] = numpy.concatenate([current, values])
+
+
+class ColumnBuffers(object):
+    """
+    Append values to arrays in amortized constant time per value (e.g.
+    to the columns of a catalogue being loaded). The arrays returned by
+    #extend are views on buffers which double their size when they are
+    full. Only the part of a buffer beyond the view is written, so the
+    arrays returned earlier are never modified.
+    """
+    def __init__(self):
+        # (buffer, number of values held) keyed by column
+        self._buffers = {}
+
+    def extend(self, key, column, values):
+        """
+        :param key: the key of the buffer holding `column`
+        :param column: an array
+        :param values: the values to be appended to `column`
+        :returns: an array with the values of `column` and `values`
+        """
+        values = numpy.asarray(values)
+        size = len(column)
+        total = size + len(values)
+        dtype = numpy.result_type(column, values)
+
+        buf, held = self._buffers.get(key, (None, 0))
+        if (buf is None or held != size or buf.dtype != dtype or
+                total > len(buf) or not self._is_head(column, buf)):
+            buf = numpy.empty(max(total, 2 * size), dtype)
+            buf[:size] = column
+        buf[size:total] = values
+        self._buffers[key] = (buf, total)
+        return buf[:total]
+
+    def compact(self, key, column):
+        """
+        Release the buffer of `key`
+
+        :returns:
+            a copy of `column` without the spare capacity of the buffer,
+            if `column` is a view on it, otherwise `column` itself
+        """
+        buf, _ = self._buffers.pop(key, (None, 0))
+        if buf is not None and self._is_head(column, buf):
+            return column.copy()
+        return column
+
+    @staticmethod
+    def _is_head(column, buf):
+        return (isinstance(column, numpy.ndarray) and column.base is buf
+                and column.ctypes.data == buf.ctypes.data)
+
+
+def read_catalogue(fname):
+    """
+    :returns:
+        the :class:`hmtk.seismicity.catalogue.Catalogue` stored in the csv
+        file `fname`
+    """
+    return CatalogueReader(fname).read()
+
+
+def write_catalogue(catalogue, fname):
+    """
+    Write `catalogue` into the csv file `fname`, with the same layout
+    of the hmtk CsvCatalogueWriter
+    """
+    keys = Catalogue.TOTAL_ATTRIBUTE_LIST
+    events_nr = catalogue.get_number_events()
+
+    columns = []
+    for key in keys:
+        column = catalogue.data.get(key, [])
+        if isinstance(column, numpy.ndarray):
+            if column.dtype.kind == 'f' and numpy.isnan(column).all():
+                column = []
+            else:
+                column = column.tolist()
+        if len(column):
+            # the csv module writes floats with repr, without losing
+            # precision (str keeps 12 significant digits only)
+            columns.append(iter(column))
+        else:
+            columns.append(itertools.repeat('', events_nr))
+
+    with open(fname, 'wb') as fobj:
+        writer = csv.writer(fobj)
+        writer.writerow(keys)
+        writer.writerows(itertools.izip(*columns))
@@ -0,0 +1,195 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+try:
+    from hmtk.parsers.catalogue.csv_catalogue_parser import (
+        CsvCatalogueParser)
+except ImportError:
+    raise unittest.SkipTest("hmtk is not available")
+
+from catalogue_io import (
+    CatalogueReader, ColumnBuffers, read_catalogue, write_catalogue,
+    append_columns)
+from hmtk.seismicity.catalogue import Catalogue
+
+
+HEADER = ('eventID,Agency,year,month,day,hour,minute,second,'
+          'longitude,latitude,depth,magnitude,sigmaMagnitude\n')
+
+EVENTS = HEADER + '''\
+1,ISC,1990,1,2,3,4,5.5,10.1234567890123,45.5,10.0,5.1,0.1
+2,GCMT,1991,12,31,23,59,59.99,-179.5,-45.25,33.3,6.2,0.05
+3,ISC,2000,6,15,0,0,0.0,179.999,0.0,0.0,4.0,0.2
+4,NEIC,1850,7,1,12,30,1.0,-0.5,89.9,100.5,7.9,0.3
+'''
+
+
+def assert_same(expected, actual):
+    """
+    Check that the catalogues `expected` and `actual` hold exactly the
+    same values (NaN values being equal)
+    """
+    assert sorted(expected.data) == sorted(actual.data), (
+        sorted(expected.data), sorted(actual.data))
+    for key, column in expected.data.items():
+        other = actual.data[key]
+        assert type(column) == type(other), key
+        column, other = numpy.asarray(column), numpy.asarray(other)
+        assert column.dtype == other.dtype, (key, column.dtype, other.dtype)
+        if column.dtype.kind == 'f':
+            same = (column.shape == other.shape and numpy.all(
+                (column == other) | (numpy.isnan(column) &
+                                     numpy.isnan(other))))
+        else:
+            same = numpy.array_equal(column, other)
+        assert same, "Column %s differs" % key
+
+
+class CatalogueIOTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, content, name='catalogue.csv'):
+        fname = os.path.join(self.directory, name)
+        with open(fname, 'w') as fobj:
+            fobj.write(content)
+        return fname
+
+    def check_hmtk(self, content, hmtk_content=None):
+        """
+        Check that `content` is read as hmtk reads `hmtk_content` (by
+        default, the same content)
+        """
+        catalogue = read_catalogue(self.write(content))
+        expected = CsvCatalogueParser(
+            self.write(hmtk_content or content, 'hmtk.csv')).read_file()
+        assert_same(expected, catalogue)
+        return catalogue
+
+    def test_events(self):
+        catalogue = self.check_hmtk(EVENTS)
+        self.assertEqual(4, catalogue.get_number_events())
+        self.assertEqual(2000, catalogue.end_year)
+
+    def test_empty_fields(self):
+        catalogue = self.check_hmtk(HEADER + '''\
+1,,1990,1,2,3,4,,10.5,45.5,,5.1,
+2,ISC,1991,2,3,4,5,6.5,11.5,46.5,12.0,5.2,
+''')
+        self.assertEqual(['', 'ISC'], catalogue.data['Agency'])
+        self.assertTrue(numpy.isnan(catalogue.data['depth'][0]))
+        self.assertTrue(numpy.isnan(catalogue.data['sigmaMagnitude']).all())
+
+    def test_int_columns_with_nan(self):
+        catalogue = self.check_hmtk(HEADER + '''\
+1,ISC,1990,,2,3,4,5.5,10.5,45.5,10.0,5.1,0.1
+2,ISC,1991,2,,4,5,6.5,11.5,46.5,12.0,5.2,0.1
+''')
+        self.assertEqual('f', catalogue.data['month'].dtype.kind)
+        self.assertTrue(numpy.isnan(catalogue.data['month'][0]))
+        self.assertEqual(2, catalogue.data['month'][1])
+        self.assertEqual('i', catalogue.data['year'].dtype.kind)
+
+    def test_short_rows(self):
+        # the missing fields at the end of a row are read as empty ones
+        catalogue = self.check_hmtk(HEADER + '''\
+1,ISC,1990,1,2,3,4,5.5,10.5,45.5,10.0,5.1
+2,ISC,1991,2,3,4,5,6.5,11.5,46.5
+''', HEADER + '''\
+1,ISC,1990,1,2,3,4,5.5,10.5,45.5,10.0,5.1,
+2,ISC,1991,2,3,4,5,6.5,11.5,46.5,,,
+''')
+        self.assertTrue(numpy.isnan(catalogue.data['magnitude'][1]))
+
+    def test_header_only(self):
+        catalogue = read_catalogue(self.write(HEADER))
+        self.assertEqual(0, catalogue.get_number_events())
+        assert_same(Catalogue(), catalogue)
+
+    def test_chunks(self):
+        fname = self.write(EVENTS)
+        catalogue = Catalogue()
+        for chunk in CatalogueReader(fname).chunks(size=3, first_size=1):
+            append_columns(catalogue, chunk)
+        catalogue.update_end_year()
+        assert_same(read_catalogue(fname), catalogue)
+
+    def test_round_trip(self):
+        catalogue = read_catalogue(self.write(EVENTS))
+        # values which str() would truncate
+        catalogue.data['longitude'][0] = 123456.123456789
+        catalogue.data['latitude'][1] = 1. / 3
+
+        fname = os.path.join(self.directory, 'saved.csv')
+        write_catalogue(catalogue, fname)
+        saved = read_catalogue(fname)
+        # the attributes missing in the original file are written as
+        # empty fields
+        for key, column in catalogue.data.items():
+            if not len(column):
+                saved.data[key] = column
+        assert_same(catalogue, saved)
+
+
+class ColumnBuffersTestCase(unittest.TestCase):
+    def test_extend(self):
+        buffers = ColumnBuffers()
+        column = numpy.arange(3)
+        views = [column]
+        for start in range(3, 100, 7):
+            column = buffers.extend(
+                'year', column, numpy.arange(start, start + 7))
+            views.append(column)
+        numpy.testing.assert_array_equal(numpy.arange(101), column)
+        # the arrays returned earlier are unchanged
+        for view in views:
+            numpy.testing.assert_array_equal(numpy.arange(len(view)), view)
+        # the buffer has been reallocated a logarithmic number of times
+        self.assertLessEqual(
+            len(set(view.base.ctypes.data for view in views[1:])), 6)
+
+    def test_replaced_column(self):
+        buffers = ColumnBuffers()
+        column = buffers.extend('year', numpy.arange(3), [3, 4])
+        old = buffers.extend('year', column, [5])
+        # e.g. a purge replaces the column: the buffer is not reused
+        purged = old[:2].copy()
+        column = buffers.extend('year', purged, [7])
+        numpy.testing.assert_array_equal([0, 1, 7], column)
+        # an older view of the buffer is not extended over newer values
+        column = buffers.extend('year', old[:4], [8])
+        numpy.testing.assert_array_equal([0, 1, 2, 3, 8], column)
+        numpy.testing.assert_array_equal([0, 1, 2, 3, 4, 5], old)
+
+    def test_upcast(self):
+        # an integer column with missing values becomes a float one
+        buffers = ColumnBuffers()
+        column = buffers.extend('month', numpy.array([1, 2]), [3])
+        column = buffers.extend('month', column, [numpy.nan])
+        self.assertEqual('f', column.dtype.kind)
+        numpy.testing.assert_array_equal([1, 2, 3, numpy.nan], column)
+
+    def test_compact(self):
+        buffers = ColumnBuffers()
+        column = buffers.extend('year', numpy.arange(1000), [1000])
+        compacted = buffers.compact('year', column)
+        self.assertIsNone(compacted.base)
+        numpy.testing.assert_array_equal(numpy.arange(1001), compacted)
+
+        other = numpy.arange(3)
+        self.assertIs(other, buffers.compact('month', other))
+
+    def test_append_columns_copies_lists(self):
+        catalogue = Catalogue()
+        append_columns(catalogue, {'Agency': ['ISC']})
+        agencies = catalogue.data['Agency']
+        append_columns(catalogue, {'Agency': ['GCMT']})
+        self.assertEqual(['ISC'], agencies)
+        self.assertEqual(['ISC', 'GCMT'], catalogue.data['Agency'])
@@ -1,6 +1,5 @@
 import os
 import collections
-import tempfile
 
 import numpy
 
@@ -9,20 +8,18 @@ from openquake.hazardlib import mfd
 from openquake.hazardlib import scalerel
 from openquake.hazardlib import source
 
-from openquake.nrmllib import models as nrml_models
 from shapely import wkt
+from shapely.geometry import Polygon
 
 from PyQt4.QtCore import QVariant, QFileInfo
 
-from osgeo import gdal, osr
 import math
 
 from qgis.core import (
     QgsVectorLayer, QgsRasterLayer, QgsRaster,
     QgsField, QgsFields, QgsFeature, QgsGeometry, QgsPoint,
     QgsMapLayerRegistry, QgsPluginLayerRegistry,
-    QgsRectangle, QgsCoordinateReferenceSystem,
-    QgsCoordinateTransform, QgsFeatureRequest,
+    QgsCoordinateReferenceSystem, QgsCoordinateTransform,
     QgsRasterShader, QgsColorRampShader, QgsStyleV2,
     QgsFillSymbolV2, QgsSingleSymbolRendererV2, QgsLabel)
 from qgis.gui import QgsMapCanvasLayer
@@ -32,6 +29,40 @@ from openlayers_plugin.openlayers_plugin import (
 
 import utils
 import styles
+import raster
+from catalogue_io import ColumnBuffers
+from spatial_index import SpatialIndex, EARTH_RADIUS, densify
+from fault_surfaces import FaultSurfaces, fault_data
+from pyramid import Pyramid
+from refresh_scheduler import RefreshScheduler
+
+
+# number of features added to the catalogue layer with a single call
+# to the data provider
+FEATURE_BATCH_SIZE = 50000
+
+# fraction of the map width within which events and sources are picked
+PICK_TOLERANCE = 0.05
+
+# maximum distance (in degrees) between the points of the fault outlines
+# indexed for picking
+OUTLINE_SPACING = 0.01
+
+SourceStyle = collections.namedtuple('SourceStyle', 'layer_type color')
+
+# the layer geometry type and the colour of the supported source types
+SOURCE_STYLES = {
+    'PointSource': SourceStyle('Point', '255,255,255,185'),
+    'AreaSource': SourceStyle('Polygon', '0,255,255,185'),
+    'SimpleFaultSource': SourceStyle('Polygon', '0,50,255,185'),
+    'ComplexFaultSource': SourceStyle('Polygon', '50,50,50,185')}
+
+# Above this number of events in the map extent, the catalogue is drawn
+# as a grid of aggregates (see :mod:`pyramid`) instead of single events
+LOD_THRESHOLD = int(os.environ.get('HMTK_LOD_THRESHOLD', 100000))
+
+# minimum number of cells of the aggregates grid across the map width
+LOD_CELLS_ACROSS = 100
 
 
 class CatalogueMap(object):
@@ -58,8 +89,40 @@ class CatalogueMap(object):
     :attr raster_layer:
        A QGIS raster layer used to display smoothed seismicity data
 
-    :attr dict event_feature_ids:
-       A dict of QgsFeatureIDs keyed by eventID string
+    :attr str raster_file:
+       The file (in the GDAL in-memory filesystem) of `raster_layer`
+
+    :attr raster_grid:
+       The gridded values and the geotransform of the smoothed
+       seismicity shown in `raster_layer` (see :func:`raster.grid`)
+
+    :attr str catalogue_style:
+       the style of the catalogue layer (see #set_catalogue_style)
+
+    :attr renderers:
+       A :class:`styles.RendererCache` with the renderers of the
+       catalogue layer
+
+    :attr event_fids:
+       A numpy array with the QgsFeatureIDs of the catalogue events,
+       aligned to the catalogue rows
+
+    :attr sources:
+       A :class:`fault_surfaces.FaultSurfaces` holding the hazardlib
+       surfaces of the simple fault sources keyed by source id
+
+    :attr aggregate_layer:
+       A layer holding the aggregates of the events shown instead of
+       the catalogue layer when too many events are visible
+
+    :attr aggregate_level:
+       The level of the pyramid shown in the aggregate layer, or None
+       if the single events are shown
+
+    :attr refresh_scheduler:
+       A :class:`refresh_scheduler.RefreshScheduler` through which the
+       layer set is updated and the map is rendered, once per event
+       loop iteration
     """
     def __init__(self, canvas, catalogue_model):
         """
@@ -68,8 +131,26 @@ class CatalogueMap(object):
         """
         self.canvas = canvas
         self.catalogue_model = catalogue_model
-        self.event_feature_ids = None
-        self.sources = dict()
+        self.refresh_scheduler = RefreshScheduler(canvas, self.layer_set)
+        self.event_fids = None
+        # the buffer of event_fids, grown as events are appended
+        self._fid_buffers = ColumnBuffers()
+        self.catalogue_style = None
+        self.renderers = styles.RendererCache()
+        self.sources = FaultSurfaces()
+        # the outlines (surface projections) of the simple fault sources
+        self._source_outlines = {}
+
+        # built on first use (see #event_index and #source_index)
+        self._event_index = None
+        self._source_index = None
+        self._source_ids = None
+        self._pyramid = None
+
+        # set by #update_level_of_detail
+        self.aggregate_layer = None
+        self.aggregate_level = None
+        self._aggregate_fids = []
 
         self.catalogue_layer = make_inmemory_layer("catalogue")
         self.populate_catalogue_layer(catalogue_model.catalogue)
@@ -85,11 +166,16 @@ class CatalogueMap(object):
 
         # initialized later
         self.raster_layer = None
+        self.raster_file = None
+        self.raster_grid = None
         self.source_layers = dict()
 
         # Initialize Map
         self.reset_map()
 
+        self.canvas.extentsChanged.connect(self.update_level_of_detail)
+        self.update_level_of_detail()
+
     def load_basemap(self):
         layer_path = os.path.join(
             os.path.dirname(__file__),
@@ -104,33 +190,38 @@ class CatalogueMap(object):
     def reset_map(self):
         """
         Reset the map by loading the catalogue and the basemap layers
+        (when control returns to the event loop)
+        """
+        self.refresh_scheduler.invalidate_layers()
+
+    def layer_set(self):
+        """
+        :returns: the layers shown in the map, from the top one
         """
         catalogue = []
         if self.raster_layer:
             catalogue.append(QgsMapCanvasLayer(self.raster_layer))
-        catalogue.append(QgsMapCanvasLayer(self.catalogue_layer))
-        self.canvas.setLayerSet(
-            catalogue +
-            [QgsMapCanvasLayer(s) for s in self.source_layers.values()] +
-            [QgsMapCanvasLayer(self.basemap_layer)])
-        self.canvas.refresh()
+        if self.aggregate_level is None:
+            catalogue.append(QgsMapCanvasLayer(self.catalogue_layer))
+        else:
+            catalogue.append(QgsMapCanvasLayer(self.aggregate_layer))
+        return (catalogue +
+                [QgsMapCanvasLayer(s) for s in self.source_layers.values()] +
+                [QgsMapCanvasLayer(self.basemap_layer)])
 
     def set_catalogue_style(self, style):
-        layer = self.catalogue_layer
-
-        if style == "depth-magnitude":
-            renderer = styles.CatalogueDepthMagnitudeRenderer
-        elif style == "completeness":
-            renderer = styles.CatalogueCompletenessRenderer
-        elif style == "cluster":
-            renderer = styles.CatalogueClusterRenderer
-        elif style == "default":
-            renderer = styles.CatalogueDefaultRenderer
-        else:
+        """
+        Render the catalogue layer with the renderer of `style` (see
+        :data:`styles.CATALOGUE_RENDERERS`), reused from the renderer
+        cache unless the catalogue columns it depends on have changed
+        """
+        if style not in styles.CATALOGUE_RENDERERS:
             raise NotImplementedError("Unsupported style %s" % style)
 
-        layer.setRendererV2(renderer.make(self))
-        layer.triggerRepaint()
+        layer = self.catalogue_layer
+        self.catalogue_style = style
+        layer.setRendererV2(self.renderers.get(style, self))
+        self.refresh_scheduler.repaint(layer)
 
     def populate_catalogue_layer(self, catalogue):
         """
@@ -141,69 +232,99 @@ class CatalogueMap(object):
         """
         vl = self.catalogue_layer
         pr = vl.dataProvider()
-        vl.startEditing()
-
-        # Set field types (the schema of the vector layer)
-        fields = []
-        mock_attributes = ["_magnitude"]
-
-        for key in catalogue.data.keys() + mock_attributes:
-            if key in mock_attributes:
-                key_norm = key[1:]
-            else:
-                key_norm = key
-            if isinstance(key_norm, numpy.ndarray):
-                fields.append(QgsField(key, QVariant.Double))
-            else:
-                fields.append(QgsField(key, QVariant.String))
-
-        pr.addAttributes(fields)
+        pr.addAttributes(catalogue_fields(catalogue))
+        vl.updateFields()
 
-        qgs_fields = QgsFields()
-        for f in fields:
-            qgs_fields.append(f)
-
-        # Create the features
-        features = []
-        for i in range(catalogue.get_number_events()):
-            fet = QgsFeature()
-            fet.setFields(qgs_fields)
-
-            x = catalogue.data['longitude'][i]
-            y = catalogue.data['latitude'][i]
-            fet.setGeometry(QgsGeometry.fromPoint(QgsPoint(x, y)))
-
-            for key in catalogue.data:
-                event_data = catalogue.data[key]
-                if len(event_data):
-                    if isinstance(catalogue.data[key], numpy.ndarray):
-                        fet[key] = float(event_data[i])
-                    else:
-                        fet[key] = str(event_data[i])
-            fet['_magnitude'] = fet['magnitude'] ** 2
-            features.append(fet)
-        pr.addFeatures(features)
-        vl.commitChanges()
-
-        self.event_feature_ids = dict([
-            (f['eventID'], f.id()) for f in vl.getFeatures()])
+        self.event_fids = self._add_features(
+            catalogue, numpy.arange(catalogue.get_number_events()))
 
         # Set the canvas extent to avoid projection problems and to
         # pan to the loaded events
         vl.updateExtents()
 
+    def _add_features(self, catalogue, rows):
+        """
+        Add to the catalogue layer the features of the events at `rows`,
+        in batches of FEATURE_BATCH_SIZE features
+
+        :returns: an array with the ids of the new features
+        """
+        pr = self.catalogue_layer.dataProvider()
+        fids = []
+        for start in xrange(0, len(rows), FEATURE_BATCH_SIZE):
+            _, features = pr.addFeatures(make_features(
+                catalogue, rows[start:start + FEATURE_BATCH_SIZE],
+                pr.fields()))
+            fids.extend(feature.id() for feature in features)
+        return numpy.array(fids, dtype=numpy.int64)
+
+    def add_events(self, rows):
+        """
+        Add to the catalogue layer the features of the events at `rows`
+        (e.g. events appended while loading, or restored by an undo)
+        """
+        catalogue = self.catalogue_model.catalogue
+        rows = numpy.asarray(rows, dtype=int)
+        fids = self._add_features(catalogue, rows)
+
+        old_size = len(self.event_fids)
+        if numpy.array_equal(
+                rows, numpy.arange(old_size, old_size + len(rows))):
+            # events appended (e.g. while loading)
+            self.event_fids = self._fid_buffers.extend(
+                'fid', self.event_fids, fids)
+        else:
+            # the rows of the events already in the layer
+            old_rows = numpy.ones(catalogue.get_number_events(), dtype=bool)
+            old_rows[rows] = False
+            event_fids = numpy.empty(len(old_rows), dtype=numpy.int64)
+            event_fids[old_rows] = self.event_fids
+            event_fids[rows] = fids
+            self.event_fids = event_fids
+
+        self.catalogue_layer.updateExtents()
+        self.refresh_scheduler.repaint(self.catalogue_layer)
+
+    def remove_events(self, removed):
+        """
+        Delete from the catalogue layer the features of the events
+        flagged in the boolean array `removed` (e.g. events purged from
+        the catalogue), with a single call to the data provider
+        """
+        removed = numpy.asarray(removed, dtype=bool)
+        self.catalogue_layer.dataProvider().deleteFeatures(
+            self.event_fids[removed].tolist())
+        self.event_fids = self.event_fids[~removed]
+        self.update_level_of_detail()
+        self.catalogue_layer.updateExtents()
+        self.refresh_scheduler.repaint(self.catalogue_layer)
+
     @staticmethod
     def magnitude_to_display_size(x):
         return math.exp(x)/10
 
     def change_catalogue_model(self, catalogue_model):
         """
-        Load a new catalogue model (replace the old one)
+        Load a new catalogue model (replace the old one). A new layer
+        is built off-screen and then it replaces the old one in the
+        layer registry and in the map, so the old features do not need
+        to be deleted
         """
+        old_layer = self.catalogue_layer
         self.catalogue_model = catalogue_model
-        self.clear_features(self.catalogue_layer)
+        self.catalogue_layer = make_inmemory_layer("catalogue", False)
         self.populate_catalogue_layer(catalogue_model.catalogue)
+        # the cached renderers refer to the old model
+        self.renderers = styles.RendererCache()
+        self.set_catalogue_style(self.catalogue_style)
+        if old_layer.hasLabelsEnabled():
+            self.set_catalogue_labels(True)
+
+        registry = QgsMapLayerRegistry.instance()
+        registry.addMapLayer(self.catalogue_layer)
+        self.update_level_of_detail()
         self.reset_map()
+        registry.removeMapLayer(old_layer.id())
 
     def load_osm_plugin(self):
         """
@@ -245,7 +366,9 @@ class CatalogueMap(object):
         # layer) such that the underlying basemap layer data is not
         # garbage collected
         self.basemap_layer = self.load_osm(self.ol_plugin)
+        # the basemap has to be in the layer set before zooming
         self.reset_map()
+        self.refresh_scheduler.flush()
 
         # This zoom is required to initialize the map canvas
         self.canvas.zoomByFactor(1.1)
@@ -271,64 +394,208 @@ class CatalogueMap(object):
         self.catalogue_layer.removeSelection()
         self.catalogue_layer.select([f.id() for f in selected_features])
 
-    def clear_features(self, layer):
-        """
-        Delete all the features from `layer`
-        """
-        layer.startEditing()
-        for feat in layer.getFeatures():
-            layer.deleteFeature(feat.id())
-        layer.commitChanges()
-
     def select(self, event_ids):
         """
         Select features with Feature ID `fids` and center the map on
         them
         """
-        fids = [self.event_feature_ids[event_id] for event_id in event_ids]
+        rows = numpy.in1d(
+            self.catalogue_model.catalogue.data['eventID'], event_ids)
         self.catalogue_layer.removeSelection()
-        self.catalogue_layer.select(fids)
+        self.catalogue_layer.select(self.event_fids[rows].tolist())
 
-    def update_catalogue_layer(self, attr_names):
+    def update_catalogue_layer(self, attr_names, style=None):
         """
-        Update layer as in catalogue columns `attr_names` are changed
+        Update layer as in catalogue columns `attr_names` are changed,
+        with a single call to the data provider.
+
+        :param style:
+            the catalogue style to be set after the update (see
+            #set_catalogue_style). By default the current style is kept
+            (and its renderer is made again if it depends on the changed
+            columns)
         """
         layer = self.catalogue_layer
-        layer.startEditing()
-
-        for i, event_id in enumerate(
-                self.catalogue_model.catalogue.data['eventID']):
-            feature = self.catalogue_layer.getFeatures(
-                QgsFeatureRequest(self.event_feature_ids[event_id])).next()
-            for attr in attr_names:
-                feature[attr] = self.catalogue_model.catalogue.data[attr][i]
-            layer.updateFeature(feature)
-        layer.commitChanges()
-        layer.rendererV2().update_syms(self.catalogue_model.catalogue)
-        layer.triggerRepaint()
-        self.canvas.refresh()
+        pr = layer.dataProvider()
+        catalogue = self.catalogue_model.catalogue
+
+        indices = [pr.fieldNameIndex(attr) for attr in attr_names]
+        columns = [attribute_values(catalogue.data[attr])
+                   for attr in attr_names]
+        pr.changeAttributeValues(dict(
+            (fid, dict(zip(indices, values)))
+            for fid, values in zip(self.event_fids.tolist(), zip(*columns))))
+
+        self.set_catalogue_style(style or self.catalogue_style)
+
+    @property
+    def event_index(self):
+        """
+        The :class:`spatial_index.SpatialIndex` of the catalogue events
+        (indexed by catalogue row). It is rebuilt only when the event
+        coordinates change
+        """
+        versions = self.catalogue_model.column_versions
+        version = (self.catalogue_model,
+                   versions['longitude'], versions['latitude'])
+        if (self._event_index is None or
+                self._event_index.version != version):
+            catalogue = self.catalogue_model.catalogue
+            self._event_index = SpatialIndex(
+                catalogue.data['longitude'], catalogue.data['latitude'],
+                version)
+        return self._event_index
+
+    @property
+    def source_index(self):
+        """
+        The :class:`spatial_index.SpatialIndex` of the points of the
+        outlines of the simple fault sources (so that the fault surfaces
+        are not needed to pick a source). The source ids of the points
+        are in `_source_ids`
+        """
+        if self._source_index is None:
+            ids, lons, lats = [], [], []
+            for source_id, (trace_lons, trace_lats) in (
+                    self._source_outlines.items()):
+                # close the ring
+                outline_lons, outline_lats = densify(
+                    numpy.append(trace_lons, trace_lons[0]),
+                    numpy.append(trace_lats, trace_lats[0]),
+                    OUTLINE_SPACING)
+                ids.extend([source_id] * len(outline_lons))
+                lons.append(outline_lons)
+                lats.append(outline_lats)
+            self._source_ids = ids
+            self._source_index = SpatialIndex(
+                numpy.concatenate(lons) if lons else [],
+                numpy.concatenate(lats) if lats else [])
+        return self._source_index
+
+    @property
+    def pyramid(self):
+        """
+        The :class:`pyramid.Pyramid` of the catalogue events. It is
+        rebuilt only when the event coordinates or magnitudes change
+        """
+        versions = self.catalogue_model.column_versions
+        version = (self.catalogue_model, versions['longitude'],
+                   versions['latitude'], versions['magnitude'])
+        if self._pyramid is None or self._pyramid.version != version:
+            data = self.catalogue_model.catalogue.data
+            self._pyramid = Pyramid(
+                data['longitude'], data['latitude'], data['magnitude'],
+                version)
+        return self._pyramid
+
+    def update_level_of_detail(self):
+        """
+        Show the aggregates of the events, at a resolution depending on
+        the zoom, if more than LOD_THRESHOLD events are in the map
+        extent; otherwise show the single events
+        """
+        extent = self.canvas.mapRenderer().mapToLayerCoordinates(
+            self.catalogue_layer, self.canvas.extent())
+        bounds = (extent.xMinimum(), extent.yMinimum(),
+                  extent.xMaximum(), extent.yMaximum())
+
+        level = None
+        if self.pyramid.count_within(*bounds) > LOD_THRESHOLD:
+            level = self.pyramid.level_for(extent.width(), LOD_CELLS_ACROSS)
+            self.show_aggregates(self.pyramid.levels[level], bounds)
+
+        switched = (level is None) != (self.aggregate_level is None)
+        self.aggregate_level = level
+        if switched:
+            self.reset_map()
+
+    def show_aggregates(self, level, bounds):
+        """
+        Fill the aggregate layer with the cells of the pyramid `level`
+        within `bounds` (xmin, ymin, xmax, ymax)
+        """
+        if self.aggregate_layer is None:
+            self.aggregate_layer = make_inmemory_layer("catalogue density")
+            self.aggregate_layer.dataProvider().addAttributes(
+                [QgsField("count", QVariant.Double),
+                 QgsField("max_magnitude", QVariant.Double)])
+            self.aggregate_layer.updateFields()
+            self.aggregate_layer.setRendererV2(
+                styles.CatalogueAggregateRenderer.make(self))
+
+        pr = self.aggregate_layer.dataProvider()
+        pr.deleteFeatures(self._aggregate_fids)
+
+        within = level.within(*bounds)
+        lons, lats = level.centers()
+        features = []
+        for x, y, count, max_magnitude in zip(
+                lons[within].tolist(), lats[within].tolist(),
+                level.count[within].tolist(),
+                level.max_magnitude[within].tolist()):
+            fet = QgsFeature(pr.fields())
+            fet.setGeometry(QgsGeometry.fromPoint(QgsPoint(x, y)))
+            fet.setAttributes([float(count), max_magnitude])
+            features.append(fet)
+        _, features = pr.addFeatures(features)
+        self._aggregate_fids = [feature.id() for feature in features]
+
+        self.aggregate_layer.updateExtents()
+        self.refresh_scheduler.repaint(self.aggregate_layer)
+
+    def pick_tolerance(self):
+        """
+        :returns:
+            the maximum distance (in km) of the events and the sources
+            picked on the map (PICK_TOLERANCE of the map width)
+        """
+        extent = self.canvas.mapRenderer().mapToLayerCoordinates(
+            self.catalogue_layer, self.canvas.extent())
+        return math.radians(extent.width()) * EARTH_RADIUS * PICK_TOLERANCE
+
+    def to_lon_lat(self, point):
+        """
+        :returns: `point` (in map coordinates) as longitude and latitude
+        """
+        point = self.canvas.mapRenderer().mapToLayerCoordinates(
+            self.catalogue_layer, point)
+        return point.x(), point.y()
+
+    def nearest_events(self, point, k=1):
+        """
+        :param point: a :class:`QgsPoint` in map coordinates
+        :returns:
+            the catalogue rows of the (at most `k`) events nearest to
+            `point` within the pick tolerance, sorted by distance
+        """
+        lon, lat = self.to_lon_lat(point)
+        _, rows = self.event_index.nearest(
+            lon, lat, k, self.pick_tolerance())
+        return rows
+
+    def nearest_source(self, point):
+        """
+        :param point: a :class:`QgsPoint` in map coordinates
+        :returns:
+            the id of the simple fault source nearest to `point` within
+            the pick tolerance, or None
+        """
+        lon, lat = self.to_lon_lat(point)
+        _, indices = self.source_index.nearest(
+            lon, lat, max_distance=self.pick_tolerance())
+        if len(indices):
+            return self._source_ids[indices[0]]
 
     def show_tip(self, point):
-        rectangle = QgsRectangle()
-        radius = self.canvas.extent().width() / 100 * 5  # 5% of the map width
-        rectangle.setXMinimum(point.x() - radius)
-        rectangle.setYMinimum(point.y() - radius)
-        rectangle.setXMaximum(point.x() + radius)
-        rectangle.setYMaximum(point.y() + radius)
-
-        layer_rectangle = self.canvas.mapRenderer().mapToLayerCoordinates(
-            self.catalogue_layer, rectangle)
-
-        features = self.catalogue_layer.getFeatures(
-            QgsFeatureRequest().setFilterRect(layer_rectangle))
-
-        # assume the first one is the closest
-        try:
-            feat = features.next()
+        rows = self.nearest_events(point)
+        if len(rows):
+            catalogue = self.catalogue_model.catalogue
             msg_lines = ["Event Found"]
             for k in self.catalogue_model.catalogue_keys():
-                msg_lines.append("%s=%s" % (k, feat[k]))
-        except StopIteration:
+                column = catalogue.data[k]
+                msg_lines.append("%s=%s" % (
+                    k, column[rows[0]] if len(column) else None))
+        else:
             msg_lines = ["No Event found"]
 
         if self.raster_layer is not None:
@@ -346,148 +613,135 @@ class CatalogueMap(object):
         utils.alert('\n'.join(msg_lines))
 
     def set_raster(self, matrix):
-        layer = create_raster_layer(matrix)
+        """
+        Show the smoothed seismicity `matrix`. The raster is written
+        (untiled and without overviews, so that it can be shown at
+        once) in the GDAL in-memory filesystem
+        """
+        self.raster_grid = raster.grid(matrix)
+        filename = raster.memory_filename()
+        raster.write_raster(*self.raster_grid, filename=filename)
+        self.set_raster_file(filename)
+
+    def set_raster_file(self, filename):
+        """
+        Replace the raster layer with a layer reading the raster
+        `filename` of the current `raster_grid` (e.g. a copy of the
+        current raster with overviews)
+        """
+        layer = create_raster_layer(
+            filename, raster.value_range(self.raster_grid[0]))
         if self.raster_layer is not None:
             QgsMapLayerRegistry.instance().removeMapLayer(
                 self.raster_layer.id())
+            raster.remove(self.raster_file)
         self.raster_layer = layer
-        layer.reload()
+        self.raster_file = filename
         self.reset_map()
 
-    def add_source_layers(self, sources):
+    def add_source_features(self, stype, features, faults):
         """
-        :param list sources:
-            a list of nrmllib Source Models (e.g. SimpleFaultSource)
+        Add to the layer of the sources of type `stype` a batch of
+        features (see :func:`source_features`). The layer is created
+        with the first batch.
+
+        :param list faults:
+            the id, the fault parameters and the outline of the simple
+            faults among the sources, whose surfaces are built on first
+            use (see :class:`fault_surfaces.FaultSurfaces`)
         """
-        source_type = collections.namedtuple(
-            'SourceType', 'layer_type transform color')
-
-        geometries = {
-            'PointSource': source_type(
-                'Point', lambda x: x.geometry.wkt, "255,255,255,185"),
-            'AreaSource': source_type(
-                'Polygon', lambda x: x.geometry.wkt, '0,255,255,185'),
-            'SimpleFaultSource': source_type(
-                'Polygon',
-                lambda x: simple_surface_from_source(x).wkt,
-                '0,50,255,185'),
-            'ComplexFaultSource': source_type(
-                'MultiPolygon', lambda _: NotImplementedError, '50,50,50,185')}
-
-        source_dict = collections.defaultdict(list)
-
-        for s in sources:
-            source_dict[s.__class__.__name__].append(s)
-
-        for stype, sources in source_dict.items():
+        layer = self.source_layers.get(stype)
+        if layer is None:
             layer = QgsVectorLayer(
-                '%s?crs=epsg:4326' % (
-                    geometries[stype].layer_type),
+                '%s?crs=epsg:4326' % SOURCE_STYLES[stype].layer_type,
                 stype, 'memory')
-            QgsMapLayerRegistry.instance().addMapLayer(layer)
-            pr = layer.dataProvider()
-            layer.startEditing()
-
-            fields = [QgsField("source_id", QVariant.String)]
-            pr.addAttributes(fields)
-
-            qgs_fields = QgsFields()
-            for field in fields:
-                qgs_fields.append(field)
-
-            features = []
-            for src in sources:
-                fet = QgsFeature()
-                fet.setFields(qgs_fields)
-                fet['source_id'] = src.id
-                if stype == 'SimpleFaultSource':
-                    self.sources[src.id] = _nrml_to_hazardlib(src, 1.)
-                fet.setGeometry(QgsGeometry.fromWkt(
-                    geometries[stype].transform(src)))
-                features.append(fet)
-            pr.addFeatures(features)
-            layer.commitChanges()
-            layer.updateExtents()
+            layer.dataProvider().addAttributes(
+                [QgsField("source_id", QVariant.String)])
+            layer.updateFields()
 
             symbol = QgsFillSymbolV2.createSimple(
                 {'style': 'diagonal_x',
-                 'color': geometries[stype].color,
+                 'color': SOURCE_STYLES[stype].color,
                  'style_border': 'solid'})
             layer.setRendererV2(QgsSingleSymbolRendererV2(symbol))
 
+            QgsMapLayerRegistry.instance().addMapLayer(layer)
             self.source_layers[stype] = layer
+            self.reset_map()
 
-        self.reset_map()
+        layer.dataProvider().addFeatures(features)
+        layer.updateExtents()
+        self.refresh_scheduler.repaint(layer)
+
+        for source_id, data, lons, lats in faults:
+            self.sources.add(source_id, data)
+            self._source_outlines[source_id] = (lons, lats)
+        if faults:
+            self._source_index = None
 
     def toggle_catalogue_labels(self):
+        self.set_catalogue_labels(
+            not self.catalogue_layer.hasLabelsEnabled())
+        self.refresh_scheduler.repaint(self.catalogue_layer)
+
+    def set_catalogue_labels(self, enabled):
         label = self.catalogue_layer.label()
         attributes = label.labelAttributes()
         attributes.setOffset(0, 15, 1)
         label.setLabelField(
             QgsLabel.Text, self.catalogue_layer.fieldNameIndex("eventID"))
-        self.catalogue_layer.enableLabels(
-            not self.catalogue_layer.hasLabelsEnabled())
-        self.reset_map()
+        self.catalogue_layer.enableLabels(enabled)
 
     def toggle_sources_labels(self):
         for layer in self.source_layers.values():
             label = layer.label()
             label.setLabelField(QgsLabel.Text, layer.fieldNameIndex("eventID"))
             layer.enableLabels(not layer.hasLabelsEnabled())
-        self.reset_map()
-
-
-def create_raster_layer(matrix):
-    driver = gdal.GetDriverByName("GTiff")
+        self.refresh_scheduler.repaint(*self.source_layers.values())
 
-    filename = tempfile.mktemp(prefix="hmtk", suffix=".tif")
 
-    # sort the data by lon, lat
-    gridded_data = numpy.array(
-        sorted(matrix, key=lambda row: (90 + row[1]) * 180 + (180 + row[0])))
+def create_raster_layer(filename, value_range):
+    """
+    Load the smoothed seismicity raster `filename`, with values in
+    `value_range` (min, max), in a layer
+    """
+    layer = QgsRasterLayer(filename, QFileInfo(filename).baseName())
 
-    # extract it into separate vars
-    lons, lats, vals = (
-        gridded_data[:, 0], gridded_data[:, 1], gridded_data[:, 3])
+    rasterShader = QgsRasterShader()
+    colorRampShader = QgsColorRampShader()
 
-    ncols = lons[lons == lons[0]].size
-    nrows = lats[lats == lats[0]].size
+    # the value range is got from the grid, rather than by computing
+    # the band statistics
+    colorRampShader.setColorRampItemList(color_ramp_items(*value_range))
+    colorRampShader.setColorRampType(QgsColorRampShader.INTERPOLATED)
+    rasterShader.setRasterShaderFunction(colorRampShader)
 
-    # put values in a grid
-    gridded_vals = vals.reshape((ncols, nrows)).T
+    layer.setDrawingStyle('SingleBandPseudoColor')
+    layer.renderer().setShader(rasterShader)
 
-    dataset = driver.Create(filename, ncols, nrows, 1, gdal.GDT_Float32)
+    QgsMapLayerRegistry.instance().addMapLayer(layer)
 
-    dataset.SetGeoTransform((
-        min(lons),
-        (max(lons) - min(lons)) / ncols,
-        0,
-        max(lats),
-        0,
-        -(max(lats) - min(lats)) / nrows))
+    return layer
 
-    out_srs = osr.SpatialReference()
-    out_srs.ImportFromEPSG(4326)
-    dataset.SetProjection(out_srs.ExportToWkt())
 
-    out_band = dataset.GetRasterBand(1)
-    out_band.WriteArray(gridded_vals)
-    out_band.SetNoDataValue(0)
-    out_band.FlushCache()
-    out_band = None
-    dataset = None
+# the color ramp items of the smoothed seismicity rasters keyed by
+# value range
+_color_ramp_items = {}
 
-    fileInfo = QFileInfo(filename)
-    baseName = fileInfo.baseName()
-    layer = QgsRasterLayer(filename, baseName)
 
-    stat = layer.dataProvider().bandStatistics(1)
+def color_ramp_items(minVal, maxVal):
+    """
+    :returns:
+        the items of the color ramp shader of a smoothed seismicity
+        raster with values in [`minVal`, `maxVal`], computed once for
+        each value range
+    """
+    if (minVal, maxVal) in _color_ramp_items:
+        return _color_ramp_items[minVal, maxVal]
 
-    minVal = stat.minimumValue
-    maxVal = stat.maximumValue
     entries_nr = 20
 
-    colorRamp = QgsStyleV2().defaultStyle().colorRamp("Spectral")
+    colorRamp = QgsStyleV2.defaultStyle().colorRamp("Spectral")
     currentValue = float(minVal)
     intervalDiff = float(maxVal - minVal) / float(entries_nr - 1)
 
@@ -501,27 +755,139 @@ def create_raster_layer(matrix):
         item.color.setAlphaF(0.75)
         colorRampItems.append(item)
 
-    rasterShader = QgsRasterShader()
-    colorRampShader = QgsColorRampShader()
+    _color_ramp_items[minVal, maxVal] = colorRampItems
+    return colorRampItems
 
-    colorRampShader.setColorRampItemList(colorRampItems)
-    colorRampShader.setColorRampType(QgsColorRampShader.INTERPOLATED)
-    rasterShader.setRasterShaderFunction(colorRampShader)
 
-    layer.setDrawingStyle('SingleBandPseudoColor')
-    layer.renderer().setShader(rasterShader)
+def is_numeric(column):
+    return (isinstance(column, numpy.ndarray) and
+            column.dtype.kind in 'biuf')
 
-    QgsMapLayerRegistry.instance().addMapLayer(layer)
 
-    return layer
+def catalogue_fields(catalogue):
+    """
+    :returns:
+        the fields of the catalogue layer (the schema of the vector
+        layer): one for each catalogue key, plus _magnitude used to
+        scale the symbols
+    """
+    fields = []
+    for key, column in catalogue.data.items():
+        if is_numeric(column):
+            fields.append(QgsField(key, QVariant.Double))
+        else:
+            fields.append(QgsField(key, QVariant.String))
+    fields.append(QgsField("_magnitude", QVariant.Double))
+    return fields
+
+
+def attribute_values(column, rows=None):
+    """
+    :returns:
+        a list with the values of the catalogue `column` (at `rows`, or
+        at all the rows) suitable for the attributes of the features
+    """
+    if rows is None:
+        rows = numpy.arange(len(column))
+    if not len(column):
+        return [None] * len(rows)
+    elif is_numeric(column):
+        return column[rows].astype(float).tolist()
+    return [str(column[row]) for row in rows]
+
+
+def make_features(catalogue, rows, qgs_fields):
+    """
+    Build the features for the events at `rows`. The attribute values
+    are extracted column-wise from the catalogue.
+
+    :returns: a list of :class:`QgsFeature`
+    """
+    data = catalogue.data
+    columns = []
+    for i in range(qgs_fields.count()):
+        key = str(qgs_fields[i].name())
+        if key == "_magnitude":
+            columns.append(
+                (numpy.asarray(data['magnitude'], dtype=float)[rows] ** 2
+                 ).tolist())
+        else:
+            columns.append(attribute_values(data.get(key, []), rows))
+
+    points = zip(numpy.asarray(data['longitude'])[rows].tolist(),
+                 numpy.asarray(data['latitude'])[rows].tolist())
+
+    features = []
+    for (x, y), attributes in zip(points, zip(*columns)):
+        fet = QgsFeature(qgs_fields)
+        fet.setGeometry(QgsGeometry.fromPoint(QgsPoint(x, y)))
+        fet.setAttributes(list(attributes))
+        features.append(fet)
+    return features
 
 
-def make_inmemory_layer(name):
+def make_inmemory_layer(name, register=True):
+    """
+    :param bool register:
+        False to add the layer to the registry later (e.g. after that it
+        has been populated)
+    """
     layer = QgsVectorLayer('Point?crs=epsg:4326', name, 'memory')
-    QgsMapLayerRegistry.instance().addMapLayer(layer)
+    if register:
+        QgsMapLayerRegistry.instance().addMapLayer(layer)
     return layer
 
 
+def source_fields():
+    fields = QgsFields()
+    fields.append(QgsField("source_id", QVariant.String))
+    return fields
+
+
+def source_features(stype, sources):
+    """
+    Build the features of the nrml `sources` of type `stype` (one of
+    SOURCE_STYLES). Faults are shown by the outline of their surface
+    projection.
+
+    :returns:
+        a list of features and a list with the id, the fault parameters
+        (see :func:`fault_surfaces.fault_data`) and the outline
+        longitudes and latitudes of the simple faults
+    """
+    fields = source_fields()
+    features = []
+    faults = []
+    for src in sources:
+        if stype == 'SimpleFaultSource':
+            outline = simple_surface_from_source(src)
+            faults.append(
+                (src.id, fault_data(src), outline.lons, outline.lats))
+            geometry = outline.wkt
+        elif stype == 'ComplexFaultSource':
+            geometry = complex_surface_from_source(src).wkt
+        else:
+            geometry = src.geometry.wkt
+        fet = QgsFeature(fields)
+        fet['source_id'] = src.id
+        fet.setGeometry(QgsGeometry.fromWkt(geometry))
+        features.append(fet)
+    return features, faults
+
+
+def complex_surface_from_source(src):
+    """
+    :returns:
+        a shapely polygon approximating the surface projection of the
+        nrml complex fault source `src` (its top edge followed by its
+        bottom edge)
+    """
+    top_edge = wkt.loads(src.geometry.top_edge_wkt).coords
+    bottom_edge = wkt.loads(src.geometry.bottom_edge_wkt).coords
+    return Polygon([point[:2] for point in top_edge] +
+                   [point[:2] for point in list(bottom_edge)[::-1]])
+
+
 def simple_surface_from_source(src):
     return geo.surface.SimpleFaultSurface.surface_projection_from_fault_data(
         geo.Line([geo.Point(x[0], x[1])
@@ -529,18 +895,3 @@ def simple_surface_from_source(src):
         upper_seismogenic_depth=src.geometry.upper_seismo_depth,
         lower_seismogenic_depth=src.geometry.lower_seismo_depth,
         dip=src.geometry.dip)
-
-
-def _nrml_to_hazardlib(src, mesh_spacing=1.):
-    """
-    Convert a NRML source object into the HazardLib representation.
-    """
-    if not isinstance(src, nrml_models.SimpleFaultSource):
-        raise NotImplementedError
-
-    return geo.surface.SimpleFaultSurface.from_fault_data(
-        geo.Line([geo.Point(*x) for x in wkt.loads(src.geometry.wkt).coords]),
-        src.geometry.upper_seismo_depth,
-        src.geometry.lower_seismo_depth,
-        src.geometry.dip,
-        mesh_spacing)
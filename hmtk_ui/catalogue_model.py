@@ -1,17 +1,29 @@
-import tempfile
+import copy
+import collections
 
 import numpy
 
-from PyQt4 import QtGui
-from PyQt4.QtCore import Qt
+from cluster_palette import ClusterPalette
+from catalogue_cache import CatalogueCache
+from catalogue_io import read_catalogue, write_catalogue, ColumnBuffers
+from result_cache import (
+    ResultCache, UncacheableError, make_key, column_digest,
+    algorithm_identity)
+from pipeline import Pipeline
 
-from hmtk.parsers.catalogue import csv_catalogue_parser as csv
+
+# columns added to the catalogue to hold the algorithm results
+FLAG_COLUMNS = ['Cluster_Index', 'Cluster_Flag', 'Completeness_Flag']
+
+# analyses whose results are stored in the result cache
+CACHED_ANALYSES = ['recurrence_model', 'max_magnitude', 'smoothed_seismicity']
 
 
 ### TODO. We might need a Singleton version of this
 class CatalogueModel(object):
     def __init__(self, catalogue):
         self.catalogue = catalogue
+        self.pipeline = Pipeline()
         self.completeness_table = self.default_completeness(catalogue)
         self.recurrence_model_output = None
         self.maximum_magnitude_output = None
@@ -20,14 +32,50 @@ class CatalogueModel(object):
 
         self.last_computed_completeness_table = None
 
-        catalogue.data['Cluster_Index'] = numpy.zeros(
-            catalogue.get_number_events())
-        catalogue.data['Cluster_Flag'] = numpy.zeros(
-            self.catalogue.get_number_events())
-        catalogue.data['Completeness_Flag'] = numpy.zeros(
-            self.catalogue.get_number_events())
+        # incremented every time a catalogue column is changed
+        self.column_versions = collections.Counter()
+        self._cluster_palette = None
+
+        self.result_cache = ResultCache()
+        # the analyses whose current output has been got from the cache
+        self.cached_outputs = set()
+        # the digests of the catalogue columns, with their version
+        self._column_digests = {}
+        # the bootstrap outputs, with the version of the stage they
+        # refer to, keyed by analysis
+        self._bootstrap_outputs = {}
+
+        for key in FLAG_COLUMNS:
+            catalogue.data[key] = numpy.zeros(catalogue.get_number_events())
+
+        # created on first use, so that the model can be used without Qt
+        self._item_model = None
+        # the buffers of the columns grown by #append
+        self._buffers = ColumnBuffers()
+
+    @property
+    def item_model(self):
+        """
+        The :class:`catalogue_table_model.CatalogueTableModel` showing
+        the catalogue
+        """
+        if self._item_model is None:
+            from catalogue_table_model import CatalogueTableModel
+            self._item_model = CatalogueTableModel(self)
+        return self._item_model
 
-        self.item_model = self.populate_item_model(catalogue)
+    @property
+    def completeness_table(self):
+        """
+        The completeness table used by the analyses. Setting it makes
+        dirty the pipeline stages depending on it
+        """
+        return self._completeness_table
+
+    @completeness_table.setter
+    def completeness_table(self, table):
+        self._completeness_table = table
+        self.pipeline.touch('completeness_table')
 
     def catalogue_keys(self, catalogue=None):
         cat = catalogue or self.catalogue
@@ -56,128 +104,406 @@ class CatalogueModel(object):
         return numpy.array(
             [[numpy.min(self.catalogue.data['year']), threshold]])
 
-    def populate_item_model(self, catalogue):
+    def event_at(self, modelIndex):
+        return int(self.catalogue.data['eventID'][
+            self.item_model.event_row(modelIndex.row())])
+
+    @classmethod
+    def from_csv_file(cls, fname):
+        return cls(CatalogueCache().load(fname, read_catalogue))
+
+    def append(self, columns):
+        """
+        Append events to the catalogue (e.g. while it is being loaded).
+        Array columns grow in amortized constant time per event (see
+        :class:`catalogue_io.ColumnBuffers`), list columns are extended
+        in place. The end year and the default completeness table are
+        updated from the new events only. Call #finish_append when no
+        more events are expected
+
+        :param dict columns:
+            the columns (arrays or lists) of the new events keyed by
+            catalogue key
+        :returns: the rows of the new events
+        """
+        first = self.catalogue.get_number_events()
+        count = max(len(column) for column in columns.values())
+        columns = dict(columns)
+        for key in FLAG_COLUMNS:
+            columns[key] = numpy.zeros(count)
+
+        if self._item_model is not None:
+            self._item_model.begin_append(count)
+        data = self.catalogue.data
+        for key, values in columns.items():
+            current = data.get(key)
+            if isinstance(values, list):
+                if current:
+                    current.extend(values)
+                else:
+                    data[key] = list(values)
+            elif current is None or not len(current):
+                data[key] = values
+            else:
+                data[key] = self._buffers.extend(key, current, values)
+        self.catalogue.end_year = max(
+            self.catalogue.end_year, numpy.max(columns['year']))
+        if self._item_model is not None:
+            self._item_model.end_append()
+
+        self.touch(*columns.keys())
+        # while loading, the completeness table is the default one (the
+        # algorithms are disabled)
+        self.completeness_table = numpy.minimum(
+            self.completeness_table,
+            [[numpy.min(columns['year']), numpy.min(columns['magnitude'])]])
+        return numpy.arange(first, first + count)
+
+    def finish_append(self):
+        """
+        Release the spare capacity of the columns grown by #append
+        """
+        for key, column in self.catalogue.data.items():
+            self.catalogue.data[key] = self._buffers.compact(key, column)
+
+    def snapshot(self):
         """
-        Populate the item model with the data from event catalogue
+        :returns:
+            a shallow copy of the catalogue that can be read (e.g. by a
+            worker thread) while the model changes. Array columns are
+            always replaced and never modified in place, list columns
+            (extended in place by #append) are copied
         """
-        keys = self.catalogue_keys(catalogue)
+        catalogue = copy.copy(self.catalogue)
+        catalogue.data = dict(
+            (key, list(column) if isinstance(column, list) else column)
+            for key, column in self.catalogue.data.items())
+        return catalogue
 
-        item_model = QtGui.QStandardItemModel(
-            catalogue.get_number_events(), len(keys))
+    def compute(self, name, algorithm, config):
+        """
+        Run `algorithm` for the analysis `name` (e.g. declustering)
+        without changing the model. See :func:`run_algorithm`. The
+        result is got from (or stored in) the result cache, if the
+        analysis is cacheable
+        """
+        return compute_result(
+            self.result_cache, self.result_key(name, algorithm, config),
+            name, algorithm, config, self.catalogue, self.completeness_table)
 
-        for j, key in enumerate(keys):
-            item_model.setHorizontalHeaderItem(j, QtGui.QStandardItem(key))
-            for i in range(catalogue.get_number_events()):
-                event_data = catalogue.data[key]
-                if len(event_data):
-                    item_model.setItem(
-                        i, j, QtGui.QStandardItem(str(event_data[i])))
-        return item_model
+    def result_key(self, name, algorithm, config):
+        """
+        :returns:
+            the key of the result of `algorithm` for the analysis `name`
+            in the result cache, or None if the result is not cacheable
+            (including when the configuration holds values that cannot
+            be part of a key). It depends on the catalogue events, the
+            completeness table, the algorithm and its configuration
+        """
+        if name not in CACHED_ANALYSES or not self.result_cache.directory:
+            return None
+        try:
+            return make_key(
+                name, algorithm_identity(algorithm), config,
+                self.fingerprint(), self.completeness_table)
+        except UncacheableError:
+            return None
+
+    def fingerprint(self):
+        """
+        :returns:
+            a digest of the catalogue events (i.e. of all the columns but
+            the algorithm flags). Column digests are computed only when
+            the columns change
+        """
+        digests = []
+        for key in sorted(self.catalogue.data):
+            if key in FLAG_COLUMNS:
+                continue
+            version = self.column_versions[key]
+            cached = self._column_digests.get(key)
+            if cached is None or cached[0] != version:
+                cached = (version, column_digest(self.catalogue.data[key]))
+                self._column_digests[key] = cached
+            digests.append((key, cached[1]))
+        return make_key(digests)
+
+    def apply(self, name, result, algorithm, config, cached=False):
+        """
+        Update the model with the `result` of `algorithm` for the
+        analysis `name`, as returned by #compute
 
-    def event_at(self, modelIndex):
-        return int(
-            self.item_model.data(
-                self.item_model.index(
-                    modelIndex.row(), self.field_idx('eventID'))))
+        :param bool cached: True if `result` comes from the result cache
+        :returns: the analysis output
+        """
+        if cached:
+            self.cached_outputs.add(name)
+        else:
+            self.cached_outputs.discard(name)
+        return getattr(self, 'apply_%s' % name)(result, algorithm, config)
 
-    @classmethod
-    def from_csv_file(cls, fname):
-        return cls(csv.CsvCatalogueParser(fname).read_file())
+    def set_bootstrap_output(self, name, output, stage_version):
+        """
+        Store the `output` of a bootstrap (see :mod:`bootstrap`) of the
+        version `stage_version` of the analysis `name`
+        """
+        self._bootstrap_outputs[name] = (stage_version, output)
+
+    def bootstrap_output(self, name):
+        """
+        :returns:
+            the output of the bootstrap of the current output of the
+            analysis `name`, or None
+        """
+        version, output = self._bootstrap_outputs.get(name, (None, None))
+        if version == self.pipeline.stages[name].version:
+            return output
+
+    def stage_output(self, name):
+        """
+        :returns:
+            the output of the last run of the analysis `name` (as
+            returned by #apply)
+        """
+        return self.pipeline.stages[name].output
+
+    def run(self, name, algorithm, config):
+        """
+        Compute and apply the analysis `name`, unless its inputs, the
+        algorithm and its configuration are unchanged since the last run
+
+        :returns: the analysis output
+        """
+        if self.pipeline.is_current(name, algorithm, config):
+            return self.stage_output(name)
+        input_versions = self.pipeline.input_versions(name)
+        output = self.apply(
+            name, self.compute(name, algorithm, config), algorithm, config)
+        self.pipeline.update(name, algorithm, config, output, input_versions)
+        return output
 
     def declustering(self, algorithm, config):
-        cluster_index, cluster_flag = algorithm(self.catalogue, config)
-        self.catalogue.data['Cluster_Index'] = cluster_index
-        self.catalogue.data['Cluster_Flag'] = cluster_flag
-
-        cluster_index_idx = self.field_idx('Cluster_Index')
-        cluster_flag_idx = self.field_idx('Cluster_Flag')
-
-        for i in range(self.catalogue.get_number_events()):
-            index = self.item_model.index(i, cluster_index_idx)
-            self.item_model.setData(index, str(cluster_index[i]))
-            self.item_model.setData(
-                index, self.cluster_color(cluster_index[i]), Qt.ForegroundRole)
-            index = self.item_model.index(i, cluster_flag_idx)
-            self.item_model.setData(index, str(cluster_flag[i]))
+        return self.run('declustering', algorithm, config)
+
+    def apply_declustering(self, result, algorithm, config):
+        cluster_index, cluster_flag = result
+        self.set_columns({'Cluster_Index': cluster_index,
+                          'Cluster_Flag': cluster_flag})
         return True
 
     def purge_decluster(self):
-        self.catalogue.purge_catalogue(
-            self.catalogue.data['Cluster_Flag'] == 0)
-        self.item_model = self.populate_item_model(self.catalogue)
+        """
+        Remove the events that are not main shocks
+
+        :returns: see #purge
+        """
+        ret = self.purge(self.catalogue.data['Cluster_Flag'] == 0)
+        self.pipeline.refresh('declustering')
+        return ret
 
     def purge_completeness(self):
-        self.catalogue.purge_catalogue(
-            self.catalogue.data['Completeness_Flag'] == 0)
-        self.item_model = self.populate_item_model(self.catalogue)
+        """
+        Remove the events that are not complete
 
-    def completeness(self, algorithm, config):
-        self.completeness_table = algorithm(self.catalogue, config)
-        self.last_computed_completeness_table = self.completeness_table
+        :returns: see #purge
+        """
+        ret = self.purge(self.catalogue.data['Completeness_Flag'] == 0)
+        self.pipeline.refresh('completeness')
+        return ret
 
-        # FIXME(lp). Refactor with Catalogue#catalogue_mt_filter
-        flag = numpy.zeros(self.catalogue.get_number_events(), dtype=int)
+    def purge(self, keep):
+        """
+        Remove from the catalogue the events not flagged in `keep`
 
-        for comp_val in self.completeness_table:
-            flag[numpy.logical_and(
-                self.catalogue.data['year'].astype(float) < comp_val[0],
-                self.catalogue.data['magnitude'] < comp_val[1])] = 1
-        self.catalogue.data['Completeness_Flag'] = flag
+        :returns:
+            a boolean array flagging the removed rows and a dict with the
+            values of the removed rows keyed by catalogue key (suitable
+            for #restore)
+        """
+        removed = ~numpy.asarray(keep, dtype=bool)
+        rows = numpy.flatnonzero(removed)
+        removed_data = dict(
+            (key, take(column, rows))
+            for key, column in self.catalogue.data.items() if len(column))
+
+        if self._item_model is not None:
+            self._item_model.begin_remove(removed)
+        self.catalogue.purge_catalogue(~removed)
+        self.touch(*self.catalogue.data.keys())
+        if self._item_model is not None:
+            self._item_model.end_remove()
+        return removed, removed_data
+
+    def restore(self, removed, removed_data):
+        """
+        Put back into the catalogue the rows removed by #purge
+        """
+        removed = numpy.asarray(removed, dtype=bool)
+        kept_rows = numpy.flatnonzero(~removed)
+        removed_rows = numpy.flatnonzero(removed)
+
+        for key, values in removed_data.items():
+            column = self.catalogue.data[key]
+            if isinstance(column, list):
+                restored = [None] * len(removed)
+                for row, value in zip(kept_rows, column):
+                    restored[row] = value
+                for row, value in zip(removed_rows, values):
+                    restored[row] = value
+            else:
+                restored = numpy.empty(
+                    len(removed),
+                    dtype=numpy.result_type(column, numpy.asarray(values)))
+                restored[kept_rows] = column
+                restored[removed_rows] = values
+            self.catalogue.data[key] = restored
+
+        self.touch(*self.catalogue.data.keys())
+        if self._item_model is not None:
+            self._item_model.refresh()
 
-        comp_flag_idx = self.field_idx('Completeness_Flag')
+    def completeness(self, algorithm, config):
+        return self.run('completeness', algorithm, config)
 
-        for i in range(self.catalogue.get_number_events()):
-            index = self.item_model.index(i, comp_flag_idx)
-            self.item_model.setData(index, str(flag[i]))
+    def apply_completeness(self, result, algorithm, config):
+        self.completeness_table = result
+        self.last_computed_completeness_table = self.completeness_table
 
-            if flag[i]:
-                self.item_model.setData(
-                    index, QtGui.QColor(200, 200, 200), Qt.BackgroundRole)
+        self.set_columns({'Completeness_Flag': completeness_flags(
+            self.catalogue.data['year'].astype(float),
+            self.catalogue.data['magnitude'],
+            self.completeness_table)})
         return getattr(algorithm, 'model', None)
 
     def recurrence_model(self, algorithm, config):
-        rec_params = algorithm(self.catalogue, config, self.completeness_table)
-        return (config.get('reference_magnitude', None),) + rec_params
+        return self.run('recurrence_model', algorithm, config)
+
+    def apply_recurrence_model(self, result, algorithm, config):
+        self.recurrence_model_output = (
+            config.get('reference_magnitude', None),) + result
+        return self.recurrence_model_output
 
     def max_magnitude(self, algorithm, config):
-        return algorithm(self.catalogue, config)
+        return self.run('max_magnitude', algorithm, config)
+
+    def apply_max_magnitude(self, result, algorithm, config):
+        self.maximum_magnitude_output = result
+        return result
 
     def smoothed_seismicity(self, algorithm, config):
-        return algorithm(self.catalogue, config, self.completeness_table)
+        return self.run('smoothed_seismicity', algorithm, config)
+
+    def apply_smoothed_seismicity(self, result, algorithm, config):
+        self.smoothed_seismicity_output = result
+        return result
 
     def histogram(self, algorithm, config):
-        return algorithm(self.catalogue, config)
+        return self.run('histogram', algorithm, config)
+
+    def apply_histogram(self, result, algorithm, config):
+        self.histogram_output = result
+        return result
+
+    def set_columns(self, columns):
+        """
+        Replace whole catalogue columns and notify the views once per
+        column
+
+        :param dict columns: numpy arrays keyed by catalogue key
+        """
+        for key, values in columns.items():
+            self.catalogue.data[key] = values
+            self.touch(key)
+            if self._item_model is not None:
+                self._item_model.column_updated(key)
+
+    def touch(self, *keys):
+        """
+        Mark the catalogue columns `keys` as changed
+        """
+        for key in keys:
+            self.column_versions[key] += 1
+        self.pipeline.columns_changed(keys)
 
     def field_idx(self, field):
         return self.catalogue_keys().index(field)
 
-    def cluster_color(self, cluster):
-        max_cluster = numpy.max(self.catalogue.data['Cluster_Index'])
-        min_cluster = numpy.min(self.catalogue.data['Cluster_Index'])
-        breaks = numpy.linspace(min_cluster, max_cluster, 4)
-        cluster_range = max_cluster - min_cluster
-
-        if max_cluster == min_cluster:
-            return QtGui.QColor(0, 0, 0)
-
-        case = numpy.searchsorted(breaks, cluster)
-        if case <= 1:
-            r = 0
-            g = 255. / cluster_range * (cluster - breaks[0]) * 3.
-            b = 255.
-        elif case == 2:
-            r = 255. / cluster_range * (cluster - breaks[1]) * 3.
-            g = 255.
-            b = 255. - 255. / cluster_range * (cluster - breaks[1]) * 3.
-        elif case >= 3:
-            r = 255.
-            g = 255. - 255. / cluster_range * (cluster - breaks[2]) * 3.
-            b = 0
-
-        return QtGui.QColor(int(r), int(g), int(b))
+    @property
+    def cluster_palette(self):
+        """
+        The :class:`cluster_palette.ClusterPalette` of the current
+        declustering. It is rebuilt only when Cluster_Index changes
+        """
+        version = self.column_versions['Cluster_Index']
+        if (self._cluster_palette is None or
+                self._cluster_palette.version != version):
+            self._cluster_palette = ClusterPalette(
+                self.catalogue.data['Cluster_Index'], version)
+        return self._cluster_palette
 
     def save(self, filename):
-        writer = csv.CsvCatalogueWriter(tempfile.mktemp())
-        writer.output_file = filename
-
-        writer.write_file(self.catalogue)
+        write_catalogue(self.catalogue, filename)
+
+
+def run_algorithm(name, algorithm, config, catalogue, completeness_table):
+    """
+    Run `algorithm` for the analysis `name` on `catalogue`.
+
+    :param str name:
+        the analysis name (declustering, completeness, recurrence_model,
+        max_magnitude, smoothed_seismicity or histogram)
+    :param completeness_table:
+        the completeness table used by the analyses that require it
+    :returns: the (raw) algorithm result
+    """
+    if name in ['recurrence_model', 'smoothed_seismicity']:
+        return algorithm(catalogue, config, completeness_table)
+    return algorithm(catalogue, config)
+
+
+def compute_result(result_cache, key, name, algorithm, config, catalogue,
+                   completeness_table):
+    """
+    Like :func:`run_algorithm`, but return the result stored under
+    `key` in `result_cache`, if any, and store it otherwise. If `key` is
+    None the cache is not used
+    """
+    try:
+        return result_cache.get(key)
+    except KeyError:
+        pass
+    result = run_algorithm(
+        name, algorithm, config, catalogue, completeness_table)
+    result_cache.put(key, result)
+    return result
+
+
+def completeness_flags(years, magnitudes, completeness_table):
+    """
+    :returns:
+        an array holding 1 for the events that are not complete, i.e.
+        events that occurred before the year of a completeness table row
+        with a magnitude below the magnitude of that row; 0 otherwise
+    """
+    table = numpy.asarray(completeness_table, dtype=float)
+    table = table[numpy.argsort(table[:, 0], kind='mergesort')]
+
+    # the highest magnitude threshold among the table rows from the
+    # i-th on (i.e. the rows with a year greater or equal than the
+    # i-th year). Events after the last year are always complete.
+    thresholds = numpy.append(
+        numpy.maximum.accumulate(table[::-1, 1])[::-1], -numpy.inf)
+
+    rows = numpy.searchsorted(table[:, 0], years, side='right')
+    return (magnitudes < thresholds[rows]).astype(int)
+
+
+def take(column, rows):
+    """
+    :returns:
+        the values of a catalogue column (an array or a list) at the
+        given rows
+    """
+    if isinstance(column, list):
+        return [column[row] for row in rows]
+    return column[rows]
@@ -0,0 +1,119 @@
+import unittest
+
+import numpy
+
+try:
+    import hmtk
+except ImportError:
+    raise unittest.SkipTest("hmtk is not available")
+
+from hmtk.seismicity.catalogue import Catalogue
+
+from catalogue_io import append_columns
+from catalogue_model import CatalogueModel, completeness_flags
+
+
+def loop_completeness_flags(years, magnitudes, completeness_table):
+    """
+    The flags computed row by row, as the catalogue model used to
+    """
+    flag = numpy.zeros(len(years), dtype=int)
+    for comp_val in completeness_table:
+        flag[numpy.logical_and(
+            years.astype(float) < comp_val[0],
+            magnitudes < comp_val[1])] = 1
+    return flag
+
+
+class CompletenessFlagsTestCase(unittest.TestCase):
+    # several steps, not sorted by year, with a magnitude increasing
+    # towards the recent years after 1990
+    TABLE = numpy.array([[1964., 5.],
+                         [1990., 4.],
+                         [1900., 6.5],
+                         [2000., 4.5],
+                         [1930., 6.]])
+
+    def check(self, years, magnitudes, table=TABLE):
+        years = numpy.asarray(years)
+        magnitudes = numpy.asarray(magnitudes, dtype=float)
+        numpy.testing.assert_array_equal(
+            loop_completeness_flags(years, magnitudes, table),
+            completeness_flags(years, magnitudes, table))
+
+    def test_boundaries(self):
+        # events in the years of the table (and right before them), with
+        # the magnitudes of the table (and right below them)
+        years = numpy.concatenate([self.TABLE[:, 0], self.TABLE[:, 0] - 1,
+                                   [1800, 2010]]).astype(int)
+        magnitudes = numpy.concatenate(
+            [self.TABLE[:, 1], self.TABLE[:, 1] - 0.1, [3., 7.]])
+        years, magnitudes = [a.ravel() for a in numpy.meshgrid(
+            years, magnitudes)]
+        self.check(years, magnitudes)
+
+    def test_random(self):
+        rnd = numpy.random.RandomState(42)
+        years = rnd.randint(1850, 2015, 5000)
+        magnitudes = numpy.round(rnd.uniform(3, 8, 5000), 1)
+        self.check(years, magnitudes)
+
+    def test_single_row(self):
+        table = numpy.array([[1960., 5.]])
+        self.check([1959, 1959, 1960, 1961], [4.9, 5., 4., 4.], table)
+
+    def test_known_flags(self):
+        flags = completeness_flags(
+            numpy.array([1899, 1920, 1920, 1995, 1995, 2001]),
+            numpy.array([6.4, 5.9, 6.1, 4.4, 4.5, 3.]), self.TABLE)
+        self.assertEqual([1, 1, 0, 1, 0, 0], flags.tolist())
+
+
+class AppendTestCase(unittest.TestCase):
+    def setUp(self):
+        catalogue = Catalogue()
+        append_columns(catalogue, dict(
+            eventID=numpy.arange(3), year=numpy.array([1990, 1985, 2000]),
+            magnitude=numpy.array([5., 4.5, 6.]), Agency=['A', 'B', 'C']))
+        catalogue.update_end_year()
+        self.model = CatalogueModel(catalogue)
+
+    def append(self, start, years, magnitudes):
+        count = len(years)
+        return self.model.append(dict(
+            eventID=numpy.arange(start, start + count),
+            year=numpy.array(years), magnitude=numpy.array(magnitudes),
+            Agency=['X'] * count))
+
+    def test_append(self):
+        snapshot = self.model.snapshot()
+        numpy.testing.assert_array_equal(
+            [3, 4], self.append(3, [2010, 1970], [3.5, 7.]))
+        numpy.testing.assert_array_equal([5], self.append(5, [1995], [4.]))
+        self.model.finish_append()
+
+        data = self.model.catalogue.data
+        self.assertEqual(6, self.model.catalogue.get_number_events())
+        numpy.testing.assert_array_equal(numpy.arange(6), data['eventID'])
+        self.assertEqual(['A', 'B', 'C', 'X', 'X', 'X'], data['Agency'])
+        self.assertEqual(6, len(data['Cluster_Flag']))
+        self.assertEqual(2010, self.model.catalogue.end_year)
+        # the running minimum equals the default completeness table
+        numpy.testing.assert_array_equal(
+            self.model.default_completeness(self.model.catalogue),
+            self.model.completeness_table)
+        numpy.testing.assert_array_equal([[1970, 3.5]],
+                                         self.model.completeness_table)
+
+        # the snapshot taken before is not changed
+        self.assertEqual(3, len(snapshot.data['eventID']))
+        self.assertEqual(['A', 'B', 'C'], snapshot.data['Agency'])
+
+    def test_finish_append(self):
+        for start in range(3, 30, 3):
+            self.append(start, [2000] * 3, [5.] * 3)
+        self.assertIsNotNone(self.model.catalogue.data['year'].base)
+        self.model.finish_append()
+        year = self.model.catalogue.data['year']
+        self.assertIsNone(year.base)
+        self.assertEqual(30, len(year))
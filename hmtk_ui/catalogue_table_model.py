@@ -0,0 +1,201 @@
+import numpy
+
+from PyQt4 import QtCore, QtGui
+from PyQt4.QtCore import Qt
+
+
+# above this number of blocks of removed rows, the views are reset
+# instead of being notified of each block
+MAX_REMOVED_RUNS = 100
+
+
+class CatalogueTableModel(QtCore.QAbstractTableModel):
+    """
+    A table model that exposes the columns of an event catalogue
+    without copying them. Cells are read from `catalogue.data` only when
+    a view asks for them, so the cost of building the model does not
+    depend on the number of events.
+
+    :attr catalogue_model:
+        the :class:`catalogue_model.CatalogueModel` holding the catalogue
+    :attr list keys:
+        the catalogue keys shown as columns
+    :attr order:
+        a permutation of the catalogue rows (as set by #sort) or None
+        when the rows are shown in catalogue order
+    """
+    INCOMPLETE_COLOR = QtGui.QColor(200, 200, 200)
+
+    def __init__(self, catalogue_model):
+        QtCore.QAbstractTableModel.__init__(self)
+        self.catalogue_model = catalogue_model
+        self.keys = catalogue_model.catalogue_keys()
+        self.order = None
+
+        # set between #begin_remove and #end_remove
+        self._removal = None
+        self._row_count = None
+
+    @property
+    def catalogue(self):
+        return self.catalogue_model.catalogue
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        if self._row_count is not None:
+            return self._row_count
+        return self.catalogue.get_number_events()
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.keys)
+
+    def event_row(self, row):
+        """
+        :returns: the catalogue row displayed at the table row `row`
+        """
+        if self.order is None:
+            return row
+        return int(self.order[row])
+
+    def value(self, row, column):
+        """
+        :returns: the catalogue value displayed at (`row`, `column`)
+        """
+        event_data = self.catalogue.data[self.keys[column]]
+        if not len(event_data):
+            return None
+        return event_data[self.event_row(row)]
+
+    # this method is called several times with different roles by Qt
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        if role == Qt.DisplayRole:
+            value = self.value(index.row(), index.column())
+            if value is None:
+                return None
+            return str(value)
+
+        key = self.keys[index.column()]
+        if role == Qt.ForegroundRole and key == 'Cluster_Index':
+            return QtGui.QColor(*self.catalogue_model.cluster_palette.color(
+                self.value(index.row(), index.column())))
+        elif role == Qt.BackgroundRole and key == 'Completeness_Flag':
+            if self.value(index.row(), index.column()):
+                return self.INCOMPLETE_COLOR
+
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.keys[section]
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """
+        Sort the rows by the values in `column`. Only a permutation
+        of the catalogue rows is computed, the catalogue is untouched.
+        """
+        event_data = self.catalogue.data[self.keys[column]]
+        if not len(event_data):
+            return
+
+        self.layoutAboutToBeChanged.emit()
+        permutation = numpy.argsort(
+            numpy.asarray(event_data), kind='mergesort')
+        if order == Qt.DescendingOrder:
+            permutation = permutation[::-1]
+        self.order = permutation
+        self.layoutChanged.emit()
+
+    def begin_append(self, count):
+        """
+        To be called before that `count` events are appended to the
+        catalogue. Call #end_append when done.
+        """
+        first = self.rowCount()
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + count - 1)
+        if self.order is not None:
+            self.order = numpy.append(
+                self.order, numpy.arange(first, first + count))
+
+    def end_append(self):
+        self.endInsertRows()
+
+    def begin_remove(self, removed):
+        """
+        To be called before that the catalogue rows flagged in the
+        boolean array `removed` are removed. Call #end_remove when done.
+
+        The views are notified of each block of contiguous table rows
+        removed (or reset, if there are too many blocks), so they do not
+        need to reload the remaining rows.
+        """
+        removed = numpy.asarray(removed, dtype=bool)
+        order = self.order
+        if order is None:
+            removed_rows = removed
+        else:
+            removed_rows = removed[order]
+            # the new position of the remaining catalogue rows
+            order = (numpy.cumsum(~removed) - 1)[order[~removed_rows]]
+        runs = contiguous_runs(removed_rows)
+
+        self._removal = runs, order
+        # until #end_remove, the views see the rows before the removal
+        self._row_count = len(removed)
+        if len(runs) > MAX_REMOVED_RUNS:
+            self.beginResetModel()
+
+    def end_remove(self):
+        runs, self.order = self._removal
+        self._removal = None
+        if len(runs) > MAX_REMOVED_RUNS:
+            self._row_count = None
+            self.endResetModel()
+            return
+
+        # remove from the last block, so that the rows of the
+        # blocks before are unchanged
+        for first, last in reversed(runs):
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            self._row_count -= last - first + 1
+            self.endRemoveRows()
+        self._row_count = None
+
+    def column_updated(self, key):
+        """
+        Notify the views that the values of the catalogue column `key`
+        have changed, with a single signal for the whole column
+        """
+        if key not in self.keys:
+            return
+        column = self.keys.index(key)
+        self.dataChanged.emit(
+            self.index(0, column),
+            self.index(max(self.rowCount() - 1, 0), column))
+
+    def refresh(self):
+        """
+        Notify the views that the whole catalogue has changed (e.g. after
+        a purge)
+        """
+        self.beginResetModel()
+        self.order = None
+        self.endResetModel()
+
+
+def contiguous_runs(flags):
+    """
+    :returns:
+        a list of (first, last) indices of the runs of True values in the
+        boolean array `flags`
+    """
+    padded = numpy.concatenate([[0], numpy.asarray(flags, dtype=int), [0]])
+    edges = numpy.flatnonzero(numpy.diff(padded))
+    return [(int(first), int(last) - 1)
+            for first, last in zip(edges[::2], edges[1::2])]
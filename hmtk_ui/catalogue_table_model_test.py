@@ -0,0 +1,45 @@
+import unittest
+
+import numpy
+
+try:
+    import PyQt4
+except ImportError:
+    raise unittest.SkipTest("PyQt4 is not available")
+
+from catalogue_table_model import contiguous_runs
+
+
+def loop_runs(flags):
+    """
+    The runs found by scanning the flags one at a time
+    """
+    runs = []
+    for i, flag in enumerate(flags):
+        if flag and runs and runs[-1][1] == i - 1:
+            runs[-1] = (runs[-1][0], i)
+        elif flag:
+            runs.append((i, i))
+    return runs
+
+
+class ContiguousRunsTestCase(unittest.TestCase):
+    def test_edge_cases(self):
+        self.assertEqual([], contiguous_runs([]))
+        self.assertEqual([], contiguous_runs([False] * 3))
+        self.assertEqual([(0, 2)], contiguous_runs([True] * 3))
+        self.assertEqual([(0, 0)], contiguous_runs([True]))
+        # runs at the start and at the end
+        self.assertEqual([(0, 1), (4, 4)], contiguous_runs(
+            [True, True, False, False, True]))
+        self.assertEqual([(1, 1), (3, 3)], contiguous_runs(
+            [False, True, False, True, False]))
+
+    def test_integer_flags(self):
+        self.assertEqual([(1, 2)], contiguous_runs(numpy.array([0, 1, 1, 0])))
+
+    def test_random(self):
+        rng = numpy.random.RandomState(3)
+        for density in [0.05, 0.5, 0.95]:
+            flags = rng.uniform(size=1000) < density
+            self.assertEqual(loop_runs(flags), contiguous_runs(flags))
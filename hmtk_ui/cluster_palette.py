@@ -0,0 +1,75 @@
+import numpy
+
+
+class ClusterPalette(object):
+    """
+    The colours used to display the clusters found by a declustering
+    algorithm. Colours are computed once for every cluster index
+    (from blue, to green, to red) and then looked up by index.
+
+    :attr int min_cluster: the smallest cluster index
+    :attr rgb:
+        a (N, 3) integer array where the i-th row holds the RGB colour of
+        the cluster with index `min_cluster + i`
+    :attr version:
+        the version of the Cluster_Index column the palette has been
+        built from
+    """
+    def __init__(self, cluster_index, version=None):
+        self.version = version
+
+        cluster_index = numpy.asarray(cluster_index)
+        if cluster_index.size:
+            self.min_cluster = int(numpy.min(cluster_index))
+            max_cluster = int(numpy.max(cluster_index))
+        else:
+            self.min_cluster = max_cluster = 0
+
+        self.rgb = self.ramp(
+            numpy.arange(self.min_cluster, max_cluster + 1),
+            self.min_cluster, max_cluster)
+
+    @staticmethod
+    def ramp(clusters, min_cluster, max_cluster):
+        """
+        :returns:
+            a (len(clusters), 3) integer array with the RGB colours of
+            `clusters` on a blue-green-red ramp spanning
+            [min_cluster, max_cluster]
+        """
+        clusters = numpy.asarray(clusters, dtype=float)
+        rgb = numpy.zeros((len(clusters), 3))
+
+        if max_cluster == min_cluster:
+            return rgb.astype(int)
+
+        breaks = numpy.linspace(min_cluster, max_cluster, 4)
+        step = 255. / (max_cluster - min_cluster) * 3.
+        case = numpy.searchsorted(breaks, clusters)
+
+        low, middle, high = case <= 1, case == 2, case >= 3
+
+        rgb[low, 1] = step * (clusters[low] - breaks[0])
+        rgb[low, 2] = 255.
+
+        rgb[middle, 0] = step * (clusters[middle] - breaks[1])
+        rgb[middle, 1] = 255.
+        rgb[middle, 2] = 255. - step * (clusters[middle] - breaks[1])
+
+        rgb[high, 0] = 255.
+        rgb[high, 1] = 255. - step * (clusters[high] - breaks[2])
+
+        return rgb.astype(int)
+
+    def colors(self, clusters):
+        """
+        :returns: a (len(clusters), 3) array with the colours of `clusters`
+        """
+        rows = numpy.asarray(clusters).astype(int) - self.min_cluster
+        return self.rgb[numpy.clip(rows, 0, len(self.rgb) - 1)]
+
+    def color(self, cluster):
+        """
+        :returns: the colour of `cluster` as a (r, g, b) tuple
+        """
+        return tuple(int(c) for c in self.colors([cluster])[0])
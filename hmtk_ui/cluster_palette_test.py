@@ -0,0 +1,68 @@
+import unittest
+
+import numpy
+
+from cluster_palette import ClusterPalette
+
+
+def event_color(cluster_index, cluster):
+    """
+    The colour of `cluster`, as computed for every event by the
+    catalogue model before the palette
+    """
+    max_cluster = numpy.max(cluster_index)
+    min_cluster = numpy.min(cluster_index)
+    breaks = numpy.linspace(min_cluster, max_cluster, 4)
+    cluster_range = max_cluster - min_cluster
+
+    if max_cluster == min_cluster:
+        return (0, 0, 0)
+
+    case = numpy.searchsorted(breaks, cluster)
+    if case <= 1:
+        r = 0
+        g = 255. / cluster_range * (cluster - breaks[0]) * 3.
+        b = 255.
+    elif case == 2:
+        r = 255. / cluster_range * (cluster - breaks[1]) * 3.
+        g = 255.
+        b = 255. - 255. / cluster_range * (cluster - breaks[1]) * 3.
+    elif case >= 3:
+        r = 255.
+        g = 255. - 255. / cluster_range * (cluster - breaks[2]) * 3.
+        b = 0
+    return (int(r), int(g), int(b))
+
+
+class ClusterPaletteTestCase(unittest.TestCase):
+    def check(self, cluster_index):
+        palette = ClusterPalette(cluster_index)
+        for cluster in sorted(set(cluster_index)):
+            self.assertEqual(event_color(cluster_index, cluster),
+                             palette.color(cluster))
+
+    def test_clusters(self):
+        # zero is the index of the events not in a cluster
+        self.check(numpy.array([0, 3, 3, 1, 7, 2, 7, 5, 4, 6, 0]))
+
+    def test_many_clusters(self):
+        rnd = numpy.random.RandomState(42)
+        self.check(rnd.randint(0, 1000, 5000).astype(float))
+
+    def test_single_cluster(self):
+        self.check(numpy.array([4., 4., 4.]))
+
+    def test_two_clusters(self):
+        self.check(numpy.array([0., 1.]))
+
+    def test_colors(self):
+        cluster_index = numpy.array([0, 2, 9, 5, 5, 1])
+        palette = ClusterPalette(cluster_index, version=3)
+        self.assertEqual(3, palette.version)
+        numpy.testing.assert_array_equal(
+            [event_color(cluster_index, c) for c in cluster_index],
+            palette.colors(cluster_index))
+
+    def test_empty(self):
+        palette = ClusterPalette(numpy.array([]))
+        self.assertEqual((0, 0, 0), palette.color(0))
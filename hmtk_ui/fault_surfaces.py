@@ -0,0 +1,153 @@
+import os
+import itertools
+
+from openquake.hazardlib import geo
+from shapely import wkt
+
+import process_pool
+from catalogue_cache import CACHE_DIR
+from result_cache import ResultCache, make_key
+
+
+# mesh spacing (in km) of the fault surfaces
+MESH_SPACING = 1.
+
+# Directory where the fault surfaces are stored. Set it to an empty
+# string to disable the cache.
+SURFACE_CACHE_DIR = os.environ.get(
+    'HMTK_SURFACE_CACHE_DIR',
+    os.path.join(CACHE_DIR, 'surfaces') if CACHE_DIR else '')
+
+
+class FaultSurfaces(object):
+    """
+    The hazardlib surfaces of the simple fault sources of a source
+    model, keyed by source id.
+
+    Only the fault geometry is kept when a source is added: its surface
+    (a mesh, slow to compute) is built on first access, or for many
+    sources at once, in parallel, by #build. Surfaces are stored in an
+    on-disk cache keyed by the fault geometry and the mesh spacing.
+
+    :attr float mesh_spacing: the mesh spacing in km
+    :attr cache: a :class:`result_cache.ResultCache` instance
+    """
+    def __init__(self, mesh_spacing=MESH_SPACING, cache=None):
+        self.mesh_spacing = mesh_spacing
+        self.cache = cache or ResultCache(SURFACE_CACHE_DIR)
+        # the fault geometries and the surfaces built so far
+        self._fault_data = {}
+        self._surfaces = {}
+
+    def __len__(self):
+        return len(self._fault_data)
+
+    def __contains__(self, source_id):
+        return source_id in self._fault_data
+
+    def __iter__(self):
+        return iter(self._fault_data)
+
+    def add(self, source_id, data):
+        """
+        Add the simple fault source `source_id`
+
+        :param data: the fault parameters (see :func:`fault_data`)
+        """
+        self._fault_data[source_id] = data
+        self._surfaces.pop(source_id, None)
+
+    def key(self, source_id):
+        """
+        :returns: the cache key of the surface of the source `source_id`
+        """
+        return make_key('SimpleFaultSurface', self._fault_data[source_id],
+                        self.mesh_spacing)
+
+    def __getitem__(self, source_id):
+        surface = self._surfaces.get(source_id)
+        if surface is None:
+            key = self.key(source_id)
+            try:
+                surface = self.cache.get(key)
+            except KeyError:
+                surface = build_surface(
+                    self._fault_data[source_id], self.mesh_spacing)
+                self.cache.put(key, surface)
+            self._surfaces[source_id] = surface
+        return surface
+
+    def is_built(self):
+        """
+        :returns: True if the surfaces of all the sources are in memory
+        """
+        return len(self._surfaces) == len(self._fault_data)
+
+    def build(self, source_ids=None, cancelled=None):
+        """
+        Build the surfaces of `source_ids` (by default, of all the
+        sources) which are neither in memory nor in the cache, in the
+        worker processes of :mod:`process_pool`
+
+        :param cancelled:
+            a callable returning True if the build has to be stopped
+            (the surfaces built so far are kept)
+        """
+        if source_ids is None:
+            source_ids = list(self._fault_data)
+
+        missing = []
+        for source_id in source_ids:
+            if source_id in self._surfaces:
+                continue
+            key = self.key(source_id)
+            try:
+                self._surfaces[source_id] = self.cache.get(key)
+            except KeyError:
+                missing.append((source_id, key))
+        if not missing:
+            return
+
+        surfaces = process_pool.imap(_build_surface, [
+            (self._fault_data[source_id], self.mesh_spacing)
+            for source_id, _ in missing], cancelled)
+        try:
+            for (source_id, key), surface in itertools.izip(
+                    missing, surfaces):
+                # evict once at the end, not after each surface
+                self.cache.put(key, surface, evict=False)
+                self._surfaces[source_id] = surface
+        finally:
+            try:
+                self.cache.evict()
+            except OSError:
+                pass
+
+
+def fault_data(src):
+    """
+    :returns:
+        the parameters defining the surface of the nrml simple fault
+        source `src`: the trace coordinates, the upper and lower
+        seismogenic depths and the dip
+    """
+    return (tuple(tuple(point) for point in
+                  wkt.loads(src.geometry.wkt).coords),
+            src.geometry.upper_seismo_depth,
+            src.geometry.lower_seismo_depth,
+            src.geometry.dip)
+
+
+def build_surface(data, mesh_spacing=MESH_SPACING):
+    """
+    :param data: the fault parameters (see :func:`fault_data`)
+    :returns: a :class:`openquake.hazardlib.geo.surface.SimpleFaultSurface`
+    """
+    trace, upper_seismo_depth, lower_seismo_depth, dip = data
+    return geo.surface.SimpleFaultSurface.from_fault_data(
+        geo.Line([geo.Point(*point) for point in trace]),
+        upper_seismo_depth, lower_seismo_depth, dip, mesh_spacing)
+
+
+def _build_surface(args):
+    return build_surface(*args)
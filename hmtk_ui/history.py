@@ -0,0 +1,259 @@
+import os
+import atexit
+import shutil
+import tempfile
+
+import numpy
+
+
+# Memory (in bytes) that the undo history may hold in RAM. Older
+# changes exceeding the budget are spilled to memory-mapped files.
+MEMORY_BUDGET = int(os.environ.get(
+    'HMTK_UNDO_MEMORY_BUDGET', 256 * 1024 * 1024))
+
+
+class ColumnStore(object):
+    """
+    A dictionary of arrays (or lists) that can be moved out of the RAM
+    into memory-mapped temporary files. Only numeric arrays are
+    memory-mapped: lists and object arrays (e.g. of strings or None)
+    cannot be, and they are kept in RAM.
+
+    :attr dict columns: the arrays/lists keyed by name
+    :attr set mapped: the names of the memory-mapped columns
+    :attr bool spilled: True if the columns have been spilled
+    """
+    def __init__(self, columns):
+        self.columns = dict(columns)
+        self.mapped = set()
+        self.spilled = False
+        self._nbytes = None
+
+    def nbytes(self):
+        """
+        :returns: the (approximate) number of bytes held in RAM
+        """
+        if self._nbytes is None:
+            self._nbytes = sum(
+                column_nbytes(column)
+                for name, column in self.columns.items()
+                if name not in self.mapped)
+        return self._nbytes
+
+    def spill(self, directory):
+        """
+        Save the numeric columns into `directory` and replace them with
+        (copy-on-write) memory maps
+        """
+        if self.spilled:
+            return
+        for name, column in self.columns.items():
+            if not is_mappable(column):
+                continue
+            fd, path = tempfile.mkstemp(suffix='.npy', dir=directory)
+            with os.fdopen(fd, 'wb') as fobj:
+                numpy.save(fobj, column)
+            self.columns[name] = numpy.load(path, mmap_mode='c')
+            self.mapped.add(name)
+        self.spilled = True
+        self._nbytes = None
+
+    def load(self):
+        """
+        :returns: a dict with the columns as they were stored
+        """
+        return dict(self.columns)
+
+
+class Change(object):
+    """
+    A change applied to the catalogue model that can be reverted.
+
+    Derived classes must implement #revert and hold the data needed
+    to revert the change in `self.store`
+    """
+    store = None
+
+    def nbytes(self):
+        return self.store.nbytes()
+
+    def spill(self, directory):
+        self.store.spill(directory)
+
+    def revert(self, window):
+        """
+        Revert the change on the model held by the
+        :class:`main_window.MainWindow` instance `window`
+        """
+        raise NotImplementedError
+
+
+class ModelChange(Change):
+    """
+    The replacement of the whole catalogue model (e.g. when loading
+    a new catalogue). The previous model is kept.
+    """
+    def __init__(self, model):
+        self.model = model
+        self.store = ColumnStore(model.catalogue.data)
+
+    def spill(self, directory):
+        super(ModelChange, self).spill(directory)
+        self.model.catalogue.data = self.store.load()
+
+    def revert(self, window):
+        self.model.catalogue.data = self.store.load()
+        window.change_model(self.model, undoable=False)
+
+
+class ColumnsChange(Change):
+    """
+    A change of some catalogue columns (e.g. the flags set by a
+    declustering). Only the values that differ are kept.
+
+    Build it before changing the columns, then call #commit
+    """
+    def __init__(self, model, keys, attributes=()):
+        self.model = model
+        self.keys = keys
+        self.attributes = dict(
+            (name, getattr(model, name)) for name in attributes)
+
+        # columns are replaced (not modified in place), so we can hold
+        # references to the old ones until #commit is called
+        self.old_columns = dict(
+            (key, model.catalogue.data[key]) for key in keys)
+
+    def commit(self):
+        """
+        Compute the differences between the old and the current
+        columns.
+
+        :returns: True if any column has changed
+        """
+        diffs = {}
+        for key, old in self.old_columns.items():
+            new = self.model.catalogue.data[key]
+            if len(old) != len(new):
+                raise ValueError("Column %s has been resized" % key)
+            changed = numpy.flatnonzero(numpy.asarray(old) != new)
+            if changed.size:
+                diffs['%s.index' % key] = changed
+                diffs['%s.value' % key] = numpy.asarray(old)[changed]
+        self.old_columns = None
+        self.store = ColumnStore(diffs)
+        return bool(diffs) or any(
+            getattr(self.model, name) is not value
+            for name, value in self.attributes.items())
+
+    def revert(self, window):
+        diffs = self.store.load()
+        columns = {}
+        for key in self.keys:
+            if '%s.index' % key not in diffs:
+                continue
+            old_values = diffs['%s.value' % key]
+            column = numpy.array(
+                self.model.catalogue.data[key], dtype=old_values.dtype)
+            column[diffs['%s.index' % key]] = old_values
+            columns[key] = column
+
+        for name, value in self.attributes.items():
+            setattr(self.model, name, value)
+        self.model.set_columns(columns)
+        if columns:
+            window.catalogue_map.update_catalogue_layer(columns.keys())
+
+
+class PurgeChange(Change):
+    """
+    The removal of events from the catalogue. The removed rows are
+    kept as a bitmap together with their values.
+    """
+    def __init__(self, removed, removed_data):
+        self.size = len(removed)
+        self.store = ColumnStore(removed_data)
+        self.bitmap = numpy.packbits(removed)
+
+    def nbytes(self):
+        return self.store.nbytes() + self.bitmap.nbytes
+
+    @property
+    def removed(self):
+        return numpy.unpackbits(self.bitmap)[:self.size].astype(bool)
+
+    def revert(self, window):
+        removed = self.removed
+        window.catalogue_model.restore(removed, self.store.load())
+        window.catalogue_map.add_events(numpy.flatnonzero(removed))
+
+
+class UndoHistory(object):
+    """
+    A stack of :class:`Change` objects with a bounded memory usage.
+    When the changes held in RAM exceed `memory_budget`, the oldest
+    ones are spilled to memory-mapped files (or discarded, if `spill`
+    is False).
+    """
+    def __init__(self, memory_budget=MEMORY_BUDGET, spill=True):
+        self.memory_budget = memory_budget
+        self.spill = spill
+        self.changes = []
+        self._directory = None
+
+    def __len__(self):
+        return len(self.changes)
+
+    def push(self, change):
+        self.changes.append(change)
+        self.enforce_budget()
+
+    def pop(self):
+        return self.changes.pop()
+
+    def nbytes(self):
+        return sum(change.nbytes() for change in self.changes)
+
+    @property
+    def directory(self):
+        """
+        The directory holding the memory-mapped files (removed at exit)
+        """
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix='hmtk-undo-')
+            atexit.register(shutil.rmtree, self._directory, True)
+        return self._directory
+
+    def enforce_budget(self):
+        """
+        Spill (or discard) the oldest changes until the changes held in
+        memory fit in the budget
+        """
+        in_memory = self.nbytes()
+        for change in list(self.changes):
+            if in_memory <= self.memory_budget:
+                break
+            in_memory -= change.nbytes()
+            if self.spill:
+                change.spill(self.directory)
+                # columns which cannot be memory-mapped stay in RAM
+                in_memory += change.nbytes()
+            else:
+                self.changes.remove(change)
+
+
+def is_mappable(column):
+    """
+    :returns: True if `column` can be saved into a memory-mapped file
+    """
+    return (isinstance(column, numpy.ndarray) and
+            column.dtype.kind in 'biufc')
+
+
+def column_nbytes(column):
+    """
+    :returns: the (approximate) size in bytes of a catalogue column
+    """
+    if isinstance(column, numpy.ndarray):
+        return column.nbytes
+    return sum(len(str(value)) for value in column)
@@ -0,0 +1,158 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from history import ColumnStore, PurgeChange, UndoHistory
+
+
+class ColumnStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.columns = {
+            'eventID': numpy.arange(10),
+            'magnitude': numpy.linspace(3, 7, 10),
+            'Cluster_Flag': numpy.zeros(10, dtype=numpy.int8),
+            'Agency': ['ISC', 'GCMT'] * 5,
+            'comment': numpy.array(['a', None] * 5, dtype=object),
+            'mixed': [1, 'two', None, 4.5],
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check_columns(self, loaded):
+        self.assertEqual(sorted(self.columns), sorted(loaded))
+        for name, column in self.columns.items():
+            if isinstance(column, numpy.ndarray):
+                self.assertIsInstance(loaded[name], numpy.ndarray)
+                self.assertEqual(column.dtype, loaded[name].dtype)
+                numpy.testing.assert_array_equal(column, loaded[name])
+            else:
+                self.assertIsInstance(loaded[name], list)
+                self.assertEqual(column, loaded[name])
+
+    def test_load(self):
+        store = ColumnStore(self.columns)
+        self.assertFalse(store.spilled)
+        self.check_columns(store.load())
+
+    def test_spill(self):
+        store = ColumnStore(self.columns)
+        nbytes = store.nbytes()
+        store.spill(self.directory)
+
+        self.assertTrue(store.spilled)
+        self.assertEqual(set(['eventID', 'magnitude', 'Cluster_Flag']),
+                         store.mapped)
+        for name in store.mapped:
+            self.assertIsInstance(store.columns[name], numpy.memmap)
+        # only the columns which are not memory-mapped are in RAM
+        self.assertLess(store.nbytes(), nbytes)
+        self.assertEqual(
+            sum(len(str(v)) for v in self.columns['Agency']) +
+            self.columns['comment'].nbytes +
+            sum(len(str(v)) for v in self.columns['mixed']),
+            store.nbytes())
+        self.check_columns(store.load())
+
+        # spilling again does nothing
+        store.spill(self.directory)
+        self.check_columns(store.load())
+
+    def test_copy_on_write(self):
+        store = ColumnStore(self.columns)
+        store.spill(self.directory)
+        magnitude = store.load()['magnitude']
+        magnitude[0] = 100
+        # the file is not modified
+        numpy.testing.assert_array_equal(
+            self.columns['magnitude'], numpy.load(magnitude.filename))
+
+
+class StubModel(object):
+    def restore(self, removed, removed_data):
+        self.restored = removed, removed_data
+
+
+class StubMap(object):
+    def add_events(self, rows):
+        self.added = rows
+
+
+class StubWindow(object):
+    def __init__(self):
+        self.catalogue_model = StubModel()
+        self.catalogue_map = StubMap()
+
+
+class PurgeChangeTestCase(unittest.TestCase):
+    def test_revert(self):
+        # not a multiple of 8, so that the bitmap is padded
+        removed = numpy.zeros(13, dtype=bool)
+        removed[[0, 5, 7, 8, 12]] = True
+        removed_data = {'eventID': numpy.array([1, 6, 8, 9, 13]),
+                        'Agency': ['A', 'B', 'C', 'D', 'E']}
+        change = PurgeChange(removed, removed_data)
+        self.assertEqual(2, change.bitmap.nbytes)
+        numpy.testing.assert_array_equal(removed, change.removed)
+
+        window = StubWindow()
+        change.revert(window)
+        restored, data = window.catalogue_model.restored
+        numpy.testing.assert_array_equal(removed, restored)
+        self.assertEqual(bool, restored.dtype)
+        numpy.testing.assert_array_equal(
+            removed_data['eventID'], data['eventID'])
+        self.assertEqual(removed_data['Agency'], data['Agency'])
+        numpy.testing.assert_array_equal(
+            [0, 5, 7, 8, 12], window.catalogue_map.added)
+
+    def test_nothing_removed(self):
+        change = PurgeChange(numpy.zeros(5, dtype=bool), {})
+        self.assertFalse(change.removed.any())
+        self.assertEqual(5, len(change.removed))
+
+
+class UndoHistoryTestCase(unittest.TestCase):
+    def make_change(self, events_nr):
+        return PurgeChange(numpy.ones(events_nr, dtype=bool), {
+            'magnitude': numpy.zeros(events_nr),
+            'Agency': ['ISC'] * events_nr})
+
+    def test_within_budget(self):
+        history = UndoHistory(memory_budget=10 ** 6)
+        changes = [self.make_change(100) for _ in range(3)]
+        for change in changes:
+            history.push(change)
+        self.assertEqual(3, len(history))
+        self.assertFalse(any(change.store.spilled for change in changes))
+
+    def test_spill_oldest(self):
+        change_nbytes = self.make_change(1000).nbytes()
+        history = UndoHistory(memory_budget=3 * change_nbytes)
+        changes = [self.make_change(1000) for _ in range(4)]
+        for change in changes:
+            history.push(change)
+
+        self.assertEqual(4, len(history))
+        self.assertEqual([True, True, False, False],
+                         [change.store.spilled for change in changes])
+        self.assertLessEqual(history.nbytes(), history.memory_budget)
+        # the string columns stay in RAM
+        self.assertEqual(3000, changes[0].store.nbytes())
+
+        # the newest change comes first
+        self.assertIs(changes[-1], history.pop())
+
+    def test_discard_oldest(self):
+        change_nbytes = self.make_change(1000).nbytes()
+        history = UndoHistory(memory_budget=2.5 * change_nbytes, spill=False)
+        changes = [self.make_change(1000) for _ in range(4)]
+        for change in changes:
+            history.push(change)
+
+        self.assertEqual(2, len(history))
+        self.assertEqual(changes[2:], history.changes)
+        self.assertFalse(any(change.store.spilled for change in changes))
@@ -0,0 +1,121 @@
+import Queue
+import traceback
+
+from PyQt4 import QtCore
+
+
+class Job(object):
+    """
+    A function call to be run by a :class:`JobEngine`
+
+    :attr str description: a text describing the job to the user
+    :attr func: the function to be called in the worker thread
+    :attr tuple args: the positional arguments of `func`
+    :attr callback:
+        a callable to be called, in the GUI thread, with the value
+        returned by `func`
+    :attr bool cancelled: True if the result must be discarded
+    :attr result: the value returned by `func`
+    :attr error: the exception raised by `func` (if any)
+    """
+    def __init__(self, description, func, args=(), callback=None):
+        self.description = description
+        self.func = func
+        self.args = args
+        self.callback = callback
+        self.cancelled = False
+        self.result = None
+        self.error = None
+        self.traceback = None
+
+    def run(self):
+        try:
+            self.result = self.func(*self.args)
+        except Exception as e:
+            self.error = e
+            self.traceback = traceback.format_exc()
+
+
+class JobEngine(QtCore.QThread):
+    """
+    Run jobs, one at a time, in a worker thread so that the GUI stays
+    responsive. Jobs submitted while another one is running are queued.
+
+    Python threads can not be interrupted, so cancelling a job that is
+    already running only discards its result: the worker moves on to
+    the next job as soon as the current one returns.
+
+    Signals:
+
+    jobStarted(Job): a job has started running in the worker thread
+    jobFailed(Job): a job has raised an exception
+    idle(): all the submitted jobs have finished or have been cancelled
+
+    :attr list jobs: the jobs submitted and not yet finished
+    """
+    jobStarted = QtCore.pyqtSignal(object)
+    jobFinished = QtCore.pyqtSignal(object)
+    jobFailed = QtCore.pyqtSignal(object)
+    idle = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None):
+        super(JobEngine, self).__init__(parent)
+        self.jobs = []
+        self.queue = Queue.Queue()
+
+        # the engine lives in the GUI thread, so this connection is
+        # queued and the callbacks are called in the GUI thread
+        self.jobFinished.connect(self._finish)
+
+    def submit(self, job):
+        """
+        Queue `job` for execution
+        """
+        self.jobs.append(job)
+        self.queue.put(job)
+        if not self.isRunning():
+            self.start()
+
+    def cancel(self):
+        """
+        Cancel all the submitted jobs
+        """
+        for job in self.jobs:
+            job.cancelled = True
+        self.idle.emit()
+
+    def stop(self):
+        """
+        Cancel all the jobs and wait for the worker thread to exit
+        (after that the running job, if any, has returned)
+        """
+        self.cancel()
+        if self.isRunning():
+            self.queue.put(None)
+            self.wait()
+
+    def pending(self):
+        """
+        :returns: the number of jobs submitted and not cancelled
+        """
+        return sum(1 for job in self.jobs if not job.cancelled)
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            if not job.cancelled:
+                self.jobStarted.emit(job)
+                job.run()
+            self.jobFinished.emit(job)
+
+    def _finish(self, job):
+        self.jobs.remove(job)
+        if not job.cancelled:
+            if job.error is not None:
+                self.jobFailed.emit(job)
+            elif job.callback is not None:
+                job.callback(job.result)
+            if not self.pending():
+                self.idle.emit()
@@ -0,0 +1,171 @@
+import os
+import collections
+import traceback
+
+from PyQt4 import QtCore
+
+from openquake.nrmllib.hazard.parsers import SourceModelParser
+
+from catalogue_io import CatalogueReader
+from catalogue_cache import CatalogueCache
+from catalogue_map import SOURCE_STYLES, source_features
+
+
+# number of events shown before that the rest of the catalogue is read
+FIRST_CHUNK_SIZE = 1000
+
+# number of events read (and then appended to the model) at a time
+CHUNK_SIZE = 20000
+
+# number of sources of the same type added to the map at a time
+SOURCE_BATCH_SIZE = 500
+
+
+class CatalogueLoader(QtCore.QThread):
+    """
+    Read a catalogue csv file progressively. The first chunk of events
+    is read by #first_chunk (in the calling thread, so that it can be
+    shown immediately), the other ones in a worker thread, which emits
+    `chunkLoaded` for each of them. When the whole file has been read,
+    the catalogue built from the chunks can be stored in the cache with
+    #store.
+
+    Signals:
+
+    chunkLoaded(dict): the columns of the events just read
+    progress(int): the percentage of the file read
+    loaded(bool): the file has been read (False if cancelled)
+
+    :attr str fname: the path of the csv file
+    :attr cache: a :class:`catalogue_cache.CatalogueCache` instance
+    """
+    chunkLoaded = QtCore.pyqtSignal(object)
+    progress = QtCore.pyqtSignal(int)
+    loaded = QtCore.pyqtSignal(bool)
+
+    def __init__(self, fname, cache=None, parent=None):
+        super(CatalogueLoader, self).__init__(parent)
+        self.fname = fname
+        self.cache = cache or CatalogueCache()
+        self.reader = CatalogueReader(fname)
+        self.size = os.path.getsize(fname)
+        self.cancelled = False
+
+        self._chunks = self.reader.chunks(CHUNK_SIZE, FIRST_CHUNK_SIZE)
+
+    def first_chunk(self):
+        """
+        :returns:
+            the columns of the first events of the file, or None if
+            the file holds no event
+        """
+        return next(self._chunks, None)
+
+    def cancel(self):
+        """
+        Stop reading the file. The chunks already emitted are kept
+        """
+        self.cancelled = True
+
+    def run(self):
+        for chunk in self._chunks:
+            if self.cancelled:
+                break
+            self.chunkLoaded.emit(chunk)
+            self.progress.emit(int(100. * self.reader.bytes_read / self.size))
+
+        if self.cancelled:
+            self._chunks.close()
+        self.loaded.emit(not self.cancelled)
+
+    def store(self, catalogue):
+        """
+        Store in the cache the `catalogue` built from the chunks (it
+        can be called in a worker thread)
+        """
+        try:
+            self.cache.store(self.fname, catalogue)
+        except (IOError, OSError):
+            # the cache is an optimization, a failure is not fatal
+            pass
+
+
+class SourceLoader(QtCore.QThread):
+    """
+    Read a NRML source model in a worker thread. Sources are parsed
+    one at a time, so the whole model is never held in memory, and
+    their features are built (see :func:`catalogue_map.source_features`)
+    and emitted in batches of sources of the same type. Sources of
+    unsupported types are skipped.
+
+    Signals:
+
+    featuresLoaded(str, list, list): a batch of features
+    progress(int): the percentage of the file read
+    loaded(bool): the file has been read (False if cancelled or failed)
+
+    :attr str fname: the path of the NRML file
+    :attr error: the traceback of the parsing error (if any)
+    """
+    featuresLoaded = QtCore.pyqtSignal(object, object, object)
+    progress = QtCore.pyqtSignal(int)
+    loaded = QtCore.pyqtSignal(bool)
+
+    def __init__(self, fname, parent=None):
+        super(SourceLoader, self).__init__(parent)
+        self.fname = fname
+        self.size = os.path.getsize(fname)
+        self.cancelled = False
+        self.error = None
+
+    def cancel(self):
+        """
+        Stop reading the file. The sources already emitted are kept
+        """
+        self.cancelled = True
+
+    def run(self):
+        try:
+            with open(self.fname, 'rb') as fobj:
+                for stype, batch in source_batches(
+                        fobj, cancelled=lambda: self.cancelled):
+                    self._emit(stype, batch)
+                    # the parser reads the file as it goes
+                    self.progress.emit(int(100. * fobj.tell() / self.size))
+        except Exception:
+            self.error = traceback.format_exc()
+        self.loaded.emit(not self.cancelled and self.error is None)
+
+    def _emit(self, stype, sources):
+        features, faults = source_features(stype, sources)
+        self.featuresLoaded.emit(stype, features, faults)
+
+
+def source_batches(fobj, batch_size=SOURCE_BATCH_SIZE, types=SOURCE_STYLES,
+                   cancelled=None):
+    """
+    Parse the NRML source model in the file `fobj` one source at a time,
+    skipping the sources whose type is not in `types`
+
+    :param cancelled:
+        a callable returning True if the parsing has to be stopped (the
+        sources not yet yielded are then discarded)
+    :returns:
+        an iterator over pairs (source type, list of sources) with
+        `batch_size` sources of the same type (less for the last batch
+        of each type, yielded at the end of the file)
+    """
+    batches = collections.defaultdict(list)
+    for src in SourceModelParser(fobj).parse():
+        if cancelled is not None and cancelled():
+            return
+        stype = type(src).__name__
+        if stype not in types:
+            continue
+        batches[stype].append(src)
+        if len(batches[stype]) == batch_size:
+            yield stype, batches.pop(stype)
+    for stype, batch in batches.items():
+        if cancelled is not None and cancelled():
+            return
+        yield stype, batch
@@ -0,0 +1,124 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import openquake.nrmllib
+    import qgis.core
+    import PyQt4
+except ImportError:
+    raise unittest.SkipTest("nrmllib, qgis or PyQt4 are not available")
+
+from loaders import source_batches
+
+HEADER = """<?xml version='1.0' encoding='utf-8'?>
+<nrml xmlns:gml="http://www.opengis.net/gml"
+      xmlns="http://openquake.org/xmlns/nrml/0.4">
+  <sourceModel name="Test">
+"""
+
+FOOTER = """  </sourceModel>
+</nrml>
+"""
+
+POINT_SOURCE = """    <pointSource id="p%(i)d" name="point %(i)d"
+                 tectonicRegion="Active Shallow Crust">
+      <pointGeometry>
+        <gml:Point><gml:pos>%(lon)s 38.0</gml:pos></gml:Point>
+        <upperSeismoDepth>0.0</upperSeismoDepth>
+        <lowerSeismoDepth>10.0</lowerSeismoDepth>
+      </pointGeometry>
+      <magScaleRel>WC1994</magScaleRel>
+      <ruptAspectRatio>0.5</ruptAspectRatio>
+      <truncGutenbergRichterMFD aValue="-3.5" bValue="1.0" minMag="5.0"
+                                maxMag="6.5"/>
+      <nodalPlaneDist>
+        <nodalPlane probability="1.0" strike="0.0" dip="90.0" rake="0.0"/>
+      </nodalPlaneDist>
+      <hypoDepthDist>
+        <hypoDepth probability="1.0" depth="5.0"/>
+      </hypoDepthDist>
+    </pointSource>
+"""
+
+FAULT_SOURCE = """    <simpleFaultSource id="f%(i)d" name="fault %(i)d"
+                       tectonicRegion="Active Shallow Crust">
+      <simpleFaultGeometry>
+        <gml:LineString>
+          <gml:posList>%(lon)s 38.0 %(lon)s 38.5</gml:posList>
+        </gml:LineString>
+        <dip>45.0</dip>
+        <upperSeismoDepth>0.0</upperSeismoDepth>
+        <lowerSeismoDepth>10.0</lowerSeismoDepth>
+      </simpleFaultGeometry>
+      <magScaleRel>WC1994</magScaleRel>
+      <ruptAspectRatio>1.5</ruptAspectRatio>
+      <truncGutenbergRichterMFD aValue="-3.5" bValue="1.0" minMag="5.0"
+                                maxMag="6.5"/>
+      <rake>90.0</rake>
+    </simpleFaultSource>
+"""
+
+
+class SourceBatchesTestCase(unittest.TestCase):
+    # the file is much larger than the buffer of the parser, so that
+    # it is read in several steps
+    POINTS = 400
+    FAULTS = 7
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fname = os.path.join(self.directory, 'sources.xml')
+        with open(self.fname, 'w') as fobj:
+            fobj.write(HEADER)
+            for i in range(self.POINTS):
+                fobj.write(POINT_SOURCE % dict(i=i, lon=-122 + i * .001))
+                if i % 60 == 0:
+                    fobj.write(FAULT_SOURCE % dict(i=i, lon=-121 + i * .001))
+            fobj.write(FOOTER)
+        self.size = os.path.getsize(self.fname)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_batches(self):
+        with open(self.fname, 'rb') as fobj:
+            batches = list(source_batches(fobj, batch_size=50))
+        points = [len(batch) for stype, batch in batches
+                  if stype == 'PointSource']
+        faults = [len(batch) for stype, batch in batches
+                  if stype == 'SimpleFaultSource']
+        self.assertEqual([50] * 8, points)
+        self.assertEqual([self.FAULTS], faults)
+        ids = [src.id for stype, batch in batches for src in batch
+               if stype == 'PointSource']
+        self.assertEqual(['p%d' % i for i in range(self.POINTS)], ids)
+
+    def test_streaming(self):
+        # the first batch arrives before the whole file has been parsed
+        with open(self.fname, 'rb') as fobj:
+            batches = source_batches(fobj, batch_size=10)
+            stype, batch = next(batches)
+            self.assertEqual('PointSource', stype)
+            self.assertEqual(10, len(batch))
+            self.assertLess(fobj.tell(), self.size / 2)
+
+            list(batches)
+            self.assertEqual(self.size, fobj.tell())
+
+    def test_types(self):
+        with open(self.fname, 'rb') as fobj:
+            batches = list(source_batches(
+                fobj, batch_size=1000, types=['SimpleFaultSource']))
+        self.assertEqual(['SimpleFaultSource'],
+                         [stype for stype, _ in batches])
+
+    def test_cancelled(self):
+        batches_nr = []
+        with open(self.fname, 'rb') as fobj:
+            for _ in source_batches(
+                    fobj, batch_size=10,
+                    cancelled=lambda: len(batches_nr) == 3):
+                batches_nr.append(1)
+        self.assertEqual(3, len(batches_nr))
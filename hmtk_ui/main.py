@@ -1,6 +1,5 @@
 import os
 import sys
-import imp
 import sip
 
 for api in ['QString', 'QDate', 'QDateTime', 'QTextStream',
@@ -11,23 +10,21 @@ from PyQt4 import QtGui, QtCore
 
 from qgis.core import QgsApplication
 
+import process_pool
 from main_window import MainWindow
-from catalogue_model import CatalogueModel
 from utils import excepthook
-
-
-# A plugin file is a python source coded loaded at init time meant to
-# register new hmtk algorithms to the hmtk registries.
-PLUGIN_FILE = os.environ.get('HMTK_PLUGIN_FILE',
-                             os.path.expanduser("~/hmtk-plugin.py"))
+from algorithms import load_plugins
 
 
 # Main entry to program.  Sets up the main app and create a new window.
 def main(argv):
 
     # load plugins
-    if os.path.exists(PLUGIN_FILE):
-        imp.load_source('hmtk.plugin', PLUGIN_FILE)
+    load_plugins()
+
+    # fork the worker processes (which look up the algorithms in the
+    # registries) before any thread is started, see process_pool
+    process_pool.start()
 
     # create Qt application
 
@@ -57,7 +54,7 @@ def main(argv):
         wnd.raise_()
 
     if len(argv) > 1:
-        wnd.change_model(CatalogueModel.from_csv_file(argv[1]))
+        wnd.open_catalogue(argv[1])
 
         if len(argv) > 2:
             wnd.load_fault_source(argv[2])
@@ -73,6 +70,7 @@ def main(argv):
 
     # Start the app up
     ret = app.exec_()
+    process_pool.stop()
 
     sys.exit(ret)
 
@@ -10,21 +10,27 @@ from qgis.gui import (
 
 from hmtkwindow import Ui_HMTKWindow
 
-from hmtk.seismicity import (
-    DECLUSTERER_METHODS, COMPLETENESS_METHODS, OCCURRENCE_METHODS,
-    MAX_MAGNITUDE_METHODS, SMOOTHED_SEISMICITY_METHODS)
 from hmtk.seismicity.catalogue import Catalogue
 
-from openquake.nrmllib.hazard.parsers import SourceModelParser
 
 
-from histogram import CATALOGUE_ANALYSIS_METHODS
+from algorithms import REGISTRIES, algorithm_key
 from utils import alert
 from tab import Tab
 from selectors import SELECTORS, Invert
-from catalogue_model import CatalogueModel
+from catalogue_model import CatalogueModel, compute_result, FLAG_COLUMNS
 from catalogue_map import CatalogueMap
-from widgets import CompletenessDialog, wait_cursor, SelectionDialog
+from catalogue_cache import CatalogueCache
+from catalogue_io import append_columns
+from loaders import CatalogueLoader, SourceLoader
+from jobs import Job, JobEngine
+from history import UndoHistory, ModelChange, ColumnsChange, PurgeChange
+from sweep import SWEEP_ANALYSES
+from bootstrap import BOOTSTRAP_ANALYSES, run_bootstrap, rate_band
+import raster
+from widgets import (
+    CompletenessDialog, wait_cursor, SelectionDialog, ProgressWidget,
+    SweepDialog)
 
 
 class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
@@ -34,9 +40,14 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
         events, completeness, model for supporting tables)
     :attr catalogue_map:
         a CatalogueMap (which holds the state of the map)
-    :attr list states:
-        a stack of CatalogueModel instances used for undoing application
-        state changes
+    :attr states:
+        a :class:`history.UndoHistory` holding the changes applied to the
+        catalogue model, used for undoing application state changes
+    :attr loader:
+        the :class:`loaders.CatalogueLoader` reading the current
+        catalogue, or None when the catalogue has been fully loaded
+    :attr jobs:
+        a :class:`jobs.JobEngine` running the analysis algorithms
 
     :attr QtDialog selection_editor:
         a dialog with the selection tools
@@ -44,17 +55,33 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
         a set of `Tab` instances
     """
 
+    # the catalogue columns and the model attributes changed by the
+    # analyses that can be undone
+    UNDOABLE_ANALYSES = {
+        'declustering': (['Cluster_Index', 'Cluster_Flag'],),
+        'completeness': (
+            ['Completeness_Flag'],
+            ['completeness_table', 'last_computed_completeness_table']),
+    }
+
     def __init__(self):
         super(MainWindow, self).__init__()
 
         self.catalogue_model = None
         self.catalogue_map = None
 
-        self.states = []
+        self.states = UndoHistory()
+        self.loader = None
+        self.jobs = JobEngine(self)
 
         # to be set in setupUi
         self.tabs = None
         self.selection_editor = None
+        self.progress_widget = None
+        self.jobs_widget = None
+        self.source_loader = None
+        self.sources_widget = None
+        self.bootstrap_replicates = {}
 
         # set up User Interface (widgets, layout...)
         self.setupUi(self)
@@ -62,14 +89,18 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
         # bind menu actions
         self.setup_actions()
 
-    def push_state(self, state):
-        if not self.states:
-            self.actionUndo.setEnabled(True)
-        self.states.append(state)
+    def push_state(self, change):
+        """
+        :param change: a :class:`history.Change` instance
+        """
+        self.states.push(change)
+        self.actionUndo.setEnabled(bool(self.states) and self.loader is None)
 
     def undo(self):
         if self.states:
-            self.change_model(self.states.pop())
+            self.states.pop().revert(self)
+            self.catalogueTableView.setModel(self.catalogue_model.item_model)
+            self.change_tab(self.stackedFormWidget.currentIndex())
 
             if not self.states:
                 self.actionUndo.setDisabled(True)
@@ -88,35 +119,57 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
         self.selection_editor = SelectionDialog(self)
         self.actionUndo.setDisabled(True)
 
+        self.progress_widget = ProgressWidget()
+        self.progress_widget.cancelled.connect(self.cancel_loading)
+        self.statusBar.addPermanentWidget(self.progress_widget)
+
+        self.sources_widget = ProgressWidget()
+        self.sources_widget.cancelled.connect(self.cancel_source_loading)
+        self.statusBar.addPermanentWidget(self.sources_widget)
+
+        self.jobs_widget = ProgressWidget()
+        self.jobs_widget.cancelled.connect(self.jobs.cancel)
+        self.statusBar.addPermanentWidget(self.jobs_widget)
+        self.jobs.jobStarted.connect(self.on_job_started)
+        self.jobs.jobFailed.connect(self.on_job_failed)
+        self.jobs.idle.connect(self.jobs_widget.stop)
+
         # setup dynamic forms
         self.tabs = (
             Tab("declustering",
                 self.declusteringFormLayout,
-                DECLUSTERER_METHODS,
+                REGISTRIES["declustering"],
                 [self.declusterButton, self.declusteringPurgeButton]),
             Tab("completeness",
                 self.completenessFormLayout,
-                COMPLETENESS_METHODS,
+                REGISTRIES["completeness"],
                 [self.completenessButton, self.completenessPurgeButton]),
             Tab("recurrence_model",
                 self.recurrenceModelFormLayout,
-                OCCURRENCE_METHODS,
+                REGISTRIES["recurrence_model"],
                 [self.recurrenceModelButton]),
             Tab("max_magnitude",
                 self.maxMagnitudeFormLayout,
-                MAX_MAGNITUDE_METHODS,
+                REGISTRIES["max_magnitude"],
                 [self.maxMagnitudeButton]),
             Tab("smoothed_seismicity",
                 self.smoothedSeismicityFormLayout,
-                SMOOTHED_SEISMICITY_METHODS,
+                REGISTRIES["smoothed_seismicity"],
                 [self.smoothedSeismicityButton]),
             Tab("histogram",
                 self.catalogueAnalysisFormLayout,
-                CATALOGUE_ANALYSIS_METHODS,
+                REGISTRIES["histogram"],
                 [self.catalogueAnalysisButton]))
 
         for tab in self.tabs:
             tab.setup_form(self.on_algorithm_select)
+            if tab.name in BOOTSTRAP_ANALYSES:
+                spin_box = QtGui.QSpinBox()
+                spin_box.setRange(0, 100000)
+                spin_box.setSingleStep(100)
+                spin_box.setSpecialValueText("No bootstrap")
+                tab.add_option("bootstrap_replicates", spin_box)
+                self.bootstrap_replicates[tab.name] = spin_box
         self.stackedFormWidget.currentChanged.connect(self.change_tab)
 
         # setup Map
@@ -227,14 +280,117 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
         if not csv_file:
             return
 
-        self.change_model(CatalogueModel.from_csv_file(csv_file))
+        self.open_catalogue(csv_file)
+
+    def open_catalogue(self, fname):
+        """
+        Load the catalogue stored in the csv file `fname`.
+
+        Catalogues not in the cache are loaded progressively: the first
+        events are shown immediately, then the other ones are read by a
+        worker thread and appended as they come. The algorithm tabs are
+        disabled until the whole catalogue has been loaded.
+        """
+        self.discard_loading()
+
+        cache = CatalogueCache()
+        if cache.contains(fname):
+            self.change_model(CatalogueModel.from_csv_file(fname))
+            return
+
+        loader = CatalogueLoader(fname, cache, self)
+        chunk = loader.first_chunk()
+        if chunk is None:
+            self.change_model(CatalogueModel.from_csv_file(fname))
+            return
+
+        catalogue = Catalogue()
+        append_columns(catalogue, chunk)
+        catalogue.update_end_year()
+        self.change_model(CatalogueModel(catalogue))
+
+        self.loader = loader
+        loader.chunkLoaded.connect(self.append_events)
+        loader.progress.connect(self.progress_widget.set_progress)
+        loader.loaded.connect(self.after_loading)
+        self.set_loading(True)
+        self.progress_widget.start("Loading %s" % fname)
+        loader.start()
+
+    def append_events(self, chunk):
+        """
+        Append a chunk of events read by the catalogue loader to the
+        model, the table and the map
+        """
+        # ignore the events of a catalogue that has been discarded
+        if self.sender() is not self.loader:
+            return
+        self.catalogue_map.add_events(self.catalogue_model.append(chunk))
+
+    def after_loading(self, completed):
+        loader = self.sender()
+        if loader is not self.loader:
+            return
+        self.loader = None
+        self.set_loading(False)
+        self.catalogue_model.finish_append()
+        if completed and loader.cache.directory:
+            # the catalogue model columns are replaced and not modified
+            # by the analyses, so they can be stored in a worker thread
+            catalogue = self.catalogue_model.snapshot()
+            for key in FLAG_COLUMNS:
+                del catalogue.data[key]
+            self.jobs.submit(Job(
+                "Caching the catalogue", loader.store, (catalogue,)))
+        self.catalogue_map.update_level_of_detail()
+        self.recurrenceModelChart.draw_seismicity_rate(
+            self.catalogue_model.catalogue, None)
+        if not completed:
+            alert("Loading cancelled. %d events have been loaded" %
+                  self.catalogue_model.catalogue.get_number_events())
+
+    def cancel_loading(self):
+        """
+        Stop loading the current catalogue. The events loaded so far
+        are kept
+        """
+        if self.loader is not None:
+            self.loader.cancel()
+
+    def discard_loading(self):
+        """
+        Stop loading the current catalogue and ignore the events not
+        yet appended
+        """
+        if self.loader is not None:
+            self.loader.cancel()
+            self.loader.wait()
+            self.loader = None
+            self.set_loading(False)
+
+    def set_loading(self, loading):
+        """
+        Disable the algorithm tabs and the undo action while a catalogue
+        is being loaded (or enable them back)
+        """
+        for tab in self.tabs:
+            tab.set_enabled(not loading)
+        self.actionUndo.setEnabled(not loading and bool(self.states))
+        if not loading:
+            self.progress_widget.stop()
+
+    def closeEvent(self, event):
+        self.discard_loading()
+        self.cancel_source_loading(wait=True)
+        self.jobs.stop()
+        super(MainWindow, self).closeEvent(event)
 
     # FIXME. all the behaviors below should be handled with signals
     # TODO. Move this into a new singleton "Project" class
     @wait_cursor
-    def change_model(self, model):
-        if self.catalogue_model:
-            self.push_state(self.catalogue_model)
+    def change_model(self, model, undoable=True):
+        if self.catalogue_model and undoable:
+            self.push_state(ModelChange(self.catalogue_model))
         self.catalogue_model = model
         self.catalogueTableView.catalogue_model = model
         self.catalogueTableView.setModel(self.catalogue_model.item_model)
@@ -252,13 +408,43 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
         self.recurrenceModelChart.draw_seismicity_rate(
             self.catalogue_model.catalogue, None)
 
-    @wait_cursor
     def load_fault_source(self, fname):
         """
-        Open a file dialog, load a source model from a nrml file,
-        draw the source on the map
+        Load a source model from the nrml file `fname` in a worker
+        thread, drawing the sources on the map as they are read
+        """
+        if not fname:
+            return
+        self.cancel_source_loading(wait=True)
+
+        loader = SourceLoader(unicode(fname), self)
+        loader.featuresLoaded.connect(self.catalogue_map.add_source_features)
+        loader.progress.connect(self.sources_widget.set_progress)
+        loader.loaded.connect(self.after_loading_sources)
+        self.source_loader = loader
+        self.sources_widget.start("Loading %s" % fname)
+        loader.start()
+
+    def after_loading_sources(self, completed):
+        loader = self.sender()
+        if loader is not self.source_loader:
+            return
+        self.source_loader = None
+        self.sources_widget.stop()
+        if loader.error is not None:
+            alert("Failed to load %s\n\n%s" % (loader.fname, loader.error))
+
+    def cancel_source_loading(self, wait=False):
+        """
+        Stop loading the current source model. The sources loaded so
+        far are kept
         """
-        self.catalogue_map.add_source_layers(SourceModelParser(fname).parse())
+        if self.source_loader is not None:
+            self.source_loader.cancel()
+            if wait:
+                self.source_loader.wait()
+                self.source_loader = None
+                self.sources_widget.stop()
 
     # TODO. move to widgets.SelectionDialog
     def add_to_selection(self, idx):
@@ -311,7 +497,9 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
         if QtGui.QMessageBox.question(
                 self, "Remove unselected events", "Are you sure?",
                 QtGui.QDialogButtonBox.Yes, QtGui.QDialogButtonBox.No):
-            self.change_model(CatalogueModel(catalogue))
+            self.after_purge(*self.catalogue_model.purge(numpy.in1d(
+                self.catalogue_model.catalogue.data['eventID'],
+                catalogue.data['eventID'])))
             for _ in range(self.selection_editor.selectorList.count()):
                 self.selection_editor.selectorList.takeItem(0)
 
@@ -335,6 +523,12 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
         self.actionEventsInspector.triggered.connect(
             lambda: self.stackedFormWidget.setCurrentIndex(6))
 
+        self.actionParameterSweep = QtGui.QAction(self)
+        self.actionParameterSweep.setText("Parameter sweep...")
+        self.menuTools.insertAction(
+            self.actionCatalogueAnalysis, self.actionParameterSweep)
+        self.actionParameterSweep.triggered.connect(self.parameter_sweep)
+
         # menu import/export actions
         self.actionLoadCatalogue.triggered.connect(self.load_catalogue)
         self.actionSaveCatalogue.triggered.connect(self.save_catalogue)
@@ -352,6 +546,13 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
             self.menuExport.addAction(action)
             action.triggered.connect(self.save_as(flt, fmt))
 
+        self.actionExportSmoothedSeismicity = QtGui.QAction(self)
+        self.actionExportSmoothedSeismicity.setText(
+            "Smoothed seismicity (GeoTIFF)...")
+        self.menuExport.addAction(self.actionExportSmoothedSeismicity)
+        self.actionExportSmoothedSeismicity.triggered.connect(
+            self.export_smoothed_seismicity)
+
         # Selection management
         self.actionDeleteUnselectedEvents.triggered.connect(
             self.remove_unselected_events)
@@ -409,23 +610,87 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
                 self, "Save Catalogue", "", "*.csv"))
 
     # XXX. Maybe move to tabs.Tab
-    @wait_cursor
-    def _apply_algorithm(self, name):
+    def _apply_algorithm(self, name, callback):
+        """
+        Run the algorithm selected in the current tab for the analysis
+        `name`, see #run_analysis
+        """
         algorithm = self.current_tab().algorithm()
         try:
             config = self.current_tab().get_config()
         except ValueError as e:
             alert(str(e))
             return
-        return getattr(self.catalogue_model, name)(algorithm, config)
+        self.run_analysis(name, algorithm, config, callback)
+
+    def run_analysis(self, name, algorithm, config, callback):
+        """
+        Run `algorithm` for the analysis `name` in the job engine. When
+        it has finished, apply the result to the catalogue model
+        (recording the change for undoing) and call `callback` with the
+        analysis output.
+
+        The result is discarded if the catalogue events have changed in
+        the meantime. If the inputs of the analysis, the algorithm and
+        its configuration have not changed since the last run, the last
+        output is reused. Results found in the result cache are applied
+        immediately
+        """
+        model = self.catalogue_model
+        if model.pipeline.is_current(name, algorithm, config):
+            callback(model.stage_output(name))
+            return
+
+        events_version = model.column_versions['eventID']
+        input_versions = model.pipeline.input_versions(name)
+
+        def apply_result(result, cached=False):
+            if (model is not self.catalogue_model or
+                    model.column_versions['eventID'] != events_version):
+                alert("The catalogue has changed while running %s. "
+                      "The result has been discarded" % name)
+                return
+            change = None
+            if name in self.UNDOABLE_ANALYSES:
+                change = ColumnsChange(model, *self.UNDOABLE_ANALYSES[name])
+            output = model.apply(name, result, algorithm, config, cached)
+            model.pipeline.update(
+                name, algorithm, config, output, input_versions)
+            if change is not None and change.commit():
+                self.push_state(change)
+            callback(output)
+
+        key = model.result_key(name, algorithm, config)
+        try:
+            result = model.result_cache.get(key)
+        except KeyError:
+            pass
+        else:
+            apply_result(result, cached=True)
+            return
+
+        self.jobs.submit(Job(
+            "Running %s" % name.replace('_', ' '), compute_result,
+            (model.result_cache, key, name, algorithm, config,
+             model.snapshot(), model.completeness_table),
+            apply_result))
+
+    def on_job_started(self, job):
+        queued = self.jobs.pending() - 1
+        self.jobs_widget.start(
+            job.description + (" (%d queued)" % queued if queued else ""),
+            busy=True)
+
+    def on_job_failed(self, job):
+        alert("%s failed: %s\n\n%s" % (
+            job.description, job.error, job.traceback))
 
     # TODO. Remove it. Connect output widgets to signal algorithmRun
     @pyqtSlot(name="on_catalogueAnalysisButton_clicked")
     def histogram(self):
-        histogram_data = self._apply_algorithm("histogram")
-
-        self.catalogue_model.histogram_output = histogram_data
+        self._apply_algorithm("histogram", self.show_histogram)
 
+    def show_histogram(self, histogram_data):
         if len(histogram_data) == 2:
             bins, histogram = histogram_data
             self.catalogueAnalysisChart.draw_1d_histogram(histogram, bins)
@@ -444,12 +709,13 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
         Apply current selected declustering algorithm, then update the
         map
         """
-        success = self._apply_algorithm("declustering")
+        self._apply_algorithm("declustering", self.show_declustering)
+
+    def show_declustering(self, success):
         self.catalogueTableView.setModel(self.catalogue_model.item_model)
         self.catalogue_map.update_catalogue_layer(
-            ['Cluster_Index', 'Cluster_Flag'])
+            ['Cluster_Index', 'Cluster_Flag'], "cluster")
         self.add_declustering_output()
-        self.catalogue_map.set_catalogue_style("cluster")
         self.declusteringChart.draw_declustering_pie(
             self.catalogue_model.catalogue.data['Cluster_Index'],
             self.catalogue_model.catalogue.data['Cluster_Flag'])
@@ -461,11 +727,10 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
         Apply current selected declustering algorithm and purge the
         catalogue. Update the map, the table and the charts
         """
-        if self.decluster():
-            self.catalogue_model.purge_decluster()
-
-            self.catalogueTableView.setModel(self.catalogue_model.item_model)
-            self.catalogue_map.change_catalogue_model(self.catalogue_model)
+        def purge(success):
+            if self.show_declustering(success):
+                self.after_purge(*self.catalogue_model.purge_decluster())
+        self._apply_algorithm("declustering", purge)
 
     @pyqtSlot(name="on_completenessPurgeButton_clicked")
     def purge_completeness(self):
@@ -473,10 +738,19 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
         Apply current selected completeness algorithm and purge the
         catalogue. Update the map, the table and the charts
         """
-        if self.completeness():
-            self.catalogue_model.purge_completeness()
-            self.catalogueTableView.setModel(self.catalogue_model.item_model)
-            self.catalogue_map.change_catalogue_model(self.catalogue_model)
+        def purge(model):
+            if self.show_completeness(model):
+                self.after_purge(*self.catalogue_model.purge_completeness())
+        self._apply_algorithm("completeness", purge)
+
+    def after_purge(self, removed, removed_data):
+        """
+        Record a purge of the catalogue model (see
+        `CatalogueModel#purge`) for undoing, then remove the purged
+        events from the map (the table is updated by the model)
+        """
+        self.push_state(PurgeChange(removed, removed_data))
+        self.catalogue_map.remove_events(removed)
 
     @pyqtSlot(name="on_completenessButton_clicked")
     def completeness(self):
@@ -484,13 +758,14 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
         Apply current selected completeness algorithm, then update the
         map and the chart if needed
         """
-        model = self._apply_algorithm("completeness")
+        self._apply_algorithm("completeness", self.show_completeness)
 
+    def show_completeness(self, model):
         if model is not None:
-            self.catalogue_map.update_catalogue_layer(['Completeness_Flag'])
+            self.catalogue_map.update_catalogue_layer(
+                ['Completeness_Flag'], "completeness")
             self.completenessChart.draw_completeness(model)
             self.add_completeness_output()
-            self.catalogue_map.set_catalogue_style("completeness")
             return True
 
     @pyqtSlot(name="on_recurrenceModelButton_clicked")
@@ -500,8 +775,9 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
         a popup with the returned values, and draw the results in a
         chart
         """
-        params = self._apply_algorithm("recurrence_model")
+        self._apply_algorithm("recurrence_model", self.show_recurrence_model)
 
+    def show_recurrence_model(self, params):
         # the algorithm for performing recurrence model analysis returns
         # either 3 values, either 5. In the latter case we have the
         # parameter value to plot the seismicity rate chart.
@@ -509,8 +785,8 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
             self.recurrenceModelChart.draw_seismicity_rate(
                 self.catalogue_model.catalogue, *params)
 
-        self.catalogue_model.recurrence_model_output = params
         self.add_recurrence_model_output()
+        self.bootstrap('recurrence_model')
 
     @pyqtSlot(name="on_maxMagnitudeButton_clicked")
     def max_magnitude(self):
@@ -518,10 +794,65 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
         Apply the selected algorithm for maximum magnitude estimation, open
         a popup with the returned values
         """
+        self._apply_algorithm("max_magnitude", self.show_max_magnitude)
 
-        mmax_params = self._apply_algorithm("max_magnitude")
-        self.catalogue_model.maximum_magnitude_output = mmax_params
+    def show_max_magnitude(self, mmax_params):
         self.add_maximum_magnitude_output()
+        self.bootstrap('max_magnitude')
+
+    def bootstrap(self, name):
+        """
+        Estimate the uncertainty of the output of the analysis `name` by
+        bootstrap (if requested in the tab), then show the confidence
+        intervals in the results table and in the chart
+        """
+        model = self.catalogue_model
+        replicates = self.bootstrap_replicates[name].value()
+        output = model.bootstrap_output(name)
+        if output is not None or not replicates:
+            self.show_bootstrap(name)
+            return
+
+        stage = model.pipeline.stages[name]
+        key = algorithm_key(name, stage.algorithm)
+        if key is None:
+            return
+        stage_version = stage.version
+
+        def store(output):
+            model.set_bootstrap_output(name, output, stage_version)
+            if model is self.catalogue_model:
+                self.show_bootstrap(name)
+
+        job = Job(
+            "Bootstrapping %s (%d replicates)" % (
+                name.replace('_', ' '), replicates),
+            run_bootstrap, callback=store)
+        job.args = (name, key, stage.config, model.snapshot(),
+                    model.completeness_table, replicates, 0.95, True, True,
+                    None, lambda: job.cancelled)
+        self.jobs.submit(job)
+
+    def show_bootstrap(self, name):
+        output = self.catalogue_model.bootstrap_output(name)
+        if output is None:
+            return
+        replicates = output['replicates']
+        if name == 'recurrence_model':
+            self.add_recurrence_model_output()
+            if replicates.shape[1] == 4:
+                magnitude = self.catalogue_model.catalogue.data['magnitude']
+                magnitudes = numpy.linspace(
+                    numpy.min(magnitude), numpy.max(magnitude), 50)
+                lower, upper = rate_band(
+                    replicates, magnitudes, output['confidence'])
+                self.recurrenceModelChart.draw_rate_band(
+                    magnitudes, lower, upper, output['confidence'])
+        elif name == 'max_magnitude':
+            self.add_maximum_magnitude_output()
+            self.maxMagnitudeChart.draw_mmax_distribution(
+                replicates[:, 0], output['lower'][0], output['upper'][0],
+                output['confidence'])
 
     @pyqtSlot(name="on_smoothedSeismicityButton_clicked")
     def smoothed_seismicity(self):
@@ -529,14 +860,92 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
         Apply the smoothing kernel selected algorithm and update the map
         accordingly
         """
-        smoothed_matrix = self._apply_algorithm("smoothed_seismicity")
-        self.catalogue_model.smoothed_seismicity_output = smoothed_matrix
+        self._apply_algorithm(
+            "smoothed_seismicity", self.show_smoothed_seismicity)
+
+    def show_smoothed_seismicity(self, smoothed_matrix):
         self.catalogue_map.set_raster(smoothed_matrix)
         self.add_smoothed_seismicity_output()
+        self.build_raster_overviews()
+
+    def build_raster_overviews(self):
+        """
+        Write in background a tiled and compressed copy, with
+        overviews, of the smoothed seismicity raster and then show it
+        instead of the raster shown by `CatalogueMap#set_raster`, so
+        that repaints at low zoom do not read the whole raster
+        """
+        grid = self.catalogue_map.raster_grid
+        if not raster.overview_levels(grid[0].shape):
+            return
+        filename = raster.memory_filename()
+
+        def show(_):
+            if self.catalogue_map.raster_grid is grid:
+                self.catalogue_map.set_raster_file(filename)
+            else:
+                raster.remove(filename)
+
+        self.jobs.submit(Job(
+            "Building the smoothed seismicity overviews", raster.write_raster,
+            grid + (filename, raster.GEOTIFF_OPTIONS, True), show))
+
+    def export_smoothed_seismicity(self):
+        """
+        Open a file dialog to save the smoothed seismicity as a tiled
+        and compressed GeoTIFF with overviews
+        """
+        if (self.catalogue_map is None or
+                self.catalogue_map.raster_grid is None):
+            alert("Please compute the smoothed seismicity first")
+            return
+        filename = QtGui.QFileDialog.getSaveFileName(
+            self, "Export Smoothed Seismicity", "", "*.tif")
+        if filename:
+            self.jobs.submit(Job(
+                "Exporting the smoothed seismicity", raster.write_raster,
+                self.catalogue_map.raster_grid + (
+                    unicode(filename), raster.GEOTIFF_OPTIONS, True)))
+
+    def recompute(self, name):
+        """
+        Run again the analysis `name` with the last used algorithm and
+        configuration (e.g. because its inputs have changed)
+        """
+        description = "Running %s" % name.replace('_', ' ')
+        if any(job.description == description and not job.cancelled
+               for job in self.jobs.jobs):
+            return
+        stage = self.catalogue_model.pipeline.stages[name]
+        self.run_analysis(name, stage.algorithm, stage.config,
+                          getattr(self, 'show_%s' % name))
+
+    def parameter_sweep(self):
+        """
+        Open a dialog to run the algorithm selected in the current tab
+        over ranges of parameter values
+        """
+        tab = self.current_tab()
+        if (tab.name not in SWEEP_ANALYSES or tab.algorithm_key() is None or
+                self.catalogue_model is None):
+            alert("Select a declustering or completeness algorithm first")
+            return
+        try:
+            config = tab.get_config()
+        except ValueError as e:
+            alert(str(e))
+            return
+        SweepDialog(self, tab, config).show()
 
     def change_tab(self, index):
         if self.catalogue_map is None:
             return
+
+        # the output of the analysis in the tab is recomputed lazily,
+        # when it is shown and some of its inputs have changed
+        if (index < len(self.tabs) and self.loader is None and
+                self.catalogue_model.pipeline.is_dirty(self.tabs[index].name)):
+            self.recompute(self.tabs[index].name)
         if index == 0:
             self.catalogue_map.set_catalogue_style("cluster")
             self.add_declustering_output()
@@ -604,10 +1013,11 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
             lambda item: self.catalogue_map.center_on(
                 'Cluster_Index', int(
                     self.resultsTable.item(item.row(), 0).data(0))))
-        for row, (cluster_idx, _, _, _) in enumerate(groups, 1):
+        colors = self.catalogue_model.cluster_palette.colors(
+            [cluster.id for cluster in groups])
+        for row, color in enumerate(colors, 1):
             self.resultsTable.item(row, 0).setData(
-                Qt.ForegroundRole,
-                self.catalogue_model.cluster_color(cluster_idx))
+                Qt.ForegroundRole, QtGui.QColor(*[int(c) for c in color]))
 
     def add_completeness_output(self):
         self.resultsTable.set_data(
@@ -633,30 +1043,60 @@ class MainWindow(QtGui.QMainWindow, Ui_HMTKWindow):
                 "Can't update resultsTable for %s" % (
                     self.catalogue_model.histogram_output))
 
+    def cached_label(self, name):
+        """
+        :returns:
+            the vertical labels of the results table, flagging if the
+            output of the analysis `name` has been got from the cache
+        """
+        if name in self.catalogue_model.cached_outputs:
+            return ["(cached)"]
+
+    def with_bootstrap(self, name, row, prefix=()):
+        """
+        :returns:
+            the rows and the vertical labels of the results table of the
+            analysis `name`: the estimate `row` followed by the bounds
+            of the bootstrap confidence interval (if any), each prefixed
+            by `prefix`
+        """
+        output = self.catalogue_model.bootstrap_output(name)
+        if output is None:
+            return [row], self.cached_label(name)
+        tail = 100. * (1 - output['confidence']) / 2
+        label = "(cached)" if self.cached_label(name) else "Estimate"
+        return ([row, list(prefix) + list(output['lower']),
+                 list(prefix) + list(output['upper'])],
+                [label, "%g%%" % tail, "%g%%" % (100 - tail)])
+
     def add_recurrence_model_output(self):
         # see #recurrence_model
-        if self.catalogue_model.recurrence_model_output is not None:
-            if len(self.catalogue_model.recurrence_model_output) == 3:
+        output = self.catalogue_model.recurrence_model_output
+        if output is not None:
+            rows, vlabels = self.with_bootstrap(
+                'recurrence_model', output, output[:1])
+            if len(output) == 3:
                 self.resultsTable.set_data(
-                    [self.catalogue_model.recurrence_model_output[1:]],
-                    ["b value", "sigma b"])
-            elif len(self.catalogue_model.recurrence_model_output) == 5:
+                    [row[1:] for row in rows], ["b value", "sigma b"],
+                    vlabels)
+            elif len(output) == 5:
                 self.resultsTable.set_data(
-                    [self.catalogue_model.recurrence_model_output],
-                    ["Reference Magnitude", "b value", "sigma b",
-                     "rate", "sigma rate"])
+                    rows, ["Reference Magnitude", "b value", "sigma b",
+                           "rate", "sigma rate"], vlabels)
 
     def add_maximum_magnitude_output(self):
         if self.catalogue_model.maximum_magnitude_output is not None:
+            rows, vlabels = self.with_bootstrap(
+                'max_magnitude', self.catalogue_model.maximum_magnitude_output)
             self.resultsTable.set_data(
-                [self.catalogue_model.maximum_magnitude_output],
-                ["Maximum Magnitude", "Standard deviation"])
+                rows, ["Maximum Magnitude", "Standard deviation"], vlabels)
 
     def add_smoothed_seismicity_output(self):
         if self.catalogue_model.smoothed_seismicity_output is not None:
             self.resultsTable.set_data(
                 self.catalogue_model.smoothed_seismicity_output,
-                ["Longitude", "Latitude", "Depth", "Observed", "Smoothed"])
+                ["Longitude", "Latitude", "Depth", "Observed", "Smoothed"],
+                self.cached_label('smoothed_seismicity'))
 
     @property
     def intersect_with_selection(self):
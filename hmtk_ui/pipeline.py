@@ -0,0 +1,168 @@
+import collections
+
+from result_cache import UncacheableError, make_key, algorithm_identity
+
+
+# the analysis stages and their inputs (sources or other stages)
+STAGES = [
+    ('declustering', ['catalogue']),
+    ('completeness', ['catalogue', 'declustering']),
+    ('recurrence_model',
+     ['catalogue', 'completeness_table', 'completeness']),
+    ('max_magnitude', ['catalogue', 'recurrence_model']),
+    ('smoothed_seismicity',
+     ['catalogue', 'completeness_table', 'recurrence_model']),
+    ('histogram', ['catalogue']),
+]
+
+# the catalogue columns holding the output of a stage
+STAGE_COLUMNS = {
+    'Cluster_Index': 'declustering',
+    'Cluster_Flag': 'declustering',
+    'Completeness_Flag': 'completeness',
+}
+
+
+class Stage(object):
+    """
+    A node of the analysis pipeline
+
+    :attr str name: the analysis name
+    :attr list inputs: the names of the sources/stages it depends on
+    :attr int version: incremented every time the output changes
+    :attr input_versions:
+        the versions of the inputs when the output was computed (None
+        if it has never been computed)
+    :attr algorithm: the algorithm used to compute the output
+    :attr dict config: the algorithm configuration
+    :attr output: the output of the stage
+    :attr signature: a digest of the algorithm and its configuration
+    """
+    def __init__(self, name, inputs):
+        self.name = name
+        self.inputs = inputs
+        self.version = 0
+        self.input_versions = None
+        self.algorithm = None
+        self.config = None
+        self.output = None
+        self.signature = None
+
+
+class Pipeline(object):
+    """
+    Track the dependencies between the analyses run on a catalogue
+    model.
+
+    Sources (the catalogue events and the completeness table) and
+    stages have a version. A stage records the versions of its inputs
+    when its output is computed, so it is dirty when any of them has
+    changed since. A changed stage output bumps the stage version,
+    making dirty only the stages downstream.
+
+    :attr sources: a Counter with the version of the sources
+    :attr stages: an OrderedDict of :class:`Stage` keyed by name
+    """
+    def __init__(self, stages=STAGES):
+        self.sources = collections.Counter()
+        self.stages = collections.OrderedDict(
+            (name, Stage(name, inputs)) for name, inputs in stages)
+
+    def touch(self, source):
+        """
+        Mark `source` as changed
+        """
+        self.sources[source] += 1
+
+    def columns_changed(self, keys):
+        """
+        Mark as changed the sources and the stages whose data are held
+        in the catalogue columns `keys`. The output of such stages can
+        no longer be reused (see #is_current), until #update is called
+        """
+        if 'eventID' in keys:
+            self.touch('catalogue')
+        for name in set(STAGE_COLUMNS.get(key) for key in keys):
+            if name is not None:
+                self.stages[name].version += 1
+                self.stages[name].signature = None
+
+    def version(self, name):
+        if name in self.stages:
+            return self.stages[name].version
+        return self.sources[name]
+
+    def input_versions(self, name):
+        """
+        :returns: the current versions of the inputs of the stage `name`
+        """
+        return tuple(self.version(i) for i in self.stages[name].inputs)
+
+    def is_computed(self, name):
+        return self.stages[name].input_versions is not None
+
+    def is_dirty(self, name):
+        """
+        :returns:
+            True if the stage `name` has been computed and any of its
+            inputs has changed since
+        """
+        stage = self.stages[name]
+        return (stage.input_versions is not None and
+                stage.input_versions != self.input_versions(name))
+
+    def is_current(self, name, algorithm, config):
+        """
+        :returns:
+            True if the output of the stage `name` has been computed with
+            `algorithm` and `config` and its inputs have not changed
+        """
+        stage = self.stages[name]
+        current = signature(algorithm, config)
+        return (current is not None and self.is_computed(name) and
+                not self.is_dirty(name) and stage.signature == current)
+
+    def dirty_stages(self):
+        return [name for name in self.stages if self.is_dirty(name)]
+
+    def update(self, name, algorithm, config, output, input_versions=None):
+        """
+        Record that the output of the stage `name` has been computed
+
+        :param input_versions:
+            the versions of the inputs the output has been computed from
+            (by default the current ones)
+        """
+        stage = self.stages[name]
+        stage.input_versions = input_versions or self.input_versions(name)
+        stage.algorithm = algorithm
+        stage.config = config
+        stage.signature = signature(algorithm, config)
+        stage.output = output
+        stage.version += 1
+
+    def refresh(self, name):
+        """
+        Mark the stage `name` and the stages upstream as up to date with
+        their current inputs (e.g. after that the catalogue has been
+        purged using the stage output, which is still valid for the
+        remaining events)
+        """
+        for upstream in self.stages[name].inputs:
+            if upstream in self.stages:
+                self.refresh(upstream)
+        if self.is_computed(name):
+            self.stages[name].input_versions = self.input_versions(name)
+
+
+def signature(algorithm, config):
+    """
+    :returns:
+        a digest identifying `algorithm` and its `config`, or None if
+        `config` holds values that cannot be digested (so that the
+        output is never considered current)
+    """
+    try:
+        return make_key(algorithm_identity(algorithm), config)
+    except UncacheableError:
+        return None
@@ -0,0 +1,140 @@
+import unittest
+
+import numpy
+
+try:
+    import hmtk
+except ImportError:
+    raise unittest.SkipTest("hmtk is not available")
+
+from hmtk.seismicity.catalogue import Catalogue
+
+from pipeline import Pipeline
+from catalogue_model import CatalogueModel
+from history import ColumnsChange, PurgeChange
+
+
+def decluster(catalogue, config):
+    magnitudes = catalogue.data['magnitude']
+    flags = (magnitudes < config['threshold']).astype(int)
+    return numpy.zeros(len(magnitudes)), flags
+
+
+def completeness(catalogue, config):
+    return numpy.array([[config['year'], 4.]])
+
+
+class StubMap(object):
+    def add_events(self, rows):
+        pass
+
+    def update_catalogue_layer(self, keys):
+        pass
+
+
+class StubWindow(object):
+    def __init__(self, model):
+        self.catalogue_model = model
+        self.catalogue_map = StubMap()
+
+
+class PipelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pipeline = Pipeline()
+        for name in ['declustering', 'completeness', 'recurrence_model']:
+            self.pipeline.update(name, decluster, {'threshold': 5}, None)
+
+    def test_clean(self):
+        self.assertEqual([], self.pipeline.dirty_stages())
+        self.assertTrue(self.pipeline.is_current(
+            'declustering', decluster, {'threshold': 5}))
+        self.assertFalse(self.pipeline.is_computed('histogram'))
+
+    def test_downstream(self):
+        # a new declustering makes dirty only the stages downstream
+        self.pipeline.update('declustering', decluster, {'threshold': 6},
+                             None)
+        self.assertEqual(['completeness'], self.pipeline.dirty_stages())
+
+    def test_sources(self):
+        self.pipeline.touch('completeness_table')
+        self.assertEqual(['recurrence_model'], self.pipeline.dirty_stages())
+        self.pipeline.columns_changed(['eventID'])
+        self.assertEqual(['declustering', 'completeness', 'recurrence_model'],
+                         self.pipeline.dirty_stages())
+
+    def test_stage_columns(self):
+        version = self.pipeline.version('declustering')
+        self.pipeline.columns_changed(['Cluster_Flag'])
+        self.assertEqual(version + 1, self.pipeline.version('declustering'))
+        self.assertFalse(self.pipeline.is_current(
+            'declustering', decluster, {'threshold': 5}))
+        self.assertEqual(['completeness'], self.pipeline.dirty_stages())
+
+    def test_config_change(self):
+        self.assertFalse(self.pipeline.is_current(
+            'declustering', decluster, {'threshold': 6}))
+        self.assertFalse(self.pipeline.is_current(
+            'declustering', completeness, {'threshold': 5}))
+        # configurations that cannot be digested are never current
+        self.assertFalse(self.pipeline.is_current(
+            'declustering', decluster, {'threshold': object()}))
+
+
+class ModelPipelineTestCase(unittest.TestCase):
+    def setUp(self):
+        catalogue = Catalogue()
+        catalogue.data['eventID'] = numpy.arange(6)
+        catalogue.data['year'] = numpy.array(
+            [1970, 1975, 1985, 1990, 2000, 2010])
+        catalogue.data['magnitude'] = numpy.array(
+            [3.5, 6., 4.5, 5.5, 3.8, 6.2])
+        catalogue.update_end_year()
+        self.model = CatalogueModel(catalogue)
+        self.pipeline = self.model.pipeline
+
+        self.model.declustering(decluster, {'threshold': 5})
+        self.model.completeness(completeness, {'year': 1980.})
+        self.assertEqual([], self.pipeline.dirty_stages())
+
+    def test_run(self):
+        version = self.pipeline.version('declustering')
+        self.model.declustering(decluster, {'threshold': 5})
+        self.assertEqual(version, self.pipeline.version('declustering'))
+
+        # a config change invalidates the output
+        self.model.declustering(decluster, {'threshold': 4})
+        self.assertGreater(self.pipeline.version('declustering'), version)
+        self.assertEqual(['completeness'], self.pipeline.dirty_stages())
+
+    def test_purge(self):
+        self.model.purge_decluster()
+        self.assertEqual(3, self.model.catalogue.get_number_events())
+        # the declustering is still valid for the remaining events,
+        # while the completeness flags downstream have to be computed
+        # again
+        self.assertEqual(['completeness'], self.pipeline.dirty_stages())
+
+    def test_undo_purge(self):
+        change = PurgeChange(*self.model.purge_decluster())
+        versions = [self.pipeline.version(name)
+                    for name in ['catalogue', 'declustering']]
+        change.revert(StubWindow(self.model))
+
+        self.assertEqual(6, self.model.catalogue.get_number_events())
+        for name, version in zip(['catalogue', 'declustering'], versions):
+            self.assertGreater(self.pipeline.version(name), version)
+        self.assertEqual(['declustering', 'completeness'],
+                         self.pipeline.dirty_stages())
+
+    def test_undo_declustering(self):
+        change = ColumnsChange(self.model, ['Cluster_Index', 'Cluster_Flag'])
+        self.model.declustering(decluster, {'threshold': 4})
+        self.assertTrue(change.commit())
+        version = self.pipeline.version('declustering')
+
+        change.revert(StubWindow(self.model))
+        self.assertGreater(self.pipeline.version('declustering'), version)
+        self.assertFalse(self.pipeline.is_current(
+            'declustering', decluster, {'threshold': 4}))
+        self.assertEqual(['completeness'], self.pipeline.dirty_stages())
@@ -0,0 +1,115 @@
+"""
+The pool of worker processes shared by the parallel computations
+(fault surfaces, parameter sweeps, bootstrap).
+
+These computations are run by the GUI in worker threads, and forking
+a process with several threads is unsafe: the children get a copy of
+the locks held by the other threads (e.g. the import lock), which are
+never released. Python 2 has no spawn or forkserver start method, so
+the pool is created by #start before any thread exists (see main.py).
+Otherwise it is created on first use (e.g. by scripts without
+threads).
+
+The pool is never terminated while in use: a cancelled computation
+stops submitting tasks (see #imap), so that only the few tasks already
+submitted are still run.
+"""
+import os
+import cPickle
+import tempfile
+import itertools
+import collections
+import multiprocessing
+
+
+# number of worker processes (by default, one per core)
+PROCESSES = int(os.environ.get('HMTK_PROCESSES', 0)) or None
+
+_pool = None
+_processes = 0
+
+# the object loaded by #shared in a worker process, with its path
+_shared = (None, None)
+
+
+def start(processes=PROCESSES):
+    """
+    Create the pool of `processes` worker processes, if it does not
+    exist yet
+
+    :returns: the :class:`multiprocessing.Pool` instance
+    """
+    global _pool, _processes
+    if _pool is None:
+        _processes = processes or multiprocessing.cpu_count()
+        _pool = multiprocessing.Pool(_processes)
+    return _pool
+
+
+def stop():
+    """
+    Wait for the running tasks, then stop the worker processes
+    """
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        pool.close()
+        pool.join()
+
+
+def imap(func, iterable, cancelled=None):
+    """
+    Like :meth:`multiprocessing.Pool.imap`, but with at most twice as
+    many tasks submitted as worker processes, ahead of the result being
+    returned.
+
+    :param cancelled:
+        a callable returning True if the computation has to be stopped:
+        no more tasks are submitted and no more results are returned
+    """
+    pool = start()
+    iterable = iter(iterable)
+    pending = collections.deque(
+        pool.apply_async(func, (args,))
+        for args in itertools.islice(iterable, 2 * _processes))
+    while pending:
+        result = pending.popleft().get()
+        if cancelled is not None and cancelled():
+            return
+        for args in itertools.islice(iterable, 1):
+            pending.append(pool.apply_async(func, (args,)))
+        yield result
+
+
+def share(obj):
+    """
+    Store `obj` (e.g. a catalogue) for the tasks of a computation, so
+    that it is pickled once and not with every task. Call #unshare when
+    the computation is over
+
+    :returns: the path to be given to #shared by the tasks
+    """
+    fd, path = tempfile.mkstemp(prefix='hmtk', suffix='.pkl')
+    with os.fdopen(fd, 'wb') as fobj:
+        cPickle.dump(obj, fobj, cPickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def unshare(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def shared(path):
+    """
+    :returns:
+        the object stored in `path` by #share. It is loaded once per
+        worker process (the last one is kept)
+    """
+    global _shared
+    if _shared[0] != path:
+        with open(path, 'rb') as fobj:
+            _shared = (path, cPickle.load(fobj))
+    return _shared[1]
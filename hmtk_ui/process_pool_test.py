@@ -0,0 +1,56 @@
+import os
+import unittest
+
+import process_pool
+
+
+def square(x):
+    if x < 0:
+        raise ValueError("negative value %s" % x)
+    return x * x
+
+
+def shared_length(path):
+    return len(process_pool.shared(path))
+
+
+class ImapTestCase(unittest.TestCase):
+    def setUp(self):
+        process_pool.start()
+        self.consumed = 0
+
+    def counted(self, values):
+        for value in values:
+            self.consumed += 1
+            yield value
+
+    def test_ordered(self):
+        self.assertEqual(
+            [x * x for x in range(50)],
+            list(process_pool.imap(square, self.counted(range(50)))))
+        self.assertEqual(50, self.consumed)
+
+    def test_cancelled(self):
+        results = []
+        for result in process_pool.imap(
+                square, self.counted(range(1000)),
+                cancelled=lambda: len(results) == 3):
+            results.append(result)
+        self.assertEqual([0, 1, 4], results)
+        # only a bounded number of tasks has been submitted
+        self.assertLessEqual(self.consumed, 2 * process_pool._processes + 3)
+
+    def test_error(self):
+        self.assertRaises(ValueError, list,
+                          process_pool.imap(square, [1, -1, 2]))
+        # the pool can still be used
+        self.assertEqual([4], list(process_pool.imap(square, [2])))
+
+    def test_shared(self):
+        path = process_pool.share(range(10))
+        try:
+            self.assertEqual([10, 10], list(process_pool.imap(
+                shared_length, [path, path])))
+        finally:
+            process_pool.unshare(path)
+        self.assertFalse(os.path.exists(path))
@@ -0,0 +1,124 @@
+import math
+
+import numpy
+
+
+# the size (in degrees) of the cells of the coarsest level
+BASE_CELL_SIZE = 10.
+
+# number of levels of the pyramid. Cells are halved at each level
+LEVELS = 8
+
+
+class Level(object):
+    """
+    The aggregates of the events falling in the cells of a regular
+    longitude/latitude grid. Only the non empty cells are stored.
+
+    :attr float cell_size: the size of the cells in degrees
+    :attr ix: the column of the cells (counted from longitude -180)
+    :attr iy: the row of the cells (counted from latitude -90)
+    :attr count: the number of events in each cell
+    :attr max_magnitude: the maximum magnitude in each cell
+    """
+    def __init__(self, cell_size, ix, iy, count, max_magnitude):
+        self.cell_size = cell_size
+        self.ix = ix
+        self.iy = iy
+        self.count = count
+        self.max_magnitude = max_magnitude
+
+    def __len__(self):
+        return len(self.ix)
+
+    def centers(self):
+        """
+        :returns: the longitudes and the latitudes of the cell centers
+        """
+        return (-180. + (self.ix + .5) * self.cell_size,
+                -90. + (self.iy + .5) * self.cell_size)
+
+    def within(self, xmin, ymin, xmax, ymax):
+        """
+        :returns:
+            a boolean array flagging the cells intersecting the given
+            longitude/latitude rectangle
+        """
+        lons = -180. + self.ix * self.cell_size
+        lats = -90. + self.iy * self.cell_size
+        return ((lons + self.cell_size >= xmin) & (lons <= xmax) &
+                (lats + self.cell_size >= ymin) & (lats <= ymax))
+
+
+class Pyramid(object):
+    """
+    A multi-resolution grid of event aggregates (number of events and
+    maximum magnitude per cell), used to draw very large catalogues at
+    low zoom levels. The finest level is computed from the events, each
+    coarser one by merging the cells of the level below.
+
+    :attr list levels: the :class:`Level` instances, from the coarsest
+    :attr version:
+        the version of the catalogue columns the pyramid has been
+        built from
+    """
+    def __init__(self, lons, lats, magnitudes, version=None,
+                 base_cell_size=BASE_CELL_SIZE, levels=LEVELS):
+        self.version = version
+
+        cell_size = base_cell_size / 2 ** (levels - 1)
+        lons = numpy.asarray(lons, dtype=float)
+        lats = numpy.asarray(lats, dtype=float)
+        level = aggregate(
+            cell_size,
+            numpy.floor((lons + 180.) / cell_size).astype(int),
+            numpy.floor((lats + 90.) / cell_size).astype(int),
+            numpy.ones(len(lons), dtype=int),
+            numpy.asarray(magnitudes, dtype=float))
+
+        self.levels = [level]
+        for _ in range(levels - 1):
+            level = aggregate(level.cell_size * 2, level.ix // 2,
+                              level.iy // 2, level.count,
+                              level.max_magnitude)
+            self.levels.insert(0, level)
+
+    def level_for(self, width, cells_across):
+        """
+        :returns:
+            the index of the coarsest level showing at least
+            `cells_across` cells in a map `width` degrees wide
+        """
+        if width <= 0:
+            return len(self.levels) - 1
+        level = int(math.ceil(math.log(
+            self.levels[0].cell_size * cells_across / width, 2)))
+        return min(max(level, 0), len(self.levels) - 1)
+
+    def count_within(self, xmin, ymin, xmax, ymax):
+        """
+        :returns:
+            the number of events in the cells of the finest level
+            intersecting the given longitude/latitude rectangle (an
+            upper bound of the number of events in the rectangle)
+        """
+        finest = self.levels[-1]
+        return int(finest.count[finest.within(xmin, ymin, xmax, ymax)].sum())
+
+
+def aggregate(cell_size, ix, iy, count, max_magnitude):
+    """
+    :returns:
+        a :class:`Level` where the entries with the same (`ix`, `iy`)
+        are merged, by summing their `count` and taking their maximum
+        `max_magnitude`
+    """
+    if not len(ix):
+        return Level(cell_size, ix, iy, count, max_magnitude)
+    order = numpy.lexsort((iy, ix))
+    ix, iy = ix[order], iy[order]
+    starts = numpy.flatnonzero(numpy.concatenate(
+        [[True], (ix[1:] != ix[:-1]) | (iy[1:] != iy[:-1])]))
+    return Level(cell_size, ix[starts], iy[starts],
+                 numpy.add.reduceat(count[order], starts),
+                 numpy.fmax.reduceat(max_magnitude[order], starts))
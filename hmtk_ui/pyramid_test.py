@@ -0,0 +1,85 @@
+import unittest
+
+import numpy
+
+from pyramid import Pyramid, aggregate
+
+
+def loop_aggregate(ix, iy, count, max_magnitude):
+    """
+    The aggregates computed one entry at a time, keyed by cell
+    """
+    cells = {}
+    for x, y, n, magnitude in zip(ix, iy, count, max_magnitude):
+        old_n, old_magnitude = cells.get((x, y), (0, numpy.nan))
+        cells[x, y] = (old_n + n, numpy.fmax(old_magnitude, magnitude))
+    return cells
+
+
+def level_cells(level):
+    return dict(
+        ((x, y), (n, magnitude)) for x, y, n, magnitude in zip(
+            level.ix, level.iy, level.count, level.max_magnitude))
+
+
+class AggregateTestCase(unittest.TestCase):
+    def check(self, ix, iy, count, max_magnitude):
+        level = aggregate(1., ix, iy, count, max_magnitude)
+        expected = loop_aggregate(ix, iy, count, max_magnitude)
+        actual = level_cells(level)
+        self.assertEqual(sorted(expected), sorted(actual))
+        for cell, (n, magnitude) in expected.items():
+            self.assertEqual(n, actual[cell][0])
+            numpy.testing.assert_equal(magnitude, actual[cell][1])
+
+    def test_random(self):
+        rng = numpy.random.RandomState(5)
+        magnitudes = rng.uniform(3, 8, 2000)
+        magnitudes[::13] = numpy.nan
+        self.check(rng.randint(0, 20, 2000), rng.randint(0, 10, 2000),
+                   rng.randint(1, 4, 2000), magnitudes)
+
+    def test_single_cell(self):
+        self.check(numpy.array([3, 3]), numpy.array([4, 4]),
+                   numpy.array([1, 2]), numpy.array([numpy.nan, 5.]))
+
+    def test_empty(self):
+        empty = numpy.zeros(0, dtype=int)
+        level = aggregate(1., empty, empty, empty, numpy.zeros(0))
+        self.assertEqual(0, len(level))
+
+
+class PyramidTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = numpy.random.RandomState(2)
+        self.lons = rng.uniform(-180, 180, 3000)
+        self.lats = rng.uniform(-90, 90, 3000)
+        self.magnitudes = rng.uniform(3, 8, 3000)
+        self.pyramid = Pyramid(self.lons, self.lats, self.magnitudes,
+                               base_cell_size=8., levels=4)
+
+    def test_levels(self):
+        self.assertEqual([8., 4., 2., 1.],
+                         [level.cell_size for level in self.pyramid.levels])
+        for level in self.pyramid.levels:
+            # each level is the aggregation of the events in its cells
+            ix = numpy.floor((self.lons + 180.) / level.cell_size)
+            iy = numpy.floor((self.lats + 90.) / level.cell_size)
+            expected = loop_aggregate(
+                ix.astype(int), iy.astype(int),
+                numpy.ones(len(ix), dtype=int), self.magnitudes)
+            self.assertEqual(expected, level_cells(level))
+
+    def test_count_within(self):
+        self.assertEqual(3000, self.pyramid.count_within(-180, -90, 180, 90))
+        inside = ((self.lons >= 10) & (self.lons <= 20) &
+                  (self.lats >= -5) & (self.lats <= 5)).sum()
+        # an upper bound, counting whole cells
+        self.assertGreaterEqual(
+            self.pyramid.count_within(10, -5, 20, 5), inside)
+
+    def test_level_for(self):
+        self.assertEqual(0, self.pyramid.level_for(360, 10))
+        self.assertEqual(3, self.pyramid.level_for(10, 10))
+        self.assertEqual(1, self.pyramid.level_for(40, 10))
+        self.assertEqual(3, self.pyramid.level_for(0, 10))
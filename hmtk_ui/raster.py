@@ -0,0 +1,155 @@
+"""
+Qt-free helpers to write the smoothed seismicity as a raster
+"""
+import os
+import itertools
+
+import numpy
+
+from osgeo import gdal, osr
+
+
+# value of the raster cells without data
+NODATA = 0
+
+# number of decimals the cell coordinates are rounded to (to recognize
+# the grid lines despite floating point noise)
+COORDINATE_DECIMALS = 6
+
+# creation options of the GeoTIFFs written for export: tiled and DEFLATE
+# compressed (PREDICTOR=3 is the floating point predictor)
+GEOTIFF_OPTIONS = ['TILED=YES', 'BLOCKXSIZE=256', 'BLOCKYSIZE=256',
+                   'COMPRESS=DEFLATE', 'PREDICTOR=3']
+
+# overviews are built until they get smaller than this size (in cells)
+OVERVIEW_MIN_SIZE = 256
+
+# used to name the rasters written in the GDAL in-memory filesystem
+_memory_files = itertools.count()
+
+
+def grid(matrix):
+    """
+    Put the observed rates of the smoothed seismicity `matrix` (rows of
+    longitude, latitude, depth, observed and smoothed rates) into a
+    regular grid. Cell centers are given by the coordinates of the
+    rows; the grid may be sparse (missing cells are set to NODATA) and
+    the rates of the rows falling in the same cell are summed.
+
+    :returns:
+        a (rows, columns) float32 array, north up, and the GDAL
+        geotransform of the grid
+    """
+    matrix = numpy.asarray(matrix, dtype=float)
+    lons = numpy.round(matrix[:, 0], COORDINATE_DECIMALS)
+    lats = numpy.round(matrix[:, 1], COORDINATE_DECIMALS)
+
+    dx = grid_spacing(lons)
+    dy = grid_spacing(lats)
+    min_lon, max_lat = lons.min(), lats.max()
+    cols = numpy.round((lons - min_lon) / dx).astype(int)
+    rows = numpy.round((max_lat - lats) / dy).astype(int)
+    ncols, nrows = cols.max() + 1, rows.max() + 1
+
+    values = numpy.bincount(
+        rows * ncols + cols, weights=matrix[:, 3],
+        minlength=nrows * ncols).reshape((nrows, ncols))
+    return (values.astype(numpy.float32),
+            (float(min_lon - dx / 2), dx, 0, float(max_lat + dy / 2), 0, -dy))
+
+
+def grid_spacing(coordinates):
+    """
+    :returns:
+        the smallest distance between the distinct `coordinates` (1 if
+        they are all the same)
+    """
+    distances = numpy.diff(numpy.unique(coordinates))
+    if not len(distances):
+        return 1.
+    return float(distances.min())
+
+
+def value_range(values):
+    """
+    :returns: the minimum and the maximum of the cells holding data
+    """
+    values = values[values != NODATA]
+    if not values.size:
+        return NODATA, NODATA
+    return float(values.min()), float(values.max())
+
+
+def overview_levels(shape, min_size=OVERVIEW_MIN_SIZE):
+    """
+    :returns:
+        the decimation factors of the overviews of a raster with the
+        given `shape`
+    """
+    levels = []
+    factor = 2
+    while max(shape) // factor >= min_size:
+        levels.append(factor)
+        factor *= 2
+    return levels
+
+
+def write_raster(values, geotransform, filename, options=(),
+                 overviews=False):
+    """
+    Write the gridded `values` (see :func:`grid`) into the GeoTIFF
+    `filename`
+
+    :param list options: the GeoTIFF creation options
+    :param bool overviews:
+        True to build internal overviews (averaging the cells), which
+        are read instead of the full raster at low zoom levels
+    """
+    nrows, ncols = values.shape
+    dataset = gdal.GetDriverByName("GTiff").Create(
+        filename, ncols, nrows, 1, gdal.GDT_Float32, list(options))
+    dataset.SetGeoTransform(geotransform)
+
+    out_srs = osr.SpatialReference()
+    out_srs.ImportFromEPSG(4326)
+    dataset.SetProjection(out_srs.ExportToWkt())
+
+    out_band = dataset.GetRasterBand(1)
+    out_band.WriteArray(values)
+    out_band.SetNoDataValue(NODATA)
+    out_band.FlushCache()
+    out_band = None
+
+    levels = overview_levels(values.shape)
+    if overviews and levels:
+        dataset.BuildOverviews('AVERAGE', levels)
+    dataset = None
+
+
+def write_geotiff(matrix, filename):
+    """
+    Write the smoothed seismicity `matrix` (rows of longitude,
+    latitude, depth, observed and smoothed rates) into the GeoTIFF
+    `filename`, as a tiled and compressed raster of the observed rates
+    with overviews
+    """
+    values, geotransform = grid(matrix)
+    write_raster(values, geotransform, filename, GEOTIFF_OPTIONS, True)
+
+
+def memory_filename():
+    """
+    :returns: a new file name in the GDAL in-memory filesystem
+    """
+    return '/vsimem/hmtk-smoothed-%d.tif' % next(_memory_files)
+
+
+def remove(filename):
+    """
+    Remove the raster `filename` (possibly in the GDAL in-memory
+    filesystem)
+    """
+    if filename.startswith('/vsimem/'):
+        gdal.Unlink(filename)
+    elif os.path.exists(filename):
+        os.remove(filename)
@@ -0,0 +1,94 @@
+import unittest
+
+import numpy
+
+try:
+    import osgeo
+except ImportError:
+    raise unittest.SkipTest("GDAL is not available")
+
+from raster import NODATA, grid, grid_spacing, value_range, overview_levels
+
+
+def make_matrix(lons, lats, rng):
+    """
+    :returns:
+        the smoothed seismicity rows of a complete grid with the given
+        coordinates, in random order
+    """
+    lons, lats = numpy.meshgrid(lons, lats)
+    rows = len(lons.flat)
+    matrix = numpy.column_stack([
+        lons.flat, lats.flat, numpy.zeros(rows),
+        rng.uniform(0.1, 1, rows), rng.uniform(0.1, 1, rows)])
+    return matrix[rng.permutation(rows)]
+
+
+def sorted_grid(matrix):
+    """
+    The values of a complete grid gridded as before raster.grid: the
+    rows are sorted by latitude and longitude and reshaped (south up)
+    """
+    rows = numpy.array(sorted(
+        matrix, key=lambda row: (90 + row[1]) * 180 + (180 + row[0])))
+    lons, lats = rows[:, 0], rows[:, 1]
+    nrows = lons[lons == lons[0]].size
+    ncols = lats[lats == lats[0]].size
+    return rows[:, 3].reshape((nrows, ncols))
+
+
+class GridTestCase(unittest.TestCase):
+    def setUp(self):
+        self.rng = numpy.random.RandomState(11)
+
+    def test_complete_grid(self):
+        matrix = make_matrix(numpy.arange(10., 12.01, 0.1),
+                             numpy.arange(-3., -1.99, 0.2), self.rng)
+        values, geotransform = grid(matrix)
+        self.assertEqual((6, 21), values.shape)
+        numpy.testing.assert_array_equal(
+            numpy.flipud(sorted_grid(matrix)).astype(numpy.float32), values)
+        # the cell centers are on the input coordinates
+        numpy.testing.assert_allclose(
+            (9.95, 0.1, 0, -1.9, 0, -0.2), geotransform)
+
+    def test_sparse_grid(self):
+        matrix = make_matrix([1., 2., 3., 4.], [5., 6., 7.], self.rng)
+        kept = numpy.ones(len(matrix), dtype=bool)
+        kept[[1, 5, 6]] = False
+        values, geotransform = grid(matrix[kept])
+
+        self.assertEqual((3, 4), values.shape)
+        expected = numpy.full((3, 4), NODATA, dtype=numpy.float32)
+        # row by row, north up
+        for lon, lat, _, rate, _ in matrix[kept]:
+            expected[int(7 - lat), int(lon - 1)] = rate
+        numpy.testing.assert_array_equal(expected, values)
+        self.assertEqual(3, (values == NODATA).sum())
+
+    def test_same_cell(self):
+        # rows in the same cell (despite floating point noise) are summed
+        values, _ = grid([[0., 0., 0., 1., 0.], [1e-9, 0., 0., 2., 0.],
+                          [1., 0., 0., 4., 0.]])
+        numpy.testing.assert_array_equal([[3., 4.]], values)
+
+    def test_single_row(self):
+        values, geotransform = grid([[5., 6., 0., 2., 0.]])
+        numpy.testing.assert_array_equal([[2.]], values)
+        self.assertEqual((4.5, 1., 0, 6.5, 0, -1.), geotransform)
+
+
+class HelpersTestCase(unittest.TestCase):
+    def test_grid_spacing(self):
+        self.assertAlmostEqual(0.5, grid_spacing([1., 2., 1.5, 1., 3.]))
+        self.assertEqual(1., grid_spacing([4., 4.]))
+
+    def test_value_range(self):
+        self.assertEqual((1., 3.), value_range(
+            numpy.array([[NODATA, 3.], [1., 2.]])))
+        self.assertEqual((NODATA, NODATA), value_range(
+            numpy.array([NODATA, NODATA])))
+
+    def test_overview_levels(self):
+        self.assertEqual([], overview_levels((100, 255)))
+        self.assertEqual([2, 4], overview_levels((1024, 300)))
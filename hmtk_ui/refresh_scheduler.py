@@ -0,0 +1,80 @@
+import sip
+
+from PyQt4.QtCore import QTimer
+
+
+class RefreshScheduler(object):
+    """
+    Coalesce the refreshes of a map canvas. The invalidations requested
+    while an action is handled (e.g. the layer updates following a
+    declustering) are collected and performed when control returns to
+    the event loop, with at most one update of the layer set and one
+    render of the canvas.
+
+    :attr canvas: a :class:`qgis.gui.QgsMapCanvas` instance
+    :attr layer_set:
+        a callable returning the list of QgsMapCanvasLayer to be shown
+    :attr int renders:
+        the number of renders performed so far (e.g. for tests to check
+        the renders caused by an action)
+    :attr int layer_set_updates:
+        the number of updates of the layer set performed so far
+    """
+    def __init__(self, canvas, layer_set):
+        self.canvas = canvas
+        self.layer_set = layer_set
+        self.renders = 0
+        self.layer_set_updates = 0
+        self._scheduled = False
+        self._layers_changed = False
+        self._repaint = []
+
+    def invalidate_layers(self):
+        """
+        Schedule an update of the layer set, and a render
+        """
+        self._layers_changed = True
+        self._schedule()
+
+    def repaint(self, *layers):
+        """
+        Schedule a render where `layers` are drawn again (their cached
+        images are dropped)
+        """
+        for layer in layers:
+            if not any(layer is other for other in self._repaint):
+                self._repaint.append(layer)
+        self._schedule()
+
+    def _schedule(self):
+        if not self._scheduled:
+            self._scheduled = True
+            QTimer.singleShot(0, self.flush)
+
+    def flush(self):
+        """
+        Perform the pending refresh now (e.g. when the layer set is
+        needed before returning to the event loop). Nothing is done if
+        no refresh is pending
+        """
+        if not self._scheduled:
+            return
+        self._scheduled = False
+        layers, self._repaint = self._repaint, []
+
+        # setting the layer set and triggering a repaint would both
+        # render a canvas which is not frozen
+        self.canvas.freeze(True)
+        try:
+            if self._layers_changed:
+                self._layers_changed = False
+                self.canvas.setLayerSet(self.layer_set())
+                self.layer_set_updates += 1
+            for layer in layers:
+                # the layer may have been removed in the meantime
+                if not sip.isdeleted(layer):
+                    layer.triggerRepaint()
+        finally:
+            self.canvas.freeze(False)
+        self.canvas.refresh()
+        self.renders += 1
@@ -0,0 +1,110 @@
+import unittest
+
+try:
+    from PyQt4 import QtCore
+except ImportError:
+    raise unittest.SkipTest("PyQt4 is not available")
+
+from refresh_scheduler import RefreshScheduler
+
+APP = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+class StubCanvas(object):
+    """
+    Count the renders and the layer set updates of a map canvas. As a
+    QgsMapCanvas, it renders when its layer set changes and on #refresh,
+    unless it is frozen
+    """
+    def __init__(self):
+        self.frozen = False
+        self.renders = 0
+        self.layer_sets = []
+
+    def freeze(self, frozen=True):
+        self.frozen = frozen
+
+    def setLayerSet(self, layers):
+        self.layer_sets.append(layers)
+        self.refresh()
+
+    def refresh(self):
+        if not self.frozen:
+            self.renders += 1
+
+
+class StubLayer(QtCore.QObject):
+    """
+    A layer whose repaint renders the canvas, as a QgsMapLayer does
+    """
+    def __init__(self, canvas):
+        QtCore.QObject.__init__(self)
+        self.canvas = canvas
+        self.repaints = 0
+
+    def triggerRepaint(self):
+        self.repaints += 1
+        self.canvas.refresh()
+
+
+class RefreshSchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.canvas = StubCanvas()
+        self.layers = [StubLayer(self.canvas), StubLayer(self.canvas)]
+        self.scheduler = RefreshScheduler(self.canvas, lambda: self.layers)
+
+    def test_nothing_before_the_event_loop(self):
+        self.scheduler.invalidate_layers()
+        self.scheduler.repaint(*self.layers)
+        self.assertEqual(0, self.canvas.renders)
+        self.assertEqual(0, self.scheduler.renders)
+
+    def test_decluster(self):
+        # the catalogue layer gets new attributes and a new renderer
+        catalogue_layer = self.layers[0]
+        self.scheduler.repaint(catalogue_layer)
+        self.scheduler.repaint(catalogue_layer)
+
+        APP.processEvents()
+        self.assertEqual(1, self.scheduler.renders)
+        self.assertEqual(1, self.canvas.renders)
+        self.assertEqual(1, catalogue_layer.repaints)
+        self.assertEqual(0, self.scheduler.layer_set_updates)
+
+    def test_layer_set_and_repaints(self):
+        # e.g. the aggregates replacing the events after a purge
+        self.scheduler.invalidate_layers()
+        self.scheduler.repaint(*self.layers)
+        self.scheduler.invalidate_layers()
+        self.scheduler.repaint(self.layers[1])
+
+        APP.processEvents()
+        self.assertEqual(1, self.scheduler.renders)
+        self.assertEqual(1, self.scheduler.layer_set_updates)
+        self.assertEqual(1, self.canvas.renders)
+        self.assertEqual([self.layers], self.canvas.layer_sets)
+        self.assertEqual([1, 1], [layer.repaints for layer in self.layers])
+
+    def test_one_render_per_iteration(self):
+        self.scheduler.repaint(self.layers[0])
+        APP.processEvents()
+        self.scheduler.repaint(self.layers[0])
+        APP.processEvents()
+        self.assertEqual(2, self.scheduler.renders)
+        self.assertEqual(2, self.canvas.renders)
+
+    def test_flush(self):
+        self.scheduler.invalidate_layers()
+        self.scheduler.flush()
+        self.assertEqual(1, self.canvas.renders)
+
+        # nothing is left to do at the end of the event loop iteration
+        APP.processEvents()
+        self.assertEqual(1, self.scheduler.renders)
+        self.assertEqual(1, self.canvas.renders)
+
+    def test_nothing_to_do(self):
+        APP.processEvents()
+        self.scheduler.flush()
+        self.assertEqual(0, self.scheduler.renders)
+        self.assertEqual(0, self.canvas.renders)
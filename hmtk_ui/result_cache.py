@@ -0,0 +1,170 @@
+import os
+import hashlib
+import tempfile
+import cPickle
+import collections
+
+import numpy
+
+from catalogue_cache import CACHE_DIR
+
+
+# Directory where algorithm results are stored. Set it to an empty
+# string to disable the cache.
+RESULT_CACHE_DIR = os.environ.get(
+    'HMTK_RESULT_CACHE_DIR',
+    os.path.join(CACHE_DIR, 'results') if CACHE_DIR else '')
+
+# Maximum size (in bytes) of the stored results. The least recently
+# used ones are removed when it is exceeded.
+RESULT_CACHE_SIZE = int(os.environ.get(
+    'HMTK_RESULT_CACHE_SIZE', 256 * 1024 * 1024))
+
+
+class UncacheableError(TypeError):
+    """
+    Raised when a cache key cannot be computed (see :func:`canonical`)
+    """
+
+
+class ResultCache(object):
+    """
+    An on-disk cache of algorithm results. Each result is pickled in
+    a file named after its key (see :func:`make_key`). The modification
+    time of a file is updated every time the result is used, so that
+    the least recently used results are evicted first.
+
+    :attr str directory: the cache directory
+    :attr int max_size: the maximum size of the cache in bytes
+    """
+    SUFFIX = '.pkl'
+
+    def __init__(self, directory=RESULT_CACHE_DIR, max_size=RESULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def get(self, key):
+        """
+        :returns: the result stored under `key`
+        :raises KeyError: if the result is not in the cache
+        """
+        if not self.directory or key is None:
+            raise KeyError(key)
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as fobj:
+                result = cPickle.load(fobj)
+            os.utime(path, None)
+        except (IOError, OSError, EOFError, cPickle.UnpicklingError):
+            raise KeyError(key)
+        return result
+
+    def put(self, key, result, evict=True):
+        """
+        Store `result` under `key`, then (if `evict` is True) evict the
+        least recently used results exceeding the cache size
+        """
+        if not self.directory or key is None:
+            return
+        try:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            fd, tmp_name = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, 'wb') as fobj:
+                cPickle.dump(result, fobj, cPickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_name, self.path(key))
+            if evict:
+                self.evict()
+        except (IOError, OSError):
+            # the cache is an optimization, a failure is not fatal
+            pass
+
+    def evict(self):
+        """
+        Remove the least recently used results until the cache fits in
+        `max_size`
+        """
+        entries = []
+        for fname in os.listdir(self.directory):
+            if fname.endswith(self.SUFFIX):
+                path = os.path.join(self.directory, fname)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+def make_key(*parts):
+    """
+    :returns: the SHA1 of the canonical representation of `parts`
+    :raises UncacheableError: if `parts` hold unsupported types
+    """
+    return hashlib.sha1(repr(canonical(parts))).hexdigest()
+
+
+def canonical(value):
+    """
+    :returns:
+        a representation of `value` made of builtin types, which does
+        not depend on the ordering of dictionaries
+    :raises UncacheableError:
+        if `value` holds objects other than mappings, lists, tuples,
+        numpy arrays and scalars, whose representation could change
+        between runs (e.g. by including their address)
+    """
+    if isinstance(value, collections.Mapping):
+        return ('dict', sorted(
+            (canonical(k), canonical(v)) for k, v in value.items()))
+    elif isinstance(value, numpy.ndarray):
+        return ('array', value.dtype.str, value.shape, value.tolist())
+    elif isinstance(value, numpy.generic):
+        return value.item()
+    elif isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    elif isinstance(value, (basestring, int, long, float, bool,
+                            type(None))):
+        return value
+    raise UncacheableError(
+        "Cannot make a cache key out of %s" % type(value).__name__)
+
+
+def column_digest(column):
+    """
+    :returns: the SHA1 of the content of a catalogue column
+    """
+    sha1 = hashlib.sha1()
+    if isinstance(column, numpy.ndarray):
+        sha1.update(column.dtype.str + repr(column.shape))
+        sha1.update(numpy.ascontiguousarray(column).data)
+    else:
+        sha1.update('\0'.join(str(value) for value in column))
+    return sha1.hexdigest()
+
+
+def algorithm_identity(algorithm):
+    """
+    :returns:
+        a tuple identifying an algorithm of the hmtk registries (the
+        module and the name of the function and, for the algorithms
+        implemented by a class, the class name)
+    """
+    identity = (getattr(algorithm, '__module__', None),
+                getattr(algorithm, '__name__', repr(algorithm)))
+    model = getattr(algorithm, 'model', None)
+    if model is not None:
+        identity += (type(model).__name__,)
+    return identity
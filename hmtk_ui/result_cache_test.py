@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+import numpy
+
+try:
+    import hmtk
+except ImportError:
+    raise unittest.SkipTest("hmtk is not available")
+
+from result_cache import ResultCache, UncacheableError, make_key
+
+CONFIG = {'time_distance_window': 'GardnerKnopoffWindow',
+          'fs_time_prop': 0.9, 'magnitude_bin': [0.1, 0.2],
+          'completeness': numpy.array([[1990., 4.]]),
+          'reference_magnitude': numpy.float64(3.),
+          'weights': {'a': 1, 'b': (2, 'c'), 'd': None}}
+
+KEY_SCRIPT = '''
+import numpy
+from result_cache import make_key
+config = %r
+config['completeness'] = numpy.array([[1990., 4.]])
+config['reference_magnitude'] = numpy.float64(3.)
+print make_key('declustering', config)
+''' % dict((k, v) for k, v in CONFIG.items()
+           if k not in ('completeness', 'reference_magnitude'))
+
+
+class MakeKeyTestCase(unittest.TestCase):
+    def test_equal_configs(self):
+        reordered = dict(reversed(CONFIG.items()))
+        reordered['weights'] = {'d': None, 'b': (2, 'c'), 'a': 1}
+        self.assertEqual(make_key('declustering', CONFIG),
+                         make_key('declustering', reordered))
+
+    def test_different_configs(self):
+        config = dict(CONFIG, fs_time_prop=0.8)
+        self.assertNotEqual(make_key('declustering', CONFIG),
+                            make_key('declustering', config))
+        config = dict(CONFIG, completeness=numpy.array([[1990, 4]]))
+        self.assertNotEqual(make_key('declustering', CONFIG),
+                            make_key('declustering', config))
+
+    def test_stable_across_processes(self):
+        # string hashes (and thus dictionary orderings) are randomized
+        # by the -R option
+        directory = os.path.dirname(os.path.abspath(__file__))
+        keys = set(
+            subprocess.check_output(
+                [sys.executable, '-R', '-c', KEY_SCRIPT],
+                cwd=directory).strip()
+            for _ in range(3))
+        self.assertEqual(set([make_key('declustering', CONFIG)]), keys)
+
+    def test_uncacheable(self):
+        self.assertRaises(UncacheableError, make_key, {'f': object()})
+        self.assertRaises(UncacheableError, make_key, [lambda x: x])
+        self.assertRaises(UncacheableError, make_key, set([1]))
+        # it is a TypeError, for the callers not aware of the cache
+        self.assertRaises(TypeError, make_key, object())
+
+
+class ResultCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_put(self):
+        cache = ResultCache(self.directory)
+        self.assertRaises(KeyError, cache.get, 'a')
+        cache.put('a', {'b': numpy.arange(3)})
+        numpy.testing.assert_array_equal(
+            numpy.arange(3), cache.get('a')['b'])
+
+    def test_disabled(self):
+        cache = ResultCache('')
+        cache.put('a', 1)
+        self.assertRaises(KeyError, cache.get, 'a')
+
+    def test_lru_eviction(self):
+        result = numpy.zeros(1000)
+        cache = ResultCache(self.directory)
+        cache.put('a', result)
+        size = os.path.getsize(cache.path('a'))
+        cache.max_size = 2 * size
+
+        cache.put('b', result)
+        # a is stored before b (mtimes are set explicitly, as their
+        # resolution may be coarse) and then used again, so that b is
+        # the least recently used result
+        past = time.time() - 10
+        os.utime(cache.path('a'), (past - 10, past - 10))
+        os.utime(cache.path('b'), (past, past))
+        cache.get('a')
+        cache.put('c', result)
+
+        self.assertRaises(KeyError, cache.get, 'b')
+        cache.get('a')
+        cache.get('c')
@@ -10,11 +10,12 @@ from PyQt4 import QtCore
 
 from qgis.core import (
     QGis, QgsGeometry, QgsCoordinateTransform, QgsCoordinateReferenceSystem,
-    QgsRectangle, QgsFeatureRequest, QgsPoint)
+    QgsPoint)
 from qgis.gui import QgsMapTool, QgsRubberBand, QgsMapToolEmitPoint
 
 from extended_dates_widget import ExtendedDatesWidget
 from utils import alert
+from jobs import Job
 
 
 class AbortSelection(Exception):
@@ -127,18 +128,14 @@ class SourceTool(QgsMapToolEmitPoint, SelectionTool):
         return self.catalogue_map.source_layers['SimpleFaultSource']
 
     def search_source_at(self, point):
-        rectangle = QgsRectangle()
-        # 5% of the map width
-        radius = self.map_widget.extent().width() / 100 * 5
-        rectangle.setXMinimum(point.x() - radius)
-        rectangle.setYMinimum(point.y() - radius)
-        rectangle.setXMaximum(point.x() + radius)
-        rectangle.setYMaximum(point.y() + radius)
-
-        return self.layer.getFeatures(
-            QgsFeatureRequest().setFilterRect(
-                self.map_widget.mapRenderer().mapToLayerCoordinates(
-                    self.layer, rectangle)))
+        """
+        :returns:
+            the surface of the simple fault source nearest to `point`,
+            or None
+        """
+        source_id = self.catalogue_map.nearest_source(point)
+        if source_id is not None:
+            return self.catalogue_map.sources[source_id]
 
     def canvasPressEvent(self, e):
         """
@@ -146,14 +143,10 @@ class SourceTool(QgsMapToolEmitPoint, SelectionTool):
         Right click -> Abort
         """
         if e.button() == QtCore.Qt.LeftButton:
-            features = self.search_source_at(self.toMapCoordinates(e.pos()))
-
-            try:
-                feat = features.next()
-                self.source = self.catalogue_map.sources[feat['source_id']]
-            except StopIteration:
+            self.source = self.search_source_at(
+                self.toMapCoordinates(e.pos()))
+            if self.source is None:
                 alert("Please select a Simple Fault Source")
-                self.source = None
         else:
             self.source = None
 
@@ -164,6 +157,14 @@ class SourceTool(QgsMapToolEmitPoint, SelectionTool):
             "Left Click selects a source on the map. Right click aborts")
         self.map_widget.setMapTool(self)
 
+        # a surface is about to be used: build all of them in parallel
+        # while the user picks the source
+        surfaces = self.catalogue_map.sources
+        if not surfaces.is_built():
+            job = Job("Building the fault surfaces", surfaces.build)
+            job.args = (None, lambda: job.cancelled)
+            self.selector.window.jobs.submit(job)
+
     def deactivate(self):
         if self.source is None:
             return
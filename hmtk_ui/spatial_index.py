@@ -0,0 +1,133 @@
+import numpy
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    # the points are then scanned linearly (see LinearScan)
+    cKDTree = None
+
+
+# mean earth radius in km
+EARTH_RADIUS = 6371.0
+
+
+class SpatialIndex(object):
+    """
+    A KD-tree over points on the earth surface, giving the points
+    nearest to a location in O(log N). Points are indexed by their
+    cartesian coordinates on the unit sphere, so that distances are not
+    distorted by the map projection (nor broken at the antimeridian).
+
+    :attr int size: the number of points
+    :attr tree: a :class:`scipy.spatial.cKDTree` (a :class:`LinearScan`
+        if scipy is not available, None if there are no points)
+    :attr version:
+        the version of the coordinates the index has been built from
+    """
+    def __init__(self, lons, lats, version=None):
+        self.version = version
+        xyz = to_xyz(lons, lats)
+        self.size = len(xyz)
+        if self.size:
+            self.tree = (cKDTree or LinearScan)(xyz)
+        else:
+            self.tree = None
+
+    def nearest(self, lon, lat, k=1, max_distance=None):
+        """
+        :param int k: the maximum number of points to be returned
+        :param float max_distance:
+            the maximum distance (in km) of the points to be returned
+        :returns:
+            two arrays with the distances (in km) and the indices of the
+            points nearest to (`lon`, `lat`), sorted by distance
+        """
+        if self.tree is None:
+            return numpy.zeros(0), numpy.zeros(0, dtype=int)
+
+        upper_bound = numpy.inf
+        if max_distance is not None:
+            upper_bound = chord(max_distance)
+        chords, indices = self.tree.query(
+            to_xyz([lon], [lat])[0], k=min(k, self.size),
+            distance_upper_bound=upper_bound)
+
+        chords = numpy.atleast_1d(chords)
+        indices = numpy.atleast_1d(indices)
+        found = numpy.isfinite(chords)
+        distances = 2 * EARTH_RADIUS * numpy.arcsin(
+            numpy.minimum(chords[found] / 2, 1))
+        return distances, indices[found]
+
+
+class LinearScan(object):
+    """
+    The part of the :class:`scipy.spatial.cKDTree` interface used by
+    :class:`SpatialIndex`, computing the distances to all the points
+    (in O(N), used when scipy is not available)
+
+    :attr xyz: a (N, 3) array of points
+    """
+    def __init__(self, xyz):
+        self.xyz = xyz
+
+    def query(self, point, k=1, distance_upper_bound=numpy.inf):
+        """
+        :returns:
+            the distances to the `k` points nearest to `point` and their
+            indices. Distances not below `distance_upper_bound` are
+            infinite
+        """
+        distances = numpy.sqrt(((self.xyz - point) ** 2).sum(axis=1))
+        indices = numpy.argsort(distances, kind='mergesort')[:k]
+        distances = distances[indices]
+        distances[distances >= distance_upper_bound] = numpy.inf
+        return distances, indices
+
+
+def to_xyz(lons, lats):
+    """
+    :returns:
+        a (N, 3) array with the cartesian coordinates on the unit sphere
+        of the points at `lons`, `lats` (in degrees)
+    """
+    lons = numpy.radians(numpy.asarray(lons, dtype=float))
+    lats = numpy.radians(numpy.asarray(lats, dtype=float))
+    cos_lats = numpy.cos(lats)
+    return numpy.column_stack(
+        [cos_lats * numpy.cos(lons), cos_lats * numpy.sin(lons),
+         numpy.sin(lats)])
+
+
+def chord(distance):
+    """
+    :returns:
+        the length of the chord of the unit sphere subtending the great
+        circle `distance` (in km)
+    """
+    angle = min(float(distance) / EARTH_RADIUS, numpy.pi)
+    return 2 * numpy.sin(angle / 2)
+
+
+def densify(lons, lats, spacing):
+    """
+    :returns:
+        the longitudes and latitudes of the polyline `lons`, `lats`
+        with points added so that consecutive points are at most
+        `spacing` degrees apart
+    """
+    lons = numpy.asarray(lons, dtype=float)
+    lats = numpy.asarray(lats, dtype=float)
+    if len(lons) < 2:
+        return lons, lats
+    dlons, dlats = numpy.diff(lons), numpy.diff(lats)
+    steps = numpy.maximum(numpy.ceil(
+        numpy.hypot(dlons, dlats) / spacing).astype(int), 1)
+    segments = numpy.repeat(numpy.arange(len(steps)), steps)
+    fractions = (numpy.arange(len(segments)) -
+                 numpy.repeat(numpy.cumsum(steps) - steps, steps)
+                 ) / numpy.repeat(steps, steps).astype(float)
+    return (numpy.append(lons[segments] + fractions * dlons[segments],
+                         lons[-1]),
+            numpy.append(lats[segments] + fractions * dlats[segments],
+                         lats[-1]))
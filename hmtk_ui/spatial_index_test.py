@@ -0,0 +1,93 @@
+import unittest
+
+import numpy
+
+from spatial_index import (
+    SpatialIndex, LinearScan, EARTH_RADIUS, to_xyz, chord, densify)
+
+# one degree of a great circle, in km
+DEGREE = numpy.pi * EARTH_RADIUS / 180
+
+
+def great_circle_distance(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = numpy.radians([lon1, lat1, lon2, lat2])
+    return EARTH_RADIUS * numpy.arccos(numpy.clip(
+        numpy.sin(lat1) * numpy.sin(lat2) +
+        numpy.cos(lat1) * numpy.cos(lat2) * numpy.cos(lon1 - lon2), -1, 1))
+
+
+class ChordTestCase(unittest.TestCase):
+    def test_chord(self):
+        self.assertEqual(0, chord(0))
+        self.assertAlmostEqual(numpy.sqrt(2), chord(90 * DEGREE))
+        self.assertAlmostEqual(2, chord(180 * DEGREE))
+        # distances beyond the antipode are capped
+        self.assertAlmostEqual(2, chord(1e6))
+
+    def test_chord_of_points(self):
+        xyz = to_xyz([10, 50], [-20, 30])
+        self.assertAlmostEqual(
+            numpy.linalg.norm(xyz[0] - xyz[1]),
+            chord(great_circle_distance(10, -20, 50, 30)))
+
+
+class DensifyTestCase(unittest.TestCase):
+    def test_densify(self):
+        lons, lats = densify([0, 1, 1, 3.5], [0, 0, 0.2, 0.2], 0.5)
+        steps = numpy.hypot(numpy.diff(lons), numpy.diff(lats))
+        self.assertTrue((steps <= 0.5 + 1e-12).all())
+        # the vertices are kept, including the last one
+        for lon, lat in [(0, 0), (1, 0), (1, 0.2), (3.5, 0.2)]:
+            self.assertTrue(numpy.any((lons == lon) & (lats == lat)))
+        self.assertEqual((3.5, 0.2), (lons[-1], lats[-1]))
+        self.assertEqual(2 + 1 + 5 + 1, len(lons))
+
+    def test_no_segment(self):
+        lons, lats = densify([5.], [6.], 0.1)
+        numpy.testing.assert_array_equal([5.], lons)
+        numpy.testing.assert_array_equal([6.], lats)
+
+    def test_repeated_vertex(self):
+        lons, lats = densify([0, 0, 1], [0, 0, 0], 0.5)
+        numpy.testing.assert_array_equal([0, 0, 0.5, 1], lons)
+
+
+class SpatialIndexTestCase(unittest.TestCase):
+    LONS = [179.9, -179.8, 0., 90., -179.95]
+    LATS = [10., 10., 10., 10., -60.]
+
+    def make_index(self, linear=False):
+        index = SpatialIndex(self.LONS, self.LATS)
+        if linear:
+            index.tree = LinearScan(to_xyz(self.LONS, self.LATS))
+        return index
+
+    def check_nearest(self, linear):
+        index = self.make_index(linear)
+        # across the antimeridian
+        distances, indices = index.nearest(-179.99, 10., k=2)
+        self.assertEqual([0, 1], indices.tolist())
+        numpy.testing.assert_allclose(
+            [great_circle_distance(-179.99, 10., lon, 10.)
+             for lon in [179.9, -179.8]], distances, rtol=1e-6)
+
+        distances, indices = index.nearest(179.99, -60., k=1)
+        self.assertEqual([4], indices.tolist())
+        self.assertLess(distances[0], 5)
+
+        # the points farther than max_distance are left out
+        _, indices = index.nearest(-179.99, 10., k=5, max_distance=30)
+        self.assertEqual([0, 1], indices.tolist())
+        _, indices = index.nearest(45., 10., max_distance=100)
+        self.assertEqual([], indices.tolist())
+
+    def test_nearest(self):
+        self.check_nearest(linear=False)
+
+    def test_linear_scan(self):
+        self.check_nearest(linear=True)
+
+    def test_empty(self):
+        distances, indices = SpatialIndex([], []).nearest(0, 0, k=3)
+        self.assertEqual(0, len(distances))
+        self.assertEqual(0, len(indices))
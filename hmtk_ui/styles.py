@@ -1,3 +1,5 @@
+import math
+import bisect
 import collections
 from PyQt4 import QtGui
 
@@ -12,6 +14,7 @@ class CatalogueDepthMagnitudeRenderer(QgsGraduatedSymbolRendererV2):
     """
     Render events depending on their depth/magnitude
     """
+    COLUMNS = ('depth', 'magnitude')
 
     @classmethod
     def make(cls, catalogue_map):
@@ -28,7 +31,6 @@ class CatalogueDepthMagnitudeRenderer(QgsGraduatedSymbolRendererV2):
 
         renderer.setSizeScaleField("_magnitude")
         renderer.setScaleMethod(QgsSymbolV2.ScaleDiameter)
-        renderer.update_syms = lambda x: x
 
         return renderer
 
@@ -37,14 +39,12 @@ class CatalogueCompletenessRenderer(QgsFeatureRendererV2):
     """
     Render events depending on their completeness attributes
     """
+    COLUMNS = ('Completeness_Flag',)
 
     @classmethod
     def make(cls, _catalogue_map):
         return cls()
 
-    def update_syms(self, _catalogue):
-        pass
-
     def __init__(self):
         QgsFeatureRendererV2.__init__(self, "CatalogueCompletenessRenderer")
         complete = QgsSymbolV2.defaultSymbol(QGis.Point)
@@ -74,6 +74,8 @@ class CatalogueCompletenessRenderer(QgsFeatureRendererV2):
 
 
 class CatalogueDefaultRenderer(QgsFeatureRendererV2):
+    COLUMNS = ()
+
     @classmethod
     def make(cls, _catalogue_map):
         return cls()
@@ -85,9 +87,6 @@ class CatalogueDefaultRenderer(QgsFeatureRendererV2):
     def symbolForFeature(self, _feature):
         return self.sym
 
-    def update_syms(self, _catalogue):
-        pass
-
     def startRender(self, context, _vlayer):
         self.sym.startRender(context)
 
@@ -104,48 +103,62 @@ class CatalogueDefaultRenderer(QgsFeatureRendererV2):
 class CatalogueClusterRenderer(QgsFeatureRendererV2):
     """
     Render events depending on their cluster attributes
+
+    :attr dict syms:
+        the symbols keyed by the (index, flag) pairs of the catalogue
+        events (shared by the clones of the renderer)
     """
     Cluster = collections.namedtuple('Cluster', 'index flag')
+    COLUMNS = ('Cluster_Index', 'Cluster_Flag')
 
     @classmethod
     def make(cls, catalogue_map):
         return cls(catalogue_map.catalogue_model)
 
-    def __init__(self, catalogue_model):
+    def __init__(self, catalogue_model, syms=None):
         QgsFeatureRendererV2.__init__(self, "CatalogueClusterRenderer")
         self.catalogue_model = catalogue_model
-        self.syms = {}
-        self.update_syms(catalogue_model.catalogue)
+        if syms is None:
+            syms = self.make_syms(catalogue_model.catalogue)
+        self.syms = syms
 
     def symbolForFeature(self, feature):
         return self.syms[
             self.Cluster(feature["Cluster_Index"], feature["Cluster_Flag"])]
 
-    def update_syms(self, catalogue):
-        self.syms = {}
-
-        for flag in set(catalogue.data['Cluster_Flag'].tolist()):
-            for index in set(catalogue.data['Cluster_Index'].tolist()):
-
-                # main shock
-                point = QgsMarkerSymbolV2.createSimple(
-                    {'color': 'blue', 'name': 'square'})
-
-                if index:  # belongs to a cluster
-                    color = self.catalogue_model.cluster_color(index)
-
-                    # non poissonian
-                    if flag:
-                        point = QgsMarkerSymbolV2.createSimple(
-                            {'color': 'blue', 'name': 'triangle'})
-                    color.setAlpha(125 + 125 * abs(flag))
-                    point.setSize(3)
-                    point.setColor(color)
-                else:
-                    point = QgsSymbolV2.defaultSymbol(QGis.Point)
-                    point.setColor(QtGui.QColor("0,0,0,125"))
-                    point.setSize(1.5)
-                self.syms[self.Cluster(index, flag)] = point
+    def make_syms(self, catalogue):
+        """
+        :returns:
+            the symbols of the (index, flag) pairs occurring in
+            `catalogue`
+        """
+        syms = {}
+        palette = self.catalogue_model.cluster_palette
+
+        for index, flag in set(zip(
+                catalogue.data['Cluster_Index'].tolist(),
+                catalogue.data['Cluster_Flag'].tolist())):
+
+            # main shock
+            point = QgsMarkerSymbolV2.createSimple(
+                {'color': 'blue', 'name': 'square'})
+
+            if index:  # belongs to a cluster
+                color = QtGui.QColor(*palette.color(index))
+
+                # non poissonian
+                if flag:
+                    point = QgsMarkerSymbolV2.createSimple(
+                        {'color': 'blue', 'name': 'triangle'})
+                color.setAlpha(125 + 125 * abs(flag))
+                point.setSize(3)
+                point.setColor(color)
+            else:
+                point = QgsSymbolV2.defaultSymbol(QGis.Point)
+                point.setColor(QtGui.QColor("0,0,0,125"))
+                point.setSize(1.5)
+            syms[self.Cluster(index, flag)] = point
+        return syms
 
     def startRender(self, context, _vlayer):
         for s in self.syms.values():
@@ -159,4 +172,99 @@ class CatalogueClusterRenderer(QgsFeatureRendererV2):
         return ['Cluster_Index', 'Cluster_Flag']
 
     def clone(self):
-        return CatalogueClusterRenderer(self.catalogue_model)
+        return CatalogueClusterRenderer(self.catalogue_model, self.syms)
+
+
+# the renderers of the catalogue layer, keyed by style
+CATALOGUE_RENDERERS = {
+    "depth-magnitude": CatalogueDepthMagnitudeRenderer,
+    "completeness": CatalogueCompletenessRenderer,
+    "cluster": CatalogueClusterRenderer,
+    "default": CatalogueDefaultRenderer,
+}
+
+
+class RendererCache(object):
+    """
+    The renderers of the catalogue layer, keyed by style. A renderer is
+    made again only when the catalogue model or the catalogue columns
+    it depends on (its COLUMNS) have changed, so that switching style
+    does not recompute its classes and symbols.
+
+    A layer deletes its renderer when it gets a new one, so the cached
+    renderers are never set on a layer: #get returns a clone of them.
+    """
+    def __init__(self):
+        # (version, renderer) pairs keyed by style
+        self._renderers = {}
+
+    def get(self, style, catalogue_map):
+        """
+        :returns:
+            a renderer of the catalogue layer of `catalogue_map` for
+            `style` (one of CATALOGUE_RENDERERS)
+        """
+        cls = CATALOGUE_RENDERERS[style]
+        model = catalogue_map.catalogue_model
+        version = (model,) + tuple(
+            model.column_versions[column] for column in cls.COLUMNS)
+        cached = self._renderers.get(style)
+        if cached is None or cached[0] != version:
+            cached = (version, cls.make(catalogue_map))
+            self._renderers[style] = cached
+        return cached[1].clone()
+
+
+class CatalogueAggregateRenderer(QgsFeatureRendererV2):
+    """
+    Render the cells of the event density pyramid (see
+    :mod:`pyramid`). The symbol size grows with the order of magnitude
+    of the number of events in the cell, the colour with the maximum
+    magnitude.
+    """
+    SIZES = [1.5, 2.5, 3.5, 5, 7, 9, 12]
+    MAGNITUDE_BOUNDS = [3, 4, 5, 6, 7, 8]
+
+    @classmethod
+    def make(cls, _catalogue_map):
+        return cls()
+
+    def __init__(self):
+        QgsFeatureRendererV2.__init__(self, "CatalogueAggregateRenderer")
+        ramp = QgsVectorGradientColorRampV2.create(
+            dict(color1='yellow', color2='red'))
+        classes = len(self.MAGNITUDE_BOUNDS)
+
+        self.syms = []
+        for i in range(classes + 1):
+            color = ramp.color(float(i) / classes)
+            color.setAlpha(180)
+            syms = []
+            for size in self.SIZES:
+                point = QgsMarkerSymbolV2.createSimple({'name': 'circle'})
+                point.setColor(color)
+                point.setSize(size)
+                syms.append(point)
+            self.syms.append(syms)
+
+    def symbolForFeature(self, feature):
+        size = min(int(math.log10(max(feature['count'], 1))),
+                   len(self.SIZES) - 1)
+        color = bisect.bisect(self.MAGNITUDE_BOUNDS, feature['max_magnitude'])
+        return self.syms[color][size]
+
+    def startRender(self, context, _vlayer):
+        for syms in self.syms:
+            for s in syms:
+                s.startRender(context)
+
+    def stopRender(self, context):
+        for syms in self.syms:
+            for s in syms:
+                s.stopRender(context)
+
+    def usedAttributes(self):
+        return ['count', 'max_magnitude']
+
+    def clone(self):
+        return CatalogueAggregateRenderer()
@@ -0,0 +1,106 @@
+"""
+Parameter sweeps: run a declustering or completeness algorithm with
+many configurations in the pool of worker processes
+"""
+import itertools
+
+import numpy
+
+import process_pool
+from algorithms import get_algorithm
+from catalogue_model import run_algorithm
+
+
+# the analyses supporting parameter sweeps
+SWEEP_ANALYSES = ['declustering', 'completeness']
+
+
+def parse_values(text, value_type=float):
+    """
+    Parse the values of a swept parameter. `text` is either a range
+    in the form start:stop:step (stop included), or a comma separated
+    list of values.
+
+    :returns: a list of values of type `value_type`
+    """
+    text = text.strip()
+    if ':' in text:
+        try:
+            start, stop, step = [float(v) for v in text.split(':')]
+        except ValueError:
+            raise ValueError("Invalid range %s (use start:stop:step)" % text)
+        if step <= 0:
+            raise ValueError("Invalid range %s: step must be positive" % text)
+        values = numpy.arange(start, stop + step / 2., step).tolist()
+    else:
+        values = [float(v) for v in text.split(',') if v.strip()]
+    if not values:
+        raise ValueError("No value given")
+    return [value_type(value) for value in values]
+
+
+def sweep_configs(config, ranges):
+    """
+    :param dict config: the configuration of the parameters not swept
+    :param dict ranges: the list of values of each swept parameter
+    :returns:
+        a list with a configuration for each combination of the
+        values in `ranges`
+    """
+    keys = sorted(ranges)
+    configs = []
+    for values in itertools.product(*[ranges[key] for key in keys]):
+        run_config = dict(config)
+        run_config.update(zip(keys, values))
+        configs.append(run_config)
+    return configs
+
+
+def summarize(name, result):
+    """
+    :returns: a summary of the `result` of a run of the analysis `name`
+    """
+    if name == 'declustering':
+        cluster_index, cluster_flag = result
+        clusters = numpy.unique(cluster_index[cluster_index != 0])
+        return dict(
+            clusters=len(clusters),
+            clustered=int(numpy.count_nonzero(cluster_index)),
+            mainshocks=int(numpy.count_nonzero(cluster_flag == 0)),
+            foreshocks=int(numpy.count_nonzero(cluster_flag == -1)),
+            aftershocks=int(numpy.count_nonzero(cluster_flag == 1)))
+    elif name == 'completeness':
+        return dict(completeness_table=numpy.asarray(result))
+    raise ValueError("Parameter sweep is not supported for %s" % name)
+
+
+def _run(args):
+    name, key, config, catalogue_path = args
+    result = run_algorithm(name, get_algorithm(name, key), config,
+                           process_pool.shared(catalogue_path), None)
+    return summarize(name, result)
+
+
+def run_sweep(name, key, catalogue, configs, cancelled=None):
+    """
+    Run the algorithm `key` of the analysis `name` on `catalogue` once
+    for every configuration in `configs`, in the worker processes of
+    :mod:`process_pool`. Algorithms are looked up by key in the
+    workers, as registry entries can not be pickled.
+
+    :param cancelled:
+        a callable returning True if the sweep has to be stopped
+    :returns:
+        a list with the summary (see :func:`summarize`) of each run, or
+        None if the sweep has been cancelled
+    """
+    catalogue_path = process_pool.share(catalogue)
+    try:
+        summaries = list(process_pool.imap(
+            _run, [(name, key, config, catalogue_path)
+                   for config in configs], cancelled))
+    finally:
+        process_pool.unshare(catalogue_path)
+    if len(summaries) < len(configs):
+        return None
+    return summaries
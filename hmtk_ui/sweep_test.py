@@ -0,0 +1,86 @@
+import unittest
+
+import numpy
+
+try:
+    from hmtk.seismicity import DECLUSTERER_METHODS
+    from hmtk.seismicity.catalogue import Catalogue
+except ImportError:
+    raise unittest.SkipTest("hmtk is not available")
+
+from sweep import parse_values, sweep_configs, summarize, run_sweep
+
+
+def threshold_declustering(catalogue, config):
+    """
+    Flag as aftershocks the events below a magnitude threshold (looked
+    up by the workers)
+    """
+    below = catalogue.data['magnitude'] < config['threshold']
+    return below.astype(int), below.astype(int)
+
+DECLUSTERER_METHODS['SweepTestThreshold'] = threshold_declustering
+
+
+class ParseValuesTestCase(unittest.TestCase):
+    def test_range(self):
+        self.assertEqual([1., 1.5, 2.], parse_values('1:2:0.5'))
+        self.assertEqual([1, 3, 5], parse_values(' 1:5:2 ', int))
+        # the stop value is included despite the rounding errors
+        self.assertEqual(3, len(parse_values('0.1:0.3:0.1')))
+        self.assertEqual([2.], parse_values('2:2:1'))
+
+    def test_list(self):
+        self.assertEqual([1., 2.5, 3.], parse_values('1, 2.5,3,'))
+        self.assertEqual([4], parse_values('4', int))
+
+    def test_malformed_ranges(self):
+        for text in ['1:2', '1:2:3:4', 'a:2:1', '1::1', ':']:
+            self.assertRaises(ValueError, parse_values, text)
+
+    def test_step(self):
+        self.assertRaises(ValueError, parse_values, '1:2:0')
+        self.assertRaises(ValueError, parse_values, '1:2:-0.5')
+
+    def test_empty(self):
+        self.assertRaises(ValueError, parse_values, '2:1:1')
+        self.assertRaises(ValueError, parse_values, '')
+        self.assertRaises(ValueError, parse_values, ' , ')
+
+    def test_invalid_values(self):
+        self.assertRaises(ValueError, parse_values, '1,x')
+
+
+class SweepConfigsTestCase(unittest.TestCase):
+    def test_product(self):
+        configs = sweep_configs(
+            {'a': 1, 'b': 0}, {'b': [1, 2], 'c': ['x', 'y', 'z']})
+        self.assertEqual(6, len(configs))
+        self.assertEqual({'a': 1, 'b': 1, 'c': 'x'}, configs[0])
+        self.assertEqual({'a': 1, 'b': 2, 'c': 'z'}, configs[-1])
+
+    def test_summarize(self):
+        summary = summarize('declustering', (
+            numpy.array([0, 1, 1, 2, 0, 2, 2]),
+            numpy.array([0, 0, 1, -1, 0, 0, 1])))
+        self.assertEqual(dict(clusters=2, clustered=5, mainshocks=4,
+                              foreshocks=1, aftershocks=2), summary)
+        self.assertRaises(ValueError, summarize, 'histogram', None)
+
+
+class RunSweepTestCase(unittest.TestCase):
+    def setUp(self):
+        self.catalogue = Catalogue()
+        self.catalogue.data['magnitude'] = numpy.arange(3., 7., 0.5)
+        self.configs = sweep_configs({}, {'threshold': [4., 5., 6.]})
+
+    def test_run(self):
+        summaries = run_sweep('declustering', 'SweepTestThreshold',
+                              self.catalogue, self.configs)
+        self.assertEqual([2, 4, 6], [summary['aftershocks']
+                                     for summary in summaries])
+
+    def test_cancelled(self):
+        self.assertIsNone(run_sweep(
+            'declustering', 'SweepTestThreshold', self.catalogue,
+            self.configs, lambda: True))
@@ -35,13 +35,26 @@ class Tab(object):
         # to be set in update_form
         self.param_fields = None
 
+        # to be set in add_option
+        self.options_form = None
+
     def algorithm(self):
         """
         :returns: the current algorithm selected (a callable)
         """
+        return self.registry[self.algorithm_key()]
+
+    def algorithm_key(self):
+        """
+        :returns:
+            the name of the current algorithm selected in the registry,
+            or None if no algorithm is selected
+        """
         # we decrease by one the index as we assume that the first
         # choice in the combo box is the "No algorithm selected"
-        return self.registry.values()[self.algorithm_combo.currentIndex() - 1]
+        index = self.algorithm_combo.currentIndex()
+        if index > 0:
+            return self.registry.keys()[index - 1]
 
     def setup_form(self, algorithm_select_cb):
         """
@@ -81,6 +94,27 @@ class Tab(object):
         label.setObjectName("%s_%s_label" % (name, self.name))
         return label
 
+    def add_option(self, name, widget):
+        """
+        Add below the algorithm form a field `widget` setting an option
+        which does not depend on the algorithm
+        """
+        if self.options_form is None:
+            self.options_form = QtGui.QFormLayout()
+            self.options_form.setFieldGrowthPolicy(
+                QtGui.QFormLayout.FieldsStayAtSizeHint)
+            self.layout.insertLayout(1, self.options_form)
+        widget.setObjectName("%s_%s_option" % (self.name, name))
+        self.options_form.addRow(self._create_label(name), widget)
+
+    def set_enabled(self, enabled):
+        """
+        Enable (or disable) the algorithm selector and the action buttons
+        """
+        self.algorithm_combo.setEnabled(enabled)
+        for b in self.action_buttons:
+            b.setEnabled(enabled)
+
     def hide_action_buttons(self):
         for b in self.action_buttons:
             b.hide()
@@ -1,7 +1,7 @@
 from decorator import decorator
 
 from PyQt4 import QtGui
-from PyQt4.QtCore import Qt, pyqtSlot
+from PyQt4.QtCore import Qt, pyqtSlot, pyqtSignal
 
 from plot_occurrence_model import GutenbergRichterModel, plotSeismicityRates
 import completeness_dialog
@@ -14,6 +14,8 @@ from matplotlib.figure import Figure
 
 from hmtk.seismicity.smoothing.smoothed_seismicity import Grid
 from utils import alert
+from jobs import Job
+from sweep import parse_values, sweep_configs, run_sweep
 
 
 class FigureCanvasQTAggWidget(FigureCanvasQTAgg):
@@ -43,6 +45,33 @@ class FigureCanvasQTAggWidget(FigureCanvasQTAgg):
         plotSeismicityRates(catalogue).plot(self.axes, model=model)
         self.draw()
 
+    def draw_rate_band(self, magnitudes, lower, upper, confidence):
+        """
+        Draw the confidence band of the cumulative rates over the
+        seismicity rate chart
+        """
+        self.axes.fill_between(
+            magnitudes, lower, upper, color='g', alpha=0.25,
+            label='%g%% confidence' % (100 * confidence))
+        self.axes.legend(fontsize=8)
+        self.draw()
+
+    def draw_mmax_distribution(self, mmax, lower, upper, confidence):
+        """
+        Draw the distribution of the bootstrap replicates of the
+        maximum magnitude, with its confidence interval
+        """
+        self.axes.cla()
+        mmax = mmax[numpy.isfinite(mmax)]
+        self.axes.hist(mmax, bins=50, color='b', alpha=0.6)
+        self.axes.axvspan(lower, upper, color='g', alpha=0.25,
+                          label='%g%% confidence' % (100 * confidence))
+        self.axes.axvline(numpy.median(mmax), color='r', label='Median')
+        self.axes.set_xlabel('Maximum magnitude')
+        self.axes.set_ylabel('Replicates')
+        self.axes.legend(fontsize=8)
+        self.draw()
+
     def draw_1d_histogram(self, hist, bins):
         self.axes.cla()
         w = (bins[-1] - bins[0]) / len(bins)
@@ -120,6 +149,32 @@ class FigureCanvasQTAggWidget(FigureCanvasQTAgg):
             dict(fontsize=13))
         self.draw()
 
+    def draw_declustering_sweep(self, labels, summaries):
+        self.axes.cla()
+        runs = numpy.arange(len(summaries))
+        for key in ["mainshocks", "foreshocks", "aftershocks"]:
+            self.axes.plot(
+                runs, [summary[key] for summary in summaries], 'o-',
+                label=key.capitalize())
+        self.axes.set_xticks(runs)
+        self.axes.set_xticklabels(labels, rotation=90, fontsize=8)
+        self.axes.set_ylabel('Events')
+        self.axes.legend()
+        self.fig.tight_layout()
+        self.draw()
+
+    def draw_completeness_sweep(self, labels, summaries):
+        self.axes.cla()
+        for label, summary in zip(labels, summaries):
+            table = summary['completeness_table']
+            table = table[numpy.argsort(table[:, 0])]
+            self.axes.step(table[:, 0], table[:, 1], where='post',
+                           label=label)
+        self.axes.set_xlabel('Year')
+        self.axes.set_ylabel('Magnitude')
+        self.axes.legend(fontsize=8)
+        self.draw()
+
 
 class GridInputWidget(QtGui.QPushButton):
     def __init__(self, catalogue, fields):
@@ -301,6 +356,136 @@ class ResultsTable(QtGui.QTableWidget):
             self.itemClicked.connect(callback)
 
 
+class ProgressWidget(QtGui.QWidget):
+    """
+    A status bar widget showing the progress of a long running task,
+    with a button to cancel it (which emits `cancelled`)
+    """
+    cancelled = pyqtSignal()
+
+    def __init__(self, *args, **kwargs):
+        super(ProgressWidget, self).__init__(*args, **kwargs)
+        self.label = QtGui.QLabel()
+        self.progress_bar = QtGui.QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.cancel_button = QtGui.QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancelled)
+
+        layout = QtGui.QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.label)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.cancel_button)
+        self.hide()
+
+    def start(self, text, busy=False):
+        """
+        Show the widget with the description `text`. If `busy` is True
+        the progress is unknown and a busy indicator is shown instead
+        """
+        self.label.setText(text)
+        self.progress_bar.setRange(0, 0 if busy else 100)
+        self.progress_bar.setValue(0)
+        self.show()
+
+    def set_progress(self, value):
+        self.progress_bar.setValue(value)
+
+    def stop(self):
+        self.hide()
+
+
+class SweepDialog(QtGui.QDialog):
+    """
+    A dialog to run the algorithm selected in a tab over ranges of
+    values of its numeric parameters (see :mod:`sweep`), and to
+    compare the results in a table and a chart.
+
+    :attr window: the main window
+    :attr tab: the `tab.Tab` with the selected algorithm
+    :attr dict config: the algorithm configuration given in the tab
+    :attr dict inputs: the line edits of the numeric parameters
+    """
+    def __init__(self, window, tab, config):
+        super(SweepDialog, self).__init__(window)
+        self.setWindowTitle("Parameter sweep: %s" % tab.algorithm_key())
+        self.window = window
+        self.tab = tab
+        self.config = config
+        self.job = None
+
+        form = QtGui.QFormLayout()
+        self.inputs = {}
+        for field_name, value in sorted(config.items()):
+            if isinstance(value, bool) or not isinstance(
+                    value, (int, long, float, numpy.number)):
+                continue
+            line_edit = QtGui.QLineEdit(str(value))
+            line_edit.setToolTip(
+                "A range (start:stop:step) or a comma separated list")
+            form.addRow(field_name, line_edit)
+            self.inputs[field_name] = line_edit
+
+        self.run_button = QtGui.QPushButton("Run")
+        self.run_button.clicked.connect(self.run)
+        self.results_table = ResultsTable()
+        self.chart = FigureCanvasQTAggWidget(self)
+
+        layout = QtGui.QVBoxLayout(self)
+        layout.addLayout(form)
+        layout.addWidget(self.run_button)
+        layout.addWidget(self.results_table)
+        layout.addWidget(self.chart)
+
+    def run(self):
+        try:
+            ranges = dict(
+                (field_name, parse_values(
+                    line_edit.text(), type(self.config[field_name])))
+                for field_name, line_edit in self.inputs.items())
+        except ValueError as e:
+            alert(str(e))
+            return
+
+        configs = sweep_configs(self.config, ranges)
+        swept = sorted(key for key, values in ranges.items()
+                       if len(values) > 1)
+        labels = [", ".join("%s=%s" % (key, config[key]) for key in swept)
+                  for config in configs]
+
+        self.job = job = Job(
+            "Running %s sweep (%d runs)" % (self.tab.name, len(configs)),
+            run_sweep, callback=lambda summaries: self.show_results(
+                swept, configs, labels, summaries))
+        job.args = (self.tab.name, self.tab.algorithm_key(),
+                    self.window.catalogue_model.snapshot(), configs,
+                    lambda: job.cancelled)
+        self.run_button.setDisabled(True)
+        self.window.jobs.submit(job)
+        self.window.jobs.idle.connect(self.on_idle)
+
+    def on_idle(self):
+        self.window.jobs.idle.disconnect(self.on_idle)
+        self.run_button.setEnabled(True)
+
+    def show_results(self, swept, configs, labels, summaries):
+        if self.tab.name == 'declustering':
+            keys = ["clusters", "clustered", "mainshocks", "foreshocks",
+                    "aftershocks"]
+            rows = [[config[key] for key in swept] +
+                    [summary[key] for key in keys]
+                    for config, summary in zip(configs, summaries)]
+            self.results_table.set_data(rows, swept + keys)
+            self.chart.draw_declustering_sweep(labels, summaries)
+        else:
+            rows = [[config[key] for key in swept] + [
+                "; ".join("%g: %g" % tuple(row)
+                          for row in summary['completeness_table'])]
+                for config, summary in zip(configs, summaries)]
+            self.results_table.set_data(rows, swept + ["Year: Magnitude"])
+            self.chart.draw_completeness_sweep(labels, summaries)
+
+
 class CatalogueView(QtGui.QTableView):
     def __init__(self, *args, **kwargs):
         super(CatalogueView, self).__init__(*args, **kwargs)